@@ -21,6 +21,40 @@ class Settings(BaseModel):
     aws_secret_access_key: str = os.getenv("AWS_SECRET_ACCESS_KEY", "")
     aws_region_name: str = os.getenv("AWS_REGION", "us-east-1")
     s3_bucket_name: str = os.getenv("S3_BUCKET_NAME", "uploads-bucket")
+    # Local copies of downloaded Azure/S3 objects: least recently used are evicted beyond this many bytes
+    cloud_cache_max_bytes: int = int(os.getenv("CLOUD_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+    # Analytics cache settings
+    dataframe_cache_max_bytes: int = int(os.getenv("DATAFRAME_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    arrow_cache_enabled: bool = os.getenv("ARROW_CACHE_ENABLED", "true").lower() == "true"
+    # Memory-mapped Arrow IPC copies of raw frames: least recently read are deleted beyond this many bytes
+    arrow_cache_max_bytes: int = int(os.getenv("ARROW_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+    # Summaries over sources at least this large (bytes on disk) are aggregated chunk by chunk
+    summary_streaming_min_bytes: int = int(os.getenv("SUMMARY_STREAMING_MIN_BYTES", str(1024 ** 3)))
+    # Persisted analytical results / discovery cache: total compressed budget, idle TTL and eviction cadence
+    result_store_max_bytes: int = int(os.getenv("RESULT_STORE_MAX_BYTES", str(1024 ** 3)))
+    result_store_ttl_days: int = int(os.getenv("RESULT_STORE_TTL_DAYS", "30"))
+    result_store_eviction_interval_seconds: int = int(os.getenv("RESULT_STORE_EVICTION_INTERVAL_SECONDS", "3600"))
+    # Decoded results kept per worker: least recently used are dropped beyond this estimated in-memory size
+    result_cache_max_bytes: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+    # Concurrent requests for the same uncached result wait this long for the one computing it
+    single_flight_timeout_seconds: float = float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "600"))
+    # Serve a result whose inputs changed while it is recomputed in the background
+    stale_while_revalidate: bool = os.getenv("STALE_WHILE_REVALIDATE", "true").lower() == "true"
+    # Shared cross-worker cache tier: "none", "redis" (needs the redis package) or "disk" (needs diskcache)
+    shared_cache_backend: str = os.getenv("SHARED_CACHE_BACKEND", "none").lower()
+    shared_cache_url: str = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+    shared_cache_dir: str = os.getenv("SHARED_CACHE_DIR", "")  # disk backend; defaults under the storage cache dir
+    shared_cache_max_bytes: int = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+    shared_cache_max_item_bytes: int = int(os.getenv("SHARED_CACHE_MAX_ITEM_BYTES", str(64 * 1024 ** 2)))
+    shared_cache_ttl_seconds: int = int(os.getenv("SHARED_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Background warmup after startup for the most recently active models
+    warmup_enabled: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    warmup_max_models: int = int(os.getenv("WARMUP_MAX_MODELS", "10"))
+    warmup_lookback_days: int = int(os.getenv("WARMUP_LOOKBACK_DAYS", "14"))
+    warmup_time_budget_seconds: float = float(os.getenv("WARMUP_TIME_BUDGET_SECONDS", "300"))
+    warmup_memory_budget_bytes: int = int(os.getenv("WARMUP_MEMORY_BUDGET_BYTES", str(1024 ** 3)))
+    warmup_preload_ml: bool = os.getenv("WARMUP_PRELOAD_ML", "true").lower() == "true"
 
 def get_settings() -> Settings:
     origins = os.getenv("BACKEND_CORS_ORIGINS", "")
@@ -27,3 +27,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def add_missing_columns():
+    """Adds nullable columns declared on models but missing from existing tables (create_all only creates new tables)."""
+    from sqlalchemy import inspect, text
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_cols = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_cols or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                print(f"[DB] Added column {table.name}.{column.name}")
@@ -1,7 +1,11 @@
 import os
 import json
+import base64
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterator, Optional, Tuple
 import hashlib
 from app.core.config import get_settings
 
@@ -11,6 +15,18 @@ settings = get_settings()
 UPLOAD_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "data"))
 CACHE_DIR = os.path.join(UPLOAD_ROOT, ".cloud_cache")
 
+# Uploads are streamed in fixed-size chunks so worker memory stays bounded regardless of file size.
+# Also used as the S3 multipart part size (S3 requires >= 5 MB for all but the last part).
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Downloaded cloud objects are content-addressed: named by the SHA-256 stored at upload when the caller
+# passes it, otherwise by the SHA-256 of the object URI. The directory is kept under a byte budget by
+# evicting the least recently used objects (file mtime is refreshed on every hit).
+OBJECT_CACHE_DIR = os.path.join(CACHE_DIR, "objects")
+OBJECT_LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+DOWNLOAD_CHUNK_SIZE = UPLOAD_CHUNK_SIZE
+PARTIAL_SUFFIX = ".part"
+
 def ensure_upload_root() -> None:
     os.makedirs(UPLOAD_ROOT, exist_ok=True)
     os.makedirs(CACHE_DIR, exist_ok=True)
@@ -46,23 +62,89 @@ def build_file_paths(subfolder: str, filename: str, data_type: str = "raw_data")
     manifest_path = os.path.join(folder_path, f"{filename}.manifest.json")
     return file_path, manifest_path
 
+async def _iter_upload_chunks(file, hasher, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Yields the upload in chunk_size pieces (the last may be shorter), feeding each into hasher."""
+    buffer = bytearray()
+    while True:
+        data = await file.read(chunk_size - len(buffer))
+        if not data:
+            break
+        buffer.extend(data)
+        if len(buffer) >= chunk_size:
+            chunk = bytes(buffer)
+            buffer.clear()
+            hasher.update(chunk)
+            yield chunk
+    if buffer:
+        chunk = bytes(buffer)
+        hasher.update(chunk)
+        yield chunk
+
+async def _stream_to_local(file, file_path: str, hasher) -> int:
+    """Writes to a temp file in the destination folder, then atomically renames it into place."""
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(file_path))
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            async for chunk in _iter_upload_chunks(file, hasher):
+                handle.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size
+
+async def _stream_to_s3(file, s3, bucket: str, key: str, hasher) -> int:
+    """Streams the upload as an S3 multipart upload, one part per chunk."""
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+    parts = []
+    size = 0
+    try:
+        async for chunk in _iter_upload_chunks(file, hasher):
+            part_number = len(parts) + 1
+            response = s3.upload_part(Bucket=bucket, Key=key, PartNumber=part_number, UploadId=upload_id, Body=chunk)
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+            size += len(chunk)
+        if not parts:
+            # Multipart uploads need at least one part; empty files go through a plain put
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            s3.put_object(Bucket=bucket, Key=key, Body=b"")
+        else:
+            s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size
+
+async def _stream_to_azure(file, blob_client, hasher) -> int:
+    """Streams the upload as staged Azure blocks, committed once all chunks are in."""
+    from azure.storage.blob import BlobBlock
+    block_list = []
+    size = 0
+    async for chunk in _iter_upload_chunks(file, hasher):
+        block_id = base64.b64encode(f"{len(block_list):08d}".encode()).decode()
+        blob_client.stage_block(block_id=block_id, data=chunk)
+        block_list.append(BlobBlock(block_id=block_id))
+        size += len(chunk)
+    blob_client.commit_block_list(block_list)
+    return size
+
 async def save_file(file, model_name: str, is_analysis: bool = False) -> Dict[str, Any]:
-    """Saves file under model name/type folder utilizing the globally configured STORAGE_BACKEND."""
+    """Saves file under model name/type folder utilizing the globally configured STORAGE_BACKEND.
+    The upload is streamed in UPLOAD_CHUNK_SIZE chunks and hashed incrementally, so memory use does not grow with file size."""
     ensure_upload_root()
     data_type = "analysis" if is_analysis else "raw_data"
     subfolder = "".join([c if c.isalnum() or c in ("-", "_") else "_" for c in model_name])
     
-    file_content = await file.read()
-    size = len(file_content)
-    sha256_hash = hashlib.sha256(file_content).hexdigest()
-    
+    hasher = hashlib.sha256()
     metadata = {
         "file_name": file.filename,
         "storage_type": settings.storage_backend,
         "bucket_name": None,
         "file_type": file.content_type or file.filename.split(".")[-1],
-        "file_size": size,
-        "checksum": sha256_hash,
+        "file_size": 0,
+        "checksum": None,
         "status": "uploaded",
         "uploaded_at": datetime.utcnow()
     }
@@ -72,7 +154,8 @@ async def save_file(file, model_name: str, is_analysis: bool = False) -> Dict[st
         file_key, manifest_key = build_cloud_keys(subfolder, file.filename, data_type)
         
         blob_client = client.get_blob_client(container=settings.azure_container_name, blob=file_key)
-        blob_client.upload_blob(file_content, overwrite=True)
+        metadata["file_size"] = await _stream_to_azure(file, blob_client, hasher)
+        metadata["checksum"] = hasher.hexdigest()
         
         metadata["file_path"] = f"az://{settings.azure_container_name}/{file_key}"
         metadata["bucket_name"] = settings.azure_container_name
@@ -84,7 +167,8 @@ async def save_file(file, model_name: str, is_analysis: bool = False) -> Dict[st
         s3 = _get_s3_client()
         file_key, manifest_key = build_cloud_keys(subfolder, file.filename, data_type)
         
-        s3.put_object(Bucket=settings.s3_bucket_name, Key=file_key, Body=file_content)
+        metadata["file_size"] = await _stream_to_s3(file, s3, settings.s3_bucket_name, file_key, hasher)
+        metadata["checksum"] = hasher.hexdigest()
         
         metadata["file_path"] = f"s3://{settings.s3_bucket_name}/{file_key}"
         metadata["bucket_name"] = settings.s3_bucket_name
@@ -95,50 +179,165 @@ async def save_file(file, model_name: str, is_analysis: bool = False) -> Dict[st
         # Default local OS storage
         file_path, manifest_path = build_file_paths(subfolder, file.filename, data_type)
         
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        metadata["file_size"] = await _stream_to_local(file, file_path, hasher)
+        metadata["checksum"] = hasher.hexdigest()
             
         metadata["file_path"] = file_path
         write_manifest(manifest_path, metadata)
 
     return metadata
 
-def ensure_local_file(file_path: str) -> str:
-    """If the file is hosted on Azure or S3, download it to the local temporary cache and return the local path.
-    Otherwise, if it's already a local path, verify it exists and return it."""
+def derived_file_path(file_path: str, suffix: str) -> str:
+    """Path of a derived artifact (e.g. a Parquet sidecar) stored next to the source, on the same backend."""
+    return f"{file_path}{suffix}"
+
+def store_local_file(local_path: str, dest_path: str) -> str:
+    """Copies a locally produced file to dest_path on whichever backend dest_path points at."""
+    if dest_path.startswith("az://"):
+        parts = dest_path.replace("az://", "").split("/")
+        client = _get_azure_client()
+        blob_client = client.get_blob_client(container=parts[0], blob="/".join(parts[1:]))
+        with open(local_path, "rb") as handle:
+            blob_client.upload_blob(handle, overwrite=True)
+        # Derived artifacts are rewritten at the same path; a local copy keyed by path is now outdated
+        drop_cached_object(dest_path)
+
+    elif dest_path.startswith("s3://"):
+        parts = dest_path.replace("s3://", "").split("/")
+        s3 = _get_s3_client()
+        s3.upload_file(local_path, parts[0], "/".join(parts[1:]))
+        drop_cached_object(dest_path)
+
+    elif os.path.abspath(local_path) != os.path.abspath(dest_path):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        os.replace(local_path, dest_path)
+
+    return dest_path
+
+def _split_cloud_path(file_path: str) -> Tuple[str, str]:
+    """(container or bucket, object key) of an az:// or s3:// path."""
+    parts = file_path.split("://", 1)[1].split("/")
+    return parts[0], "/".join(parts[1:])
+
+def _object_cache_path(file_path: str, checksum: Optional[str] = None) -> str:
+    key = checksum.lower() if checksum else "uri-" + hashlib.sha256(file_path.encode("utf-8")).hexdigest()
+    # Keep the extension: readers pick Parquet vs CSV from the local path
+    extension = os.path.splitext(file_path)[1]
+    return os.path.join(OBJECT_CACHE_DIR, key[-2:], f"{key}{extension}")
+
+_download_locks: Dict[str, threading.Lock] = {}
+_download_locks_guard = threading.Lock()
+
+@contextmanager
+def _download_lock(cache_path: str):
+    """One download per object: a thread lock inside the worker, a file lock across workers on the host."""
+    from filelock import FileLock
+
+    with _download_locks_guard:
+        thread_lock = _download_locks.setdefault(cache_path, threading.Lock())
+    os.makedirs(OBJECT_LOCK_DIR, exist_ok=True)
+    name = hashlib.sha1(cache_path.encode("utf-8")).hexdigest()
+    # Not thread-local: the thread lock already serializes this worker's threads
+    file_lock = FileLock(os.path.join(OBJECT_LOCK_DIR, f"object-{name}.lock"), thread_local=False)
+    with thread_lock, file_lock:
+        yield
+
+def _open_cloud_object(file_path: str) -> Tuple[int, Iterator[bytes]]:
+    """(size, chunk iterator) streaming an Azure blob or S3 object."""
+    container, key = _split_cloud_path(file_path)
+    if file_path.startswith("az://"):
+        client = _get_azure_client()
+        download_stream = client.get_blob_client(container=container, blob=key).download_blob()
+        return download_stream.size, download_stream.chunks()
+    s3 = _get_s3_client()
+    response = s3.get_object(Bucket=container, Key=key)
+    return response["ContentLength"], response["Body"].iter_chunks(DOWNLOAD_CHUNK_SIZE)
+
+def _download_object(file_path: str, cache_path: str, checksum: Optional[str] = None) -> None:
+    """
+    Streams the object into a temp file next to cache_path, verifies its size (and SHA-256 when
+    known), then renames it into place. A failed or corrupt download never becomes visible.
+    """
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=PARTIAL_SUFFIX, dir=os.path.dirname(cache_path))
+    hasher = hashlib.sha256()
+    written = 0
+    try:
+        expected_size, chunks = _open_cloud_object(file_path)
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+        if expected_size is not None and written != expected_size:
+            raise IOError(f"Incomplete download of {file_path}: {written} of {expected_size} bytes")
+        if checksum and hasher.hexdigest() != checksum.lower():
+            raise IOError(f"Checksum mismatch for {file_path}: expected {checksum}, got {hasher.hexdigest()}")
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def evict_cached_objects(max_bytes: Optional[int] = None, keep: Optional[str] = None) -> Dict[str, int]:
+    """Deletes least recently used cached objects until the cache fits max_bytes; keep is never evicted."""
+    max_bytes = settings.cloud_cache_max_bytes if max_bytes is None else max_bytes
+    entries = []
+    for root, _, names in os.walk(OBJECT_CACHE_DIR):
+        for name in names:
+            if name.endswith(PARTIAL_SUFFIX):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    if total > max_bytes:
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        print(f"[CACHE] Evicted {evicted} cloud objects from the local cache ({total} bytes kept)")
+    return {"evicted": evicted, "total_bytes": total, "max_bytes": max_bytes}
+
+def drop_cached_object(file_path: str, checksum: Optional[str] = None) -> None:
+    """Forgets the local copy of a cloud object, e.g. after it was overwritten."""
+    try:
+        os.remove(_object_cache_path(file_path, checksum))
+    except OSError:
+        pass
+
+def ensure_local_file(file_path: str, checksum: Optional[str] = None) -> str:
+    """If the file is hosted on Azure or S3, download it to the local object cache and return the local path.
+    Otherwise, if it's already a local path, verify it exists and return it.
+    checksum is the SHA-256 recorded at upload; when given, the cached copy is keyed and verified by it."""
     
     ensure_upload_root()
     
-    if file_path.startswith("az://"):
-        parts = file_path.replace("az://", "").split("/")
-        container = parts[0]
-        blob_name = "/".join(parts[1:])
-        
-        local_cache_path = os.path.join(CACHE_DIR, os.path.basename(blob_name))
-        if os.path.exists(local_cache_path):
-            return local_cache_path
-            
-        # Download
-        client = _get_azure_client()
-        blob_client = client.get_blob_client(container=container, blob=blob_name)
-        with open(local_cache_path, "wb") as f:
-            download_stream = blob_client.download_blob()
-            f.write(download_stream.readall())
-        return local_cache_path
-
-    elif file_path.startswith("s3://"):
-        parts = file_path.replace("s3://", "").split("/")
-        bucket = parts[0]
-        s3_key = "/".join(parts[1:])
-        
-        local_cache_path = os.path.join(CACHE_DIR, os.path.basename(s3_key))
-        if os.path.exists(local_cache_path):
-            return local_cache_path
-            
-        # Download
-        s3 = _get_s3_client()
-        s3.download_file(bucket, s3_key, local_cache_path)
-        return local_cache_path
+    if file_path.startswith(("az://", "s3://")):
+        cache_path = _object_cache_path(file_path, checksum)
+        if not os.path.exists(cache_path):
+            with _download_lock(cache_path):
+                # Another thread or worker may have filled it while we waited
+                if not os.path.exists(cache_path):
+                    _download_object(file_path, cache_path, checksum)
+                    evict_cached_objects(keep=cache_path)
+                    return cache_path
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return cache_path
 
     else:
         # It's a local file format
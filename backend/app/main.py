@@ -9,7 +9,7 @@ from sqlalchemy.orm import configure_mappers
 from app.api.v1.router import api_router
 from app.core.config import get_settings
 from app.core.storage import ensure_upload_root
-from app.core.database import SessionLocal, engine, Base
+from app.core.database import SessionLocal, engine, Base, add_missing_columns
 
 settings = get_settings()
 
@@ -37,6 +37,14 @@ def startup_event():
     
     # Ensure all tables are created
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+    from app.modules.analytics.result_store import start_eviction_job
+    start_eviction_job()
+    from app.modules.analytics.service import start_result_upgrade_job
+    start_result_upgrade_job()
+    from app.modules.analytics.warmup import start_warmup_job
+    start_warmup_job()
     
     from app.core.security import get_password_hash
     db = SessionLocal()
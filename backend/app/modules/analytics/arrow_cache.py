@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+import pandas as pd
+
+from app.core import storage as file_storage
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# ==========================================================
+# SHARED ARROW IPC CACHE
+# ==========================================================
+# Full raw frames persisted as uncompressed Arrow IPC files, one per source checksum.
+# Workers open them with memory mapping and convert without copying: numeric and text columns
+# stay views on the mapped pages (floats are written with NaN rather than nulls so pandas can use
+# the buffers as they are), so every uvicorn process reads the same OS page cache pages. Only
+# columns pandas cannot view (booleans with missing values, mixed objects) become private copies.
+# A new checksum yields a new file, so a changed source is never served stale. Files are built
+# off the request path and the least recently read are deleted beyond arrow_cache_max_bytes.
+
+ARROW_CACHE_DIR = os.path.join(file_storage.CACHE_DIR, "arrow")
+ARROW_SUFFIX = ".arrow"
+
+_building: Set[str] = set()
+_building_lock = threading.Lock()
+
+
+def _cache_key(fingerprint: str) -> str:
+    # Checksums are used as-is; path/mtime fallbacks are hashed into a safe file name
+    if re.fullmatch(r"[0-9a-f]{64}", fingerprint):
+        return fingerprint
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def cache_path(fingerprint: str) -> str:
+    return os.path.join(ARROW_CACHE_DIR, f"{_cache_key(fingerprint)}{ARROW_SUFFIX}")
+
+
+def read_frame(fingerprint: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """Memory-maps the cached IPC file and converts only the requested columns; None on a miss."""
+    if not settings.arrow_cache_enabled:
+        return None
+    path = cache_path(fingerprint)
+    if not os.path.exists(path):
+        return None
+
+    import pyarrow as pa
+    try:
+        source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        if columns:
+            table = table.select(columns)
+        # split_blocks keeps each column its own block, so null-free columns are not consolidated (copied)
+        df = table.to_pandas(split_blocks=True)
+    except Exception as e:
+        print(f"[WARNING] Arrow cache read failed for {path}: {e}")
+        return None
+    _touch(path)
+    return df
+
+
+def _touch(path: str) -> None:
+    # Read time drives eviction order
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _arrow_table(df: pd.DataFrame):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for idx, name in enumerate(table.column_names):
+        if pd.api.types.is_float_dtype(df[name]):
+            # NaN instead of a validity bitmap: pandas can then use the mapped buffer without filling a copy
+            table = table.set_column(idx, name, pa.array(df[name].to_numpy(), from_pandas=False))
+    return table
+
+
+def write_frame(fingerprint: str, df: pd.DataFrame) -> bool:
+    """Writes df to the cache atomically (temp file + rename) so concurrent workers never see a partial file."""
+    if not settings.arrow_cache_enabled:
+        return False
+
+    import pyarrow as pa
+    path = cache_path(fingerprint)
+    os.makedirs(ARROW_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=ARROW_SUFFIX, dir=ARROW_CACHE_DIR)
+    os.close(fd)
+    try:
+        table = _arrow_table(df)
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        evict(keep=path)
+        return True
+    except Exception as e:
+        print(f"[WARNING] Arrow cache write failed for {path}: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove(fingerprint: str) -> None:
+    path = cache_path(fingerprint)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def build_in_background(fingerprint: str, load_full: Callable[[], pd.DataFrame]) -> bool:
+    """
+    Writes the IPC file for fingerprint from load_full() on a daemon thread, once per host: other
+    threads and workers asking meanwhile keep reading their projection from the source.
+    Returns whether a build was started here.
+    """
+    if not settings.arrow_cache_enabled or os.path.exists(cache_path(fingerprint)):
+        return False
+    with _building_lock:
+        if fingerprint in _building:
+            return False
+        _building.add(fingerprint)
+
+    def run():
+        from . import single_flight
+        try:
+            with single_flight.flight(f"arrow:{_cache_key(fingerprint)}"):
+                if not os.path.exists(cache_path(fingerprint)):
+                    write_frame(fingerprint, load_full())
+        except Exception as e:
+            print(f"[WARNING] Arrow cache build failed for {fingerprint}: {e}")
+        finally:
+            with _building_lock:
+                _building.discard(fingerprint)
+
+    threading.Thread(target=run, daemon=True, name="arrow-cache-build").start()
+    return True
+
+
+def evict(max_bytes: Optional[int] = None, keep: Optional[str] = None) -> Dict[str, int]:
+    """
+    Deletes the least recently read IPC files until the cache fits max_bytes; keep is never evicted.
+    Workers that still map a deleted file keep their pages until they close it.
+    """
+    max_bytes = settings.arrow_cache_max_bytes if max_bytes is None else max_bytes
+    entries = []
+    if os.path.isdir(ARROW_CACHE_DIR):
+        for name in os.listdir(ARROW_CACHE_DIR):
+            if not name.endswith(ARROW_SUFFIX):
+                continue
+            path = os.path.join(ARROW_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    if total > max_bytes:
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        print(f"[CACHE] Evicted {evicted} Arrow IPC files ({total} bytes kept)")
+    return {"evicted": evicted, "total_bytes": total, "max_bytes": max_bytes}
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ==========================================================
+# SPARSE SERIES CORRELATION
+# ==========================================================
+# Pearson correlation between many series (e.g. weekly sales per L2 or L3) as an edge list.
+# Each series is centred and scaled to unit norm once, so a block of correlations is one matrix
+# multiply; only the strongest neighbours of each series are kept, never the full N x N matrix.
+
+DATE_COLUMN = "__date"
+SERIES_COLUMN = "__series"
+VALUE_COLUMN = "__value"
+BLOCK_SIZE = 256  # source series per matrix multiply
+DEFAULT_TOP_K = 10
+MAX_ENTRIES = 32
+
+
+def series_sums(df: pd.DataFrame, date_col: str, series_col: str, value_col: str) -> pd.DataFrame:
+    """One row per (date, series) with the summed value, in the DATE/SERIES/VALUE layout. Rows without a series are dropped."""
+    frame = pd.DataFrame({
+        DATE_COLUMN: df[date_col].astype(str),
+        SERIES_COLUMN: df[series_col],
+        VALUE_COLUMN: df[value_col],
+    }).dropna(subset=[SERIES_COLUMN])
+    frame[SERIES_COLUMN] = frame[SERIES_COLUMN].astype(str)
+    return frame.groupby([DATE_COLUMN, SERIES_COLUMN]).sum().reset_index()
+
+
+class StandardizedSeries:
+    def __init__(self, sums: pd.DataFrame):
+        date_idx, dates = pd.factorize(sums[DATE_COLUMN], sort=True)
+        series_idx, names = pd.factorize(sums[SERIES_COLUMN], sort=True)
+        self.names: List[str] = list(names)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.date_count = len(dates)
+
+        # Dates a series has no rows for count as zero, like the dense pivot with fillna(0)
+        values = np.zeros((len(dates), len(names)))
+        np.add.at(values, (date_idx, series_idx), sums[VALUE_COLUMN].to_numpy(dtype=float, na_value=0.0))
+
+        centred = values - values.mean(axis=0)
+        norms = np.linalg.norm(centred, axis=0)
+        # Constant series correlate with nothing (r = 0), as the dense matrix reports them
+        self.z = np.divide(centred, norms, out=np.zeros_like(centred), where=norms > 0)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.z.nbytes)
+
+    def indices(self, names: Optional[Sequence[str]]) -> np.ndarray:
+        """Positions of the requested series (unknown names are skipped); all series when names is None."""
+        if names is None:
+            return np.arange(len(self.names))
+        return np.array([self.positions[n] for n in dict.fromkeys(names) if n in self.positions], dtype=int)
+
+    def edges(self, sources: Optional[Sequence[str]] = None, top_k: Optional[int] = None,
+              threshold: Optional[float] = None, block_size: int = BLOCK_SIZE) -> List[Dict[str, Any]]:
+        """
+        Strongest correlations of each source series with any other series: those with |r| >= threshold,
+        then at most top_k per source by |r|. Each pair is reported once, strongest first per source.
+        """
+        rows = self.indices(sources)
+        edges: List[Dict[str, Any]] = []
+        seen = set()
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            r = self.z[:, block_rows].T @ self.z  # (block, series)
+            strength = np.abs(r)
+            strength[np.arange(len(block_rows)), block_rows] = -1.0  # never a series with itself
+            if threshold is not None:
+                strength[strength < threshold] = -1.0
+
+            for i, source in enumerate(block_rows):
+                candidates = np.flatnonzero(strength[i] >= 0)
+                if top_k is not None and len(candidates) > top_k:
+                    candidates = candidates[np.argpartition(-strength[i, candidates], top_k - 1)[:top_k]]
+                for target in candidates[np.argsort(-strength[i, candidates], kind="stable")]:
+                    pair = (min(source, target), max(source, target))
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    edges.append({"source": self.names[source], "target": self.names[target], "r": float(r[i, target])})
+        return edges
+
+
+class SeriesCache:
+    """Per-worker LRU of StandardizedSeries keyed by (file_id, source fingerprint, series level)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], StandardizedSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: Any, fingerprint: str, level: str) -> Optional[StandardizedSeries]:
+        key = (str(file_id), fingerprint, level)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, file_id: Any, fingerprint: str, level: str, series: StandardizedSeries) -> StandardizedSeries:
+        with self._lock:
+            self._entries[(str(file_id), fingerprint, level)] = series
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return series
+
+    def invalidate(self, file_id: Any) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(file_id)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+            }
+
+
+series_cache = SeriesCache(MAX_ENTRIES)
+
+
+# ==========================================================
+# LAGGED CROSS-CORRELATION
+# ==========================================================
+# Correlation of a target series (weekly sales) with each driver (weekly spend per tactic) shifted
+# by every lag in a window. One zero-padded FFT of the target and one of all drivers give every lag
+# of every driver at once, instead of a correlation per lag and tactic.
+
+def lagged_cross_correlation(target: np.ndarray, drivers: np.ndarray, min_lag: int, max_lag: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (lags, r) with r[k, j] the correlation of target[t] with drivers[t - lags[j], k]: a positive lag means
+    the driver leads the target. Uses the full-series means and norms (as statsmodels' ccf does), so
+    values at different lags are comparable. Drivers or targets without variation get r = 0.
+    """
+    weeks = len(target)
+    target = target - target.mean()
+    drivers = drivers - drivers.mean(axis=0)
+
+    # Padding to at least 2 * weeks keeps the circular correlation from wrapping around
+    size = 1 << int(2 * weeks - 1).bit_length()
+    spectrum = np.fft.rfft(target, size)[:, None] * np.conj(np.fft.rfft(drivers, size, axis=0))
+    circular = np.fft.irfft(spectrum, size, axis=0)  # circular[lag] = sum_t target[t + lag] * driver[t]
+
+    lags = np.arange(min_lag, max_lag + 1)
+    norms = np.linalg.norm(target) * np.linalg.norm(drivers, axis=0)
+    r = np.divide(circular[lags % size].T, norms[:, None], out=np.zeros((drivers.shape[1], len(lags))), where=norms[:, None] > 0)
+    return lags, r
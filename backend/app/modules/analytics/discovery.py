@@ -4,7 +4,7 @@ from datetime import datetime
 import pandas as pd
 import numpy as np
 import holidays
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import json
 import os
 
@@ -12,6 +12,9 @@ from app.core.database import get_db
 from app.core.rbac import get_current_user
 from app.modules.analytics import models
 from app.modules.analytics.models import DiscoveryStack, DiscoveryStackData, DiscoveryAnalysisCache
+from app.modules.analytics import result_store
+from app.modules.analytics import invalidation
+from app.modules.analytics import single_flight
 
 # Define Tactics Columns
 SPEND_COLS = [
@@ -595,33 +598,111 @@ async def fetch_discovery_data_api(model_id: int, force_refresh: bool = False, d
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-def get_discovery_data(db: Session, model_id: int, force_refresh: bool = False) -> Dict[str, Any]:
-    from app.modules.governance.models import Model
+DISCOVERY_FAMILY = "discovery"  # algorithm version key, see invalidation.ALGORITHM_VERSIONS
+
+
+def _fresh_cache_version(db: Session, model_id: int):
+    """(cache_id, updated_at) of the model's cached analysis if it is newer than the modeling stack, else None."""
+    cache_entry = db.query(
+        DiscoveryAnalysisCache.cache_id, DiscoveryAnalysisCache.updated_at, DiscoveryAnalysisCache.dependencies
+    ).filter(
+        DiscoveryAnalysisCache.model_id == model_id
+    ).first()
+    if not cache_entry:
+        return None
+    if cache_entry.dependencies or not invalidation.algorithm_current(None, DISCOVERY_FAMILY):
+        return cache_entry if invalidation.is_current(db, cache_entry.dependencies, DISCOVERY_FAMILY) else None
+    # Entries cached before dependency tracking fall back to comparing build times
+    stack_entry = db.query(DiscoveryStack.created_at).filter(
+        DiscoveryStack.model_id == model_id,
+        DiscoveryStack.stack_type == 'modeling_stack'
+    ).order_by(DiscoveryStack.created_at.desc()).first()
+    if stack_entry and not (cache_entry.updated_at and cache_entry.updated_at > stack_entry.created_at):
+        return None
+    return cache_entry
+
+
+def get_discovery_etag(db: Session, model_id: int) -> Optional[str]:
+    """ETag of the cached discovery analysis, or None when it would be recomputed."""
+    from app.modules.analytics import http_cache
+    try:
+        cache_entry = _fresh_cache_version(db, model_id)
+    except Exception as e:
+        print(f"[WARNING] Discovery cache version lookup failed: {e}")
+        return None
+    if not cache_entry:
+        return None
+    return http_cache.make_etag("discovery", model_id, cache_entry.cache_id, cache_entry.updated_at)
+
+
+def get_discovery_data(db: Session, model_id: int, force_refresh: bool = False, allow_stale: bool = True) -> Dict[str, Any]:
     """
     Fetches the `aggbrand_modelingstack.csv` for the given model_id, runs anomaly detection,
     and returns chart time-series data and anomalies table.
+    Concurrent misses for a model share one computation; an outdated cache entry is served
+    (allow_stale) while it is recomputed in the background.
     """
-    
+    flight_key = f"discovery:{model_id}"
+
     # 0. Check for DB-backed Cache
     if not force_refresh:
-        try:
+        cached = _cached_discovery(db, model_id, allow_stale)
+        if cached is not None:
+            return cached
+
+    with single_flight.flight(flight_key):
+        # Another request may have finished the analysis while this one waited
+        if not force_refresh:
+            cached = _cached_discovery(db, model_id, allow_stale=False)
+            if cached is not None:
+                return cached
+        return _compute_discovery_data(db, model_id)
+
+
+def _cached_discovery(db: Session, model_id: int, allow_stale: bool) -> Optional[Dict[str, Any]]:
+    try:
+        # If cache is newer than the stack, serve it
+        fresh = _fresh_cache_version(db, model_id)
+        if fresh:
+            cache_entry = db.query(DiscoveryAnalysisCache).filter(
+                DiscoveryAnalysisCache.cache_id == fresh.cache_id
+            ).first()
+            print(f"[DISCOVERY] Serving from DB cache for model {model_id}")
+            cached = result_store.read_payload(cache_entry)
+            result_store.touch(db, cache_entry)
+            return cached
+
+        if allow_stale and single_flight.settings.stale_while_revalidate:
             cache_entry = db.query(DiscoveryAnalysisCache).filter(
                 DiscoveryAnalysisCache.model_id == model_id
             ).first()
-            
-            if cache_entry:
-                stack_entry = db.query(DiscoveryStack).filter(
-                    DiscoveryStack.model_id == model_id, 
-                    DiscoveryStack.stack_type == 'modeling_stack'
-                ).order_by(DiscoveryStack.created_at.desc()).first()
-                
-                # If cache is newer than the stack, serve it
-                if not stack_entry or cache_entry.updated_at > stack_entry.created_at:
-                    print(f"[DISCOVERY] Serving from DB cache for model {model_id}")
-                    return json.loads(cache_entry.analysis_data)
-        except Exception as e:
-            print(f"[WARNING] DB Cache load failed: {e}")
+            # An entry from an older algorithm version may not match the current format; never serve it
+            outdated_format = cache_entry and not invalidation.algorithm_current(cache_entry.dependencies, DISCOVERY_FAMILY)
+            cached = result_store.read_payload(cache_entry) if cache_entry and not outdated_format else None
+            if cached is not None:
+                single_flight.refresh_in_background(f"discovery:{model_id}", lambda: _refresh_discovery(model_id))
+                return cached
+    except Exception as e:
+        print(f"[WARNING] DB Cache load failed: {e}")
+    return None
+
+
+def _refresh_discovery(model_id: int) -> None:
+    """Background recompute on its own session; skipped if another worker already refreshed it."""
+    from app.core.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if _fresh_cache_version(db, model_id) is None:
+            _compute_discovery_data(db, model_id)
+    finally:
+        db.close()
+
 
+def _compute_discovery_data(db: Session, model_id: int) -> Dict[str, Any]:
+    from app.modules.governance.models import Model
+    dependencies = invalidation.snapshot(db, [
+        invalidation.input_key(invalidation.STACK, model_id), invalidation.algorithm_input(DISCOVERY_FAMILY)
+    ])
     model = db.query(Model).filter(Model.model_id == model_id).first()
     raw_project_name = model.model_name if model else f"model_{model_id}"
     project_name = "".join([c if c.isalnum() or c in ("-", "_") else "_" for c in raw_project_name])
@@ -993,8 +1074,8 @@ def get_discovery_data(db: Session, model_id: int, force_refresh: bool = False)
     try:
         from app.modules.analytics.models import AnalyticalResult
         res = db.query(AnalyticalResult).filter(AnalyticalResult.result_type == f"brand_exclusion_{model_id}").first()
-        if res and res.result_data:
-            data_dict = json.loads(res.result_data)
+        data_dict = result_store.read_payload(res) if res else None
+        if data_dict:
             summary = data_dict.get("summary", {})
             if "included_brands_count" in summary:
                 num_brands = summary["included_brands_count"]
@@ -1052,7 +1133,7 @@ def get_discovery_data(db: Session, model_id: int, force_refresh: bool = False)
             cache_entry = DiscoveryAnalysisCache(model_id=model_id)
             db.add(cache_entry)
             
-        cache_entry.analysis_data = json.dumps(result, default=str)
+        result_store.write_payload(cache_entry, result, dependencies)
         cache_entry.updated_at = datetime.utcnow()
         db.commit()
         print(f"[DISCOVERY] Persisted analysis to DB cache for model {model_id}")
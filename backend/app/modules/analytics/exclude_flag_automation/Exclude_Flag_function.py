@@ -46,7 +46,7 @@ def match_brands_clean(matcher, new_df, brand_col='UNIQUE_BRAND_NAME'):
     if not matcher.loaded or matcher.historical_embeddings is None:
         return new_df
 
-    new_embeddings = matcher.model.encode(new_df[brand_col].tolist(), show_progress_bar=False)
+    new_embeddings = matcher.encode(new_df[brand_col].tolist())
     sim_matrix = cosine_similarity(new_embeddings, matcher.historical_embeddings)
 
     if 'Combine_flag' not in new_df.columns:
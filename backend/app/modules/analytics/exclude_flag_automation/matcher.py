@@ -19,12 +19,24 @@ except ImportError:
 import unicodedata
 import json
 from tqdm import tqdm
+import threading
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_sentence_model(model_name='all-MiniLM-L6-v2'):
+    """One SentenceTransformer per model name and process; loading takes seconds and the weights are read-only."""
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
 
 
 class BrandMatcher:
     def __init__(self, config):
         self.config = config
-        self.model = SentenceTransformer(config.get('model_name', 'all-MiniLM-L6-v2'))
+        self.model = load_sentence_model(config.get('model_name', 'all-MiniLM-L6-v2'))
         self.model_name = config.get('model_name', 'all-MiniLM-L6-v2')
         self.threshold = config.get('threshold', 0.85)
         self.use_parent_lookup = config.get('use_parent_lookup', False)
@@ -69,7 +81,7 @@ class BrandMatcher:
         self.flag_col = flag_col
 
         print("Encoding embeddings for historical brands...")
-        embeddings = self.model.encode(self.historical_data[brand_col].tolist(), show_progress_bar=True)
+        embeddings = self.encode(self.historical_data[brand_col].tolist())
         self.historical_data['embedding'] = list(embeddings)
         self.historical_brands = self.historical_data[brand_col].tolist()
         self.historical_embeddings = embeddings
@@ -91,6 +103,11 @@ class BrandMatcher:
             self.next_Combine_flag = 1
         print(f"Historical data loaded. Next Combine flag: {self.next_Combine_flag}")
 
+    def encode(self, texts):
+        """Embeds texts, reusing vectors any worker already computed with this model (shared cache tier)."""
+        from app.modules.analytics.shared_cache import cached_embeddings
+        return cached_embeddings(self.model, self.model_name, texts)
+
     def normalize_text(self, text):
         normalized = unicodedata.normalize('NFKD', text)
         return normalized.encode('ASCII', 'ignore').decode('utf-8').upper()
@@ -132,7 +149,7 @@ class BrandMatcher:
 
     def match_brands(self, new_df, brand_col='UNIQUE_BRAND_NAME'):
         print("Starting brand matching...")
-        new_embeddings = self.model.encode(new_df[brand_col].tolist(), show_progress_bar=False)
+        new_embeddings = self.encode(new_df[brand_col].tolist())
         sim_matrix = cosine_similarity(new_embeddings, self.historical_embeddings)
 
         if 'Combine_flag' not in new_df.columns:
@@ -9,6 +9,7 @@ sys.path.append(str(backend_dir))
 
 from app.core.database import SessionLocal
 from app.modules.analytics.models import PrivateBrand, MappingIssue
+from app.modules.analytics import invalidation
 
 def seed_database():
     print("Starting data seeding from static Excel files...")
@@ -36,6 +37,8 @@ def seed_database():
                     existing_pb.add(brand_str)
                     added_pb += 1
             
+            if added_pb:
+                invalidation.bump(db, invalidation.PRIVATE_BRANDS)
             db.commit()
             print(f"Successfully added {added_pb} brand(s) to Private Brands.")
         else:
@@ -68,6 +71,8 @@ def seed_database():
                     existing_mi.add(brand_str)
                     added_mi += 1
             
+            if added_mi:
+                invalidation.bump(db, invalidation.MAPPING_ISSUES)
             db.commit()
             print(f"Successfully added {added_mi} brand(s) to Mapping Issues.")
         else:
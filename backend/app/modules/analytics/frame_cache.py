@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# ==========================================================
+# IN-PROCESS DATAFRAME CACHE
+# ==========================================================
+# Parsed raw files keyed by (file_id, checksum, projected columns). Callers get a shallow copy,
+# which pandas treats as copy-on-write, so in-place edits made by one endpoint
+# (e.g. numeric coercion in calculate_summary) never leak into the cached frame.
+
+CacheKey = Tuple[str, str, Tuple[str, ...]]
+FULL_FRAME: Tuple[str, ...] = ("*",)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Approximate in-memory size of a DataFrame, including object payloads."""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return int(df.memory_usage(index=True).sum())
+
+
+def _columns_key(columns: Optional[List[str]]) -> Tuple[str, ...]:
+    return tuple(columns) if columns else FULL_FRAME
+
+
+class DataFrameCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, file_id: Any, checksum: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Returns a cached frame; a projection is also served from a cached full frame."""
+        key = (str(file_id), checksum, _columns_key(columns))
+        full_key = (str(file_id), checksum, FULL_FRAME)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy(deep=False)
+            entry = self._entries.get(full_key)
+            if entry is not None and columns:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[0][list(columns)]
+            self.misses += 1
+            return None
+
+    def columns_of(self, file_id: Any, checksum: str) -> Optional[List[str]]:
+        """Column names of a cached full frame, without touching LRU order or counters."""
+        with self._lock:
+            entry = self._entries.get((str(file_id), checksum, FULL_FRAME))
+            return list(entry[0].columns) if entry is not None else None
+
+    def put(self, file_id: Any, checksum: str, df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Stores the frame and returns a copy-on-write view for the caller."""
+        key = (str(file_id), checksum, _columns_key(columns))
+        size = frame_nbytes(df)
+        if size > self.max_bytes:
+            print(f"[CACHE] Frame for file {file_id} ({size} bytes) exceeds cache budget; not cached.")
+            return df
+        with self._lock:
+            self._drop(key)
+            # A new checksum for the same file supersedes any older parse
+            for stale in [k for k in self._entries if k[0] == key[0] and k[1] != checksum]:
+                self._drop(stale)
+            self._entries[key] = (df, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return df.copy(deep=False)
+
+    def invalidate(self, file_id: Any) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(file_id)]:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+
+frame_cache = DataFrameCache(settings.dataframe_cache_max_bytes)
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+# ==========================================================
+# CONDITIONAL GET (ETag / If-None-Match)
+# ==========================================================
+# Analytics payloads are versioned by the write time of their cached row, so an ETag can be
+# derived from (key, version) alone. Endpoints compare it to If-None-Match before loading the
+# payload and answer 304 when the client already holds the current version.
+
+CACHE_CONTROL = "private, no-cache"  # clients may keep the payload but must revalidate each use
+
+
+def make_etag(*parts: Any) -> Optional[str]:
+    """Strong ETag over the key parts, or None when any part (typically the version) is missing."""
+    if any(part is None for part in parts):
+        return None
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix on the client's tag is ignored."""
+    if not etag:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """A 304 response when the client's cached copy is current, else None."""
+    if not etag_matches(request, etag):
+        return None
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def tag_response(response: Response, etag: Optional[str]) -> None:
+    """Attaches the ETag of the payload being returned."""
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,242 @@
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import storage as file_storage
+
+# ==========================================================
+# UPLOAD-TIME INGEST
+# ==========================================================
+SIDECAR_SUFFIX = ".sidecar.parquet"
+SIDECAR_COMPRESSION = "zstd"
+PARTITIONS_SUFFIX = ".partitions"  # month partitions live under <source>.partitions/<YYYY-MM>.parquet
+CUBE_SUFFIX = ".cube.parquet"
+CUBE_MAX_ROW_RATIO = 0.5  # skip the cube when it would not shrink the raw rows at least this much
+CSV_BLOCK_SIZE = 64 * 1024 * 1024  # bytes per pyarrow CSV block; larger blocks mean fewer, bigger parallel chunks
+# pd.read_csv's default NA markers; text columns included, so blank L2/L3 cells stay missing as they do in pandas
+CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+# Precomputes run once per upload against the single parsed DataFrame, in registration order.
+# Each takes (db, file_id, df) and persists its own result.
+PRECOMPUTES: List[Tuple[str, Callable]] = []
+
+
+def register_precompute(name: str):
+    """Decorator adding a function to the post-upload precompute stage."""
+    def decorator(func: Callable) -> Callable:
+        PRECOMPUTES.append((name, func))
+        return func
+    return decorator
+
+
+def is_csv(file_name: str) -> bool:
+    return str(file_name).lower().endswith(".csv")
+
+
+def is_parquet(file_name: str) -> bool:
+    return str(file_name).lower().endswith(".parquet")
+
+
+def read_csv_arrow(local_path: str):
+    """Parses a CSV with pyarrow's multithreaded reader and returns an Arrow table."""
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+    convert_options = pa_csv.ConvertOptions(null_values=CSV_NULL_VALUES, strings_can_be_null=True)
+    table = pa_csv.read_csv(local_path, read_options=read_options, convert_options=convert_options)
+
+    # Keep date-like columns as text so frames read back match pd.read_csv and stay JSON-serializable
+    for idx, field in enumerate(table.schema):
+        if pa.types.is_date(field.type) or pa.types.is_timestamp(field.type):
+            table = table.set_column(idx, field.name, table.column(idx).cast(pa.string()))
+    return table
+
+
+def coerce_comma_numeric(table):
+    """
+    Converts text columns holding comma-formatted numbers (e.g. "4,268") to float64.
+    A column is only converted when every non-empty value parses; returns (table, converted column names).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    converted = []
+    for idx, field in enumerate(table.schema):
+        if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+            continue
+        column = table.column(idx)
+        if not pc.any(pc.match_substring(column, ",")).as_py():
+            continue
+        stripped = pc.utf8_trim_whitespace(pc.replace_substring(column, ",", ""))
+        stripped = pc.if_else(pc.equal(stripped, ""), pa.scalar(None, field.type), stripped)
+        try:
+            numeric = pc.cast(stripped, pa.float64())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        table = table.set_column(idx, field.name, numeric)
+        converted.append(field.name)
+    return table, converted
+
+
+def _write_parquet(table, dest_path: str) -> None:
+    """Writes a Zstd Parquet file via a temp file, then moves it to dest_path on its backend."""
+    import pyarrow.parquet as pq
+
+    if dest_path.startswith(("az://", "s3://")):
+        fd, tmp_path = tempfile.mkstemp(suffix=".parquet", dir=file_storage.CACHE_DIR)
+        os.close(fd)
+    else:
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.tmp"
+
+    try:
+        pq.write_table(table, tmp_path, compression=SIDECAR_COMPRESSION)
+        file_storage.store_local_file(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def match_column(names: List[str], aliases: List[str]) -> Optional[str]:
+    """First column matching an alias (case-insensitive), in alias order."""
+    names_upper = {str(n).upper(): n for n in names}
+    for alias in aliases:
+        if alias.upper() in names_upper:
+            return names_upper[alias.upper()]
+    return None
+
+
+def write_date_partitions(table, stored_path: str, date_column: str) -> Dict[str, Any]:
+    """
+    Re-lays the typed table out as one Parquet file per calendar month of date_column, so
+    date-bounded reads only open overlapping months. Rows whose date does not parse are left out,
+    as every date-filtered view drops them anyway. Returns the overall date bounds and partition list.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    dates = pd.to_datetime(table.column(date_column).to_pandas(), errors="coerce")
+    months = dates.dt.strftime("%Y-%m")
+    partitions = []
+    for month, indices in sorted(months.groupby(months).indices.items()):
+        month_dates = dates.iloc[indices]
+        part_path = file_storage.derived_file_path(stored_path, f"{PARTITIONS_SUFFIX}/{month}.parquet")
+        _write_parquet(table.take(pa.array(indices)), part_path)
+        partitions.append({
+            "month": month,
+            "path": part_path,
+            "min": month_dates.min().strftime("%Y-%m-%d"),
+            "max": month_dates.max().strftime("%Y-%m-%d"),
+            "rows": len(indices),
+        })
+
+    valid = dates.dropna()
+    print(f"[INGEST] Wrote {len(partitions)} month partitions on '{date_column}'")
+    return {
+        "date_min": valid.min().strftime("%Y-%m-%d") if not valid.empty else None,
+        "date_max": valid.max().strftime("%Y-%m-%d") if not valid.empty else None,
+        "partitions": partitions,
+    }
+
+
+def write_parquet_sidecar(local_path: str, stored_path: str, date_aliases: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Converts an uploaded CSV into a typed, Zstd-compressed Parquet sidecar stored next to the source file,
+    plus month partitions when a date column (first match in date_aliases) is present.
+    Returns the sidecar path, row count, column dtypes, the columns that needed comma stripping and partition info.
+    """
+    table, comma_stripped = coerce_comma_numeric(read_csv_arrow(local_path))
+    sidecar_path = file_storage.derived_file_path(stored_path, SIDECAR_SUFFIX)
+    _write_parquet(table, sidecar_path)
+
+    print(f"[INGEST] Wrote Parquet sidecar {sidecar_path} ({table.num_rows} rows, {table.num_columns} columns)")
+    if comma_stripped:
+        print(f"[INGEST] Parsed comma-formatted numbers in: {comma_stripped}")
+    return _catalog_table(table, stored_path, date_aliases, sidecar_path, comma_stripped)
+
+
+def catalog_parquet(local_path: str, stored_path: str, date_aliases: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Catalogs an uploaded Parquet file, which is already typed and is read as-is (no sidecar), and
+    writes its month partitions. Returns the same info as write_parquet_sidecar with sidecar_path None.
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(local_path)
+    print(f"[INGEST] Cataloged Parquet upload {stored_path} ({table.num_rows} rows, {table.num_columns} columns)")
+    return _catalog_table(table, stored_path, date_aliases)
+
+
+def _catalog_table(
+    table, stored_path: str, date_aliases: Optional[List[str]], sidecar_path: Optional[str] = None,
+    comma_stripped: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    info = {
+        "sidecar_path": sidecar_path,
+        "row_count": table.num_rows,
+        "dtypes": {field.name: str(field.type) for field in table.schema},
+        "comma_stripped": comma_stripped or [],
+        "date_column": None,
+        "date_min": None,
+        "date_max": None,
+        "partitions": [],
+    }
+
+    date_column = match_column(table.column_names, date_aliases or [])
+    if date_column:
+        info["date_column"] = date_column
+        try:
+            info.update(write_date_partitions(table, stored_path, date_column))
+        except Exception as e:
+            print(f"[WARNING] Failed to write date partitions for {stored_path}: {e}")
+    return info
+
+
+def write_cube(df, stored_path: str, dims: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Materializes the per-file aggregation cube: every numeric column summed over the dims
+    (date, L2, L3, brand, model group), keeping the physical column names so sum-based views
+    can run on it exactly as on raw rows. Returns cube info, or None if it would not be compact.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    measures = [
+        c for c in df.columns
+        if c not in dims and pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+    ]
+    if not dims or not measures:
+        return None
+
+    cube = df.groupby(dims, dropna=False, sort=False)[measures].sum().reset_index()
+    if len(cube) > len(df) * CUBE_MAX_ROW_RATIO:
+        print(f"[INGEST] Skipping cube for {stored_path}: {len(cube)} cells vs {len(df)} rows")
+        return None
+
+    cube_path = file_storage.derived_file_path(stored_path, CUBE_SUFFIX)
+    _write_parquet(pa.Table.from_pandas(cube, preserve_index=False), cube_path)
+    print(f"[INGEST] Wrote cube {cube_path} ({len(df)} rows -> {len(cube)} cells over {dims})")
+    return {"path": cube_path, "rows": len(cube), "dims": dims, "columns": list(cube.columns)}
+
+
+def build_sidecar(
+    stored_path: str, file_name: str, date_aliases: Optional[List[str]] = None, checksum: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort catalog for an upload: a typed sidecar plus month partitions for CSV, month partitions
+    only for Parquet (read as-is). None for other formats. Failures never block the upload.
+    """
+    if not (is_csv(file_name) or is_parquet(file_name)):
+        return None
+    try:
+        local_path = file_storage.ensure_local_file(stored_path, checksum)
+        if is_parquet(file_name):
+            return catalog_parquet(local_path, stored_path, date_aliases)
+        return write_parquet_sidecar(local_path, stored_path, date_aliases)
+    except Exception as e:
+        print(f"[WARNING] Failed to build ingest catalog for {file_name}: {e}")
+        return None
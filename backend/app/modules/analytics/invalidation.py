@@ -0,0 +1,132 @@
+import json
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import CacheInputVersion
+
+# ==========================================================
+# DEPENDENCY-TRACKED INVALIDATION
+# ==========================================================
+# Each cached result records the versions of the inputs it was computed from. Changing an input
+# bumps its version, which makes exactly the results that declared it stale: they read as misses
+# and are recomputed on the next request. Nothing else is deleted or recomputed.
+
+FILE = "file"                      # per file: bumped when the file is (re)ingested
+ALGORITHM = "algorithm"            # per result family: versioned in code, see ALGORITHM_VERSIONS
+RELEVANCE = "relevance"            # per model: subcategory relevance mapping
+STACK = "stack"                    # per model: discovery/modeling stack build
+PRIVATE_BRANDS = "private_brands"  # global table
+MAPPING_ISSUES = "mapping_issues"  # global table
+
+# Payload format / computation version of each result family. Bump a family when its output
+# changes: entries recorded under an older version are never served and get upgraded or recomputed
+# in the background (see service.register_result_upgrade). Entries from before versioning count as 1.
+ALGORITHM_VERSIONS: Dict[str, int] = {
+    "subcategory_summary": 1,
+    "l2_values": 1,
+    "l3_analysis": 2,  # 2: one aggregate per file, pages cut from its sorted index
+    "correlation": 1,
+    "weekly_sales": 1,
+    "weekly_series": 1,
+    "model_group_metrics": 1,
+    "exclude_analysis": 1,
+    "brand_exclusion": 3,  # 2: summary carries part2/part3 and totals; 3: rows stored per brand
+    "brand_stacks_build": 1,
+    "discovery": 1,
+}
+LEGACY_ALGORITHM_VERSION = 1
+
+
+def input_key(kind: str, scope=None) -> str:
+    return kind if scope is None else f"{kind}:{scope}"
+
+
+def result_family(result_type: str) -> Optional[str]:
+    """Versioned family of a result type, e.g. 'weekly_sales_units' -> 'weekly_sales'."""
+    matches = [f for f in ALGORITHM_VERSIONS if result_type == f or result_type.startswith(f"{f}_")]
+    return max(matches, key=len) if matches else None
+
+
+def algorithm_input(family: Optional[str]) -> Optional[str]:
+    return input_key(ALGORITHM, family) if family else None
+
+
+def current_versions(db: Session, keys: Iterable[str]) -> Dict[str, int]:
+    """Current version of each input; inputs that never changed are at version 0."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    algorithm_prefix = f"{ALGORITHM}:"
+    versions = {
+        key: ALGORITHM_VERSIONS.get(key[len(algorithm_prefix):], LEGACY_ALGORITHM_VERSION)
+        for key in keys if key.startswith(algorithm_prefix)
+    }
+    stored = [key for key in keys if key not in versions]
+    if stored:
+        rows = db.query(CacheInputVersion.input_key, CacheInputVersion.version).filter(
+            CacheInputVersion.input_key.in_(stored)
+        ).all()
+        versions.update({key: 0 for key in stored})
+        versions.update({row.input_key: row.version for row in rows})
+    return versions
+
+
+def _recorded(dependencies: Optional[str]) -> Optional[Dict[str, int]]:
+    if not dependencies:
+        return {}
+    try:
+        return json.loads(dependencies)
+    except (TypeError, ValueError):
+        return None
+
+
+def with_algorithm(dependencies: str, family: Optional[str]) -> str:
+    """Adds the family's current algorithm version to a dependency record."""
+    if not family:
+        return dependencies
+    recorded = _recorded(dependencies) or {}
+    recorded[algorithm_input(family)] = ALGORITHM_VERSIONS[family]
+    return json.dumps(recorded, sort_keys=True)
+
+
+def algorithm_current(dependencies: Optional[str], family: Optional[str]) -> bool:
+    """Whether an entry was produced by the family's current algorithm (unversioned entries count as version 1)."""
+    if not family:
+        return True
+    recorded = _recorded(dependencies)
+    if recorded is None:
+        return False
+    return recorded.get(algorithm_input(family), LEGACY_ALGORITHM_VERSION) == ALGORITHM_VERSIONS[family]
+
+
+def snapshot(db: Session, keys: Iterable[str]) -> str:
+    """Serialized dependency record to store on a result. Take it before computing, so a change mid-compute stays visible."""
+    return json.dumps(current_versions(db, keys), sort_keys=True)
+
+
+def is_current(db: Session, dependencies: Optional[str], family: Optional[str] = None) -> bool:
+    """
+    True when the entry matches the family's algorithm version and every recorded input is still at
+    the recorded version. Inputs of entries without a record are treated as current.
+    """
+    if not algorithm_current(dependencies, family):
+        return False
+    recorded = _recorded(dependencies)
+    if recorded is None:
+        return False
+    if not recorded:
+        return True
+    return current_versions(db, recorded.keys()) == recorded
+
+
+def bump(db: Session, *keys: str) -> None:
+    """Marks inputs as changed. Joins the caller's transaction; the caller commits."""
+    for key in keys:
+        row = db.query(CacheInputVersion).filter(CacheInputVersion.input_key == key).with_for_update().first()
+        if row:
+            row.version = CacheInputVersion.version + 1
+        else:
+            db.add(CacheInputVersion(input_key=key, version=1))
+    db.flush()
+    print(f"[CACHE] Invalidated dependents of {list(keys)}")
@@ -7,7 +7,10 @@ from sqlalchemy import (
     ForeignKey,
     Numeric,
     DateTime,
-    Boolean
+    Boolean,
+    LargeBinary,
+    Float,
+    Index
 )
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -103,11 +106,56 @@ class AnalyticalResult(Base):
     result_id = Column(Integer, primary_key=True)
     file_id = Column(Integer, ForeignKey("model_files.file_id"), nullable=False)
     result_type = Column(String(100), nullable=False) # e.g., 'subcategory_summary', 'l3_analysis', 'correlation', 'weekly_sales', 'brand_exclusion'
-    result_data = Column(String(1000000)) # JSON encoded string
+    result_data = Column(String(1000000)) # Legacy JSON encoded string; new rows use result_blob
+    result_blob = Column(LargeBinary) # Compressed payload written by result_store
+    byte_size = Column(Integer) # Stored payload size, for the result store budget
+    last_accessed = Column(DateTime)
+    updated_at = Column(DateTime) # Set on every payload write; versions the per-worker decoded cache
+    dependencies = Column(Text) # JSON {input_key: version} of the inputs this result was computed from
     created_at = Column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (UniqueConstraint('file_id', 'result_type', name='_file_result_uc'),)
 
+class BrandExclusionResultRow(Base):
+    """
+    One brand row of a brand_exclusion result. The AnalyticalResult of the same (file_id, result_type)
+    holds only the summary; rows live here so bucket views and single-brand edits touch only their rows.
+    """
+    __tablename__ = "brand_exclusion_rows"
+    row_id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("model_files.file_id"), nullable=False)
+    result_type = Column(String(100), nullable=False) # brand_exclusion_<model_id>
+    position = Column(Integer, nullable=False) # Order of the row in the computed result
+    brand_key = Column(String(500), nullable=False) # Lowercased, stripped brand name
+    row_data = Column(Text) # JSON row as served
+    # Numeric copies of the fields the summary and bucket filters read
+    sum_sales = Column(Float, default=0.0)
+    sum_spend = Column(Float, default=0.0)
+    sum_units = Column(Float, default=0.0)
+    exclude_flag = Column(Integer, default=0)
+    original_exclude_flag = Column(Integer, default=0)
+    private_brand = Column(Integer, default=0)
+    mapping_issue = Column(Integer, default=0)
+    combine_flag = Column(Integer)
+
+    __table_args__ = (Index('ix_brand_exclusion_rows_result', 'file_id', 'result_type', 'brand_key'),)
+
+class FileSchema(Base):
+    __tablename__ = "file_schemas"
+    schema_id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("model_files.file_id"), nullable=False, unique=True, index=True)
+    column_map = Column(Text) # JSON: logical field -> physical column
+    date_column = Column(String(255))
+    dtypes = Column(Text) # JSON: physical column -> Arrow type of the typed sidecar
+    comma_stripped = Column(Text) # JSON list of columns parsed from comma-formatted text
+    date_min = Column(String(10)) # YYYY-MM-DD over rows whose date parses
+    date_max = Column(String(10))
+    row_count = Column(Integer)
+    partitions = Column(Text) # JSON list of month partitions: month, path, min, max, rows
+    cube = Column(Text) # JSON: path, rows, dims and columns of the date x L2 x L3 x brand cube
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow) # bumped on every write; workers key their cached copy on it
+
 # ==========================================================
 # DISCOVERY STACKS (DB STORE)
 # ==========================================================
@@ -135,7 +183,18 @@ class DiscoveryAnalysisCache(Base):
     __tablename__ = "discovery_analysis_cache"
     cache_id = Column(Integer, primary_key=True)
     model_id = Column(Integer, ForeignKey("models.model_id"), nullable=False, index=True)
-    analysis_data = Column(Text) # Final discovery JSON (often 10MB+)
+    analysis_data = Column(Text) # Legacy discovery JSON; new rows use analysis_blob
+    analysis_blob = Column(LargeBinary) # Compressed final discovery payload (often 10MB+ as JSON)
+    byte_size = Column(Integer)
+    last_accessed = Column(DateTime)
+    dependencies = Column(Text) # JSON {input_key: version}, see CacheInputVersion
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheInputVersion(Base):
+    """Version counter per cache input (a file, a model's relevance mapping or stack, the PB/MI tables)."""
+    __tablename__ = "cache_input_versions"
+    input_key = Column(String(200), primary_key=True) # e.g. 'relevance:12', 'stack:12', 'private_brands'
+    version = Column(Integer, nullable=False, default=0)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class PrivateBrand(Base):
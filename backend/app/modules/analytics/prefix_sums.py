@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ==========================================================
+# CUMULATIVE DATE SUMS
+# ==========================================================
+# Per file and grouping, the per-date sums of each measure accumulated over the sorted dates.
+# The sums over any [start, end] are then two binary searches and one subtraction per group,
+# instead of a scan of the file's rows.
+
+DATE_COLUMN = "__date"
+GROUP_COLUMN = "__group"
+ROWS_COLUMN = "__rows"  # rows per (date, group), so groups without rows in a range can be left out
+MAX_ENTRIES = 64
+
+CacheKey = Tuple[str, str, str]
+
+
+def daily_sums(df: pd.DataFrame, date_col: str, group_col: str, measures: List[str]) -> pd.DataFrame:
+    """
+    One row per (date, group) with the summed measures and row count, in the DATE/GROUP/ROWS layout.
+    Measures must already be numeric; rows whose date does not parse are dropped.
+    """
+    frame = pd.DataFrame({
+        DATE_COLUMN: pd.to_datetime(df[date_col], errors="coerce"),
+        GROUP_COLUMN: df[group_col],
+        ROWS_COLUMN: 1,
+    })
+    for measure in measures:
+        frame[measure] = df[measure]
+    frame = frame.dropna(subset=[DATE_COLUMN])
+    # Rows without a group still count towards the date bounds; range_sums leaves the group out
+    return frame.groupby([DATE_COLUMN, GROUP_COLUMN], dropna=False).sum().reset_index()
+
+
+def merge_daily_sums(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """Combines daily_sums of several chunks of the same file."""
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts, ignore_index=True).groupby([DATE_COLUMN, GROUP_COLUMN], dropna=False).sum().reset_index()
+
+
+class PrefixSums:
+    def __init__(self, daily: pd.DataFrame):
+        self.measures = [c for c in daily.columns if c not in (DATE_COLUMN, GROUP_COLUMN, ROWS_COLUMN)]
+        self.integer_measures = {c for c in self.measures if pd.api.types.is_integer_dtype(daily[c])}
+        self.mapping: Dict[str, str] = {}  # logical field -> measure column, filled in by the caller
+        self.dates = np.unique(daily[DATE_COLUMN].to_numpy())
+        # Same order groupby gives, so range results line up with a direct aggregation
+        self.groups = pd.Index(daily[GROUP_COLUMN].unique()).sort_values()
+
+        values = np.zeros((len(self.dates), len(self.groups), len(self.measures) + 1))
+        date_idx = np.searchsorted(self.dates, daily[DATE_COLUMN].to_numpy())
+        group_idx = self.groups.get_indexer(daily[GROUP_COLUMN])
+        values[date_idx, group_idx] = daily[self.measures + [ROWS_COLUMN]].to_numpy(dtype=float)
+
+        # Row 0 is all zeros so a range starting at the first date needs no special case
+        self.cumulative = np.zeros((len(self.dates) + 1, len(self.groups), len(self.measures) + 1))
+        np.cumsum(values, axis=0, out=self.cumulative[1:])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.cumulative.nbytes)
+
+    def bounds(self) -> Dict[str, str]:
+        if not len(self.dates):
+            return {"start_date": "N/A", "end_date": "N/A"}
+        return {
+            "start_date": pd.Timestamp(self.dates[0]).strftime("%Y-%m-%d"),
+            "end_date": pd.Timestamp(self.dates[-1]).strftime("%Y-%m-%d"),
+        }
+
+    def range_sums(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """Per-group sums over dates in [start_date, end_date] (inclusive, either bound open)."""
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, pd.to_datetime(start_date).to_datetime64(), "left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, pd.to_datetime(end_date).to_datetime64(), "right"))
+        sums = self.cumulative[max(hi, lo)] - self.cumulative[lo]
+
+        present = (sums[:, -1] > 0) & self.groups.notna()
+        columns = {GROUP_COLUMN: self.groups[present]}
+        for idx, measure in enumerate(self.measures):
+            column = sums[present, idx]
+            columns[measure] = np.rint(column).astype(np.int64) if measure in self.integer_measures else column
+        return pd.DataFrame(columns)
+
+
+class PrefixSumCache:
+    """Per-worker LRU of built PrefixSums keyed by (file_id, source fingerprint, grouping)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, PrefixSums]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: Any, fingerprint: str, group_by: str) -> Optional[PrefixSums]:
+        key = (str(file_id), fingerprint, group_by)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, file_id: Any, fingerprint: str, group_by: str, sums: PrefixSums) -> PrefixSums:
+        with self._lock:
+            self._entries[(str(file_id), fingerprint, group_by)] = sums
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return sums
+
+    def invalidate(self, file_id: Any) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(file_id)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+            }
+
+
+prefix_cache = PrefixSumCache(MAX_ENTRIES)
@@ -0,0 +1,412 @@
+import json
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from .models import AnalyticalResult, DiscoveryAnalysisCache
+from . import invalidation
+from .shared_cache import shared_cache, result_key
+
+settings = get_settings()
+
+# ==========================================================
+# COMPRESSED RESULT STORE
+# ==========================================================
+# Payloads for AnalyticalResult and DiscoveryAnalysisCache are orjson-encoded and
+# zstd-compressed into a binary column, with their stored size and last access time
+# tracked for eviction. Rows written before this store keep their JSON text column and
+# are still readable. orjson/zstandard are optional at runtime: json and zlib stand in.
+
+ZSTD_LEVEL = 3
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+TOUCH_INTERVAL = timedelta(minutes=5)  # last_accessed is only rewritten when older than this
+
+# Only results that can be recomputed from the source file are evicted. Brand exclusion rows
+# carry reviewer edits and brand stack build records are state, so they are never evicted.
+EVICTABLE_RESULT_PREFIXES = (
+    "subcategory_summary_", "l2_values", "l3_analysis_", "correlation",
+    "weekly_sales_", "weekly_series_", "model_group_metrics_", "exclude_analysis_",
+)
+
+# (binary column, legacy text column) per table
+_PAYLOAD_COLUMNS = {
+    AnalyticalResult.__tablename__: ("result_blob", "result_data"),
+    DiscoveryAnalysisCache.__tablename__: ("analysis_blob", "analysis_data"),
+}
+
+
+def encode(data: Any) -> bytes:
+    try:
+        import orjson
+        raw = orjson.dumps(
+            data,
+            default=str,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    except ImportError:
+        raw = json.dumps(data, default=str).encode("utf-8")
+
+    try:
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    except ImportError:
+        return zlib.compress(raw)
+
+
+def decode(blob: bytes) -> Any:
+    if blob[:4] == ZSTD_MAGIC:
+        import zstandard
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raw = zlib.decompress(blob)
+
+    try:
+        import orjson
+        return orjson.loads(raw)
+    except ImportError:
+        return json.loads(raw)
+
+
+def read_payload(row) -> Optional[Any]:
+    """Decoded payload of an AnalyticalResult / DiscoveryAnalysisCache row (compressed or legacy JSON)."""
+    blob_col, text_col = _PAYLOAD_COLUMNS[row.__tablename__]
+    blob = getattr(row, blob_col)
+    if blob:
+        return decode(blob)
+    text = getattr(row, text_col)
+    return json.loads(text) if text else None
+
+
+def write_payload(row, data: Any, dependencies: Optional[str] = None) -> int:
+    """
+    Stores data compressed on the row (caller commits), with its dependency record when given
+    (see invalidation.snapshot). Returns the stored size in bytes.
+    """
+    blob_col, text_col = _PAYLOAD_COLUMNS[row.__tablename__]
+    blob = encode(data)
+    now = datetime.utcnow()
+    if dependencies is not None:
+        row.dependencies = dependencies
+    setattr(row, blob_col, blob)
+    setattr(row, text_col, None)
+    row.byte_size = len(blob)
+    row.last_accessed = now
+    row.updated_at = now
+    if isinstance(row, AnalyticalResult):
+        result_cache.invalidate(row.file_id, row.result_type)
+        if row.file_id is not None:
+            shared_cache.set(result_key(row.file_id, row.result_type, now), blob)
+    return len(blob)
+
+
+def touch(db: Session, row) -> None:
+    """Records a read for LRU eviction, at most once per TOUCH_INTERVAL per row."""
+    now = datetime.utcnow()
+    if row.last_accessed and now - row.last_accessed < TOUCH_INTERVAL:
+        return
+    model = type(row)
+    pk = model.result_id if model is AnalyticalResult else model.cache_id
+    # Write the access time only; updated_at versions the payload (and carries onupdate on the discovery table)
+    values = {model.last_accessed: now, model.updated_at: model.updated_at}
+    try:
+        db.query(model).filter(pk == getattr(row, pk.key)).update(values, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[WARNING] Failed to record result access: {e}")
+
+
+# ==========================================================
+# PER-WORKER DECODED RESULT CACHE
+# ==========================================================
+# Decoded AnalyticalResult payloads keyed by (file_id, result_type, version), where version is
+# the row's updated_at. Lookups still read the version from the DB (one narrow query, no payload),
+# so a write from any worker makes older entries unreachable. Cached objects are shared between
+# requests and must be treated as read-only. The cache is bounded by the estimated in-memory size
+# of the decoded payloads, not by entry count: one correlation matrix can outweigh a hundred summaries.
+
+ResultKey = Tuple[int, str]
+
+
+def payload_nbytes(data: Any) -> int:
+    """Approximate in-memory size of a decoded payload: the sum of sys.getsizeof over every nested object."""
+    total = 0
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return total
+
+
+class DecodedResultCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[ResultKey, Tuple[Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, file_id: Any, result_type: str, version: Any) -> Optional[Any]:
+        key = (int(file_id), result_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, file_id: Any, result_type: str, version: Any, data: Any) -> None:
+        size = payload_nbytes(data)
+        if size > self.max_bytes:
+            return
+        key = (int(file_id), result_type)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (version, data, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, file_id: Any, result_type: Optional[str] = None) -> None:
+        with self._lock:
+            if result_type is not None:
+                self._drop((int(file_id), result_type))
+                return
+            for key in [k for k in self._entries if k[0] == int(file_id)]:
+                self._drop(key)
+
+    def invalidate_types(self, result_types: Iterable[str]) -> None:
+        types = set(result_types)
+        with self._lock:
+            for key in [k for k in self._entries if k[1] in types]:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def has_room(self) -> bool:
+        with self._lock:
+            return self.current_bytes < self.max_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _drop(self, key: ResultKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+result_cache = DecodedResultCache(settings.result_cache_max_bytes)
+
+
+def _version_row(db: Session, file_id: int, result_type: str):
+    """Id, version and access time of a current result row, without loading its payload. Stale rows read as missing."""
+    version_row = db.query(
+        AnalyticalResult.result_id, AnalyticalResult.updated_at, AnalyticalResult.created_at,
+        AnalyticalResult.last_accessed, AnalyticalResult.dependencies
+    ).filter(
+        AnalyticalResult.file_id == file_id,
+        AnalyticalResult.result_type == result_type
+    ).first()
+    if version_row and not invalidation.is_current(db, version_row.dependencies, invalidation.result_family(result_type)):
+        return None
+    return version_row
+
+
+def result_version(db: Session, file_id: int, result_type: str) -> Optional[datetime]:
+    """Version of a persisted result (its last write time), or None when nothing is stored."""
+    version_row = _version_row(db, file_id, result_type)
+    if not version_row:
+        return None
+    return version_row.updated_at or version_row.created_at
+
+
+def load_stale_result(db: Session, file_id: int, result_type: str) -> Optional[Any]:
+    """
+    Decoded payload of a result row whose inputs may have changed (bypasses the decoded cache).
+    Entries from an older algorithm version are never returned: their format may differ.
+    """
+    db_result = db.query(AnalyticalResult).filter(
+        AnalyticalResult.file_id == file_id,
+        AnalyticalResult.result_type == result_type
+    ).first()
+    if not db_result or not invalidation.algorithm_current(db_result.dependencies, invalidation.result_family(result_type)):
+        return None
+    return read_payload(db_result)
+
+
+def load_outdated_result(db: Session, file_id: int, result_type: str) -> Optional[Tuple[Any, Optional[str]]]:
+    """(payload, dependency record) of an entry written by an older algorithm version, else None."""
+    db_result = db.query(AnalyticalResult).filter(
+        AnalyticalResult.file_id == file_id,
+        AnalyticalResult.result_type == result_type
+    ).first()
+    if not db_result or invalidation.algorithm_current(db_result.dependencies, invalidation.result_family(result_type)):
+        return None
+    return read_payload(db_result), db_result.dependencies
+
+
+def outdated_results(db: Session) -> List[Tuple[int, str]]:
+    """(file_id, result_type) of every entry written by an older algorithm version than the code's."""
+    rows = db.query(AnalyticalResult.file_id, AnalyticalResult.result_type, AnalyticalResult.dependencies).all()
+    return [
+        (row.file_id, row.result_type) for row in rows
+        if not invalidation.algorithm_current(row.dependencies, invalidation.result_family(row.result_type))
+    ]
+
+
+def load_result(db: Session, file_id: int, result_type: str) -> Optional[Any]:
+    """Decoded AnalyticalResult payload, served from the per-worker cache when its version is current."""
+    version_row = _version_row(db, file_id, result_type)
+    if not version_row:
+        result_cache.invalidate(file_id, result_type)
+        return None
+
+    version = version_row.updated_at or version_row.created_at
+    data = result_cache.get(file_id, result_type, version)
+    if data is None:
+        # Another worker may already hold the payload in the shared tier, saving the blob fetch
+        shared = shared_cache.get(result_key(file_id, result_type, version))
+        data = decode(shared) if shared is not None else None
+    if data is None:
+        db_result = db.query(AnalyticalResult).filter(AnalyticalResult.result_id == version_row.result_id).first()
+        data = read_payload(db_result) if db_result else None
+        if data is None:
+            return None
+        if shared_cache.enabled:
+            shared_cache.set(result_key(file_id, result_type, version), db_result.result_blob or encode(data))
+    result_cache.put(file_id, result_type, version, data)
+
+    # Record the access without loading the row again
+    now = datetime.utcnow()
+    if not version_row.last_accessed or now - version_row.last_accessed >= TOUCH_INTERVAL:
+        try:
+            db.query(AnalyticalResult).filter(AnalyticalResult.result_id == version_row.result_id).update(
+                {AnalyticalResult.last_accessed: now}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Failed to record result access: {e}")
+    return data
+
+
+def _evictable_results(query):
+    return query.filter(or_(*[AnalyticalResult.result_type.like(f"{prefix}%") for prefix in EVICTABLE_RESULT_PREFIXES]))
+
+
+def evict(db: Session, max_bytes: Optional[int] = None, ttl_days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Drops evictable rows idle for longer than the TTL, then least recently used rows until both
+    tables together fit in max_bytes. Legacy rows are sized from their JSON text first.
+    """
+    max_bytes = settings.result_store_max_bytes if max_bytes is None else max_bytes
+    ttl_days = settings.result_store_ttl_days if ttl_days is None else ttl_days
+    cutoff = datetime.utcnow() - timedelta(days=ttl_days)
+
+    # Backfill sizes of rows written before the store existed
+    db.query(AnalyticalResult).filter(
+        AnalyticalResult.byte_size.is_(None), AnalyticalResult.result_data.isnot(None)
+    ).update({AnalyticalResult.byte_size: func.length(AnalyticalResult.result_data)}, synchronize_session=False)
+    db.query(DiscoveryAnalysisCache).filter(
+        DiscoveryAnalysisCache.byte_size.is_(None), DiscoveryAnalysisCache.analysis_data.isnot(None)
+    ).update({DiscoveryAnalysisCache.byte_size: func.length(DiscoveryAnalysisCache.analysis_data)}, synchronize_session=False)
+
+    result_access = func.coalesce(AnalyticalResult.last_accessed, AnalyticalResult.created_at)
+    discovery_access = func.coalesce(DiscoveryAnalysisCache.last_accessed, DiscoveryAnalysisCache.updated_at)
+
+    expired = _evictable_results(db.query(AnalyticalResult)).filter(result_access < cutoff).delete(synchronize_session=False)
+    expired += db.query(DiscoveryAnalysisCache).filter(discovery_access < cutoff).delete(synchronize_session=False)
+
+    total = (db.query(func.coalesce(func.sum(AnalyticalResult.byte_size), 0)).scalar() or 0) + \
+            (db.query(func.coalesce(func.sum(DiscoveryAnalysisCache.byte_size), 0)).scalar() or 0)
+
+    evicted = 0
+    if total > max_bytes:
+        candidates = [
+            (accessed, AnalyticalResult, row_id, size or 0)
+            for row_id, size, accessed in _evictable_results(
+                db.query(AnalyticalResult.result_id, AnalyticalResult.byte_size, result_access)
+            ).all()
+        ] + [
+            (accessed, DiscoveryAnalysisCache, row_id, size or 0)
+            for row_id, size, accessed in db.query(
+                DiscoveryAnalysisCache.cache_id, DiscoveryAnalysisCache.byte_size, discovery_access
+            ).all()
+        ]
+        candidates.sort(key=lambda c: c[0] or datetime.min)
+        for _, model, row_id, size in candidates:
+            if total <= max_bytes:
+                break
+            pk = model.result_id if model is AnalyticalResult else model.cache_id
+            db.query(model).filter(pk == row_id).delete(synchronize_session=False)
+            total -= size
+            evicted += 1
+
+    db.commit()
+    stats = {"expired": expired, "evicted": evicted, "total_bytes": total, "max_bytes": max_bytes}
+    if expired or evicted:
+        print(f"[CACHE] Result store eviction: {stats}")
+    return stats
+
+
+_eviction_thread: Optional[threading.Thread] = None
+
+
+def _eviction_loop(interval: int) -> None:
+    while True:
+        time.sleep(interval)
+        db = SessionLocal()
+        try:
+            evict(db)
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Result store eviction failed: {e}")
+        finally:
+            db.close()
+
+
+def start_eviction_job() -> None:
+    """Starts the periodic eviction thread once per process."""
+    global _eviction_thread
+    if _eviction_thread is not None or settings.result_store_eviction_interval_seconds <= 0:
+        return
+    _eviction_thread = threading.Thread(
+        target=_eviction_loop,
+        args=(settings.result_store_eviction_interval_seconds,),
+        name="result-store-eviction",
+        daemon=True,
+    )
+    _eviction_thread.start()
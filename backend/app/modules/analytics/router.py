@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, BackgroundTasks, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 
@@ -7,10 +7,24 @@ from app.core.rbac import get_current_user
 from . import service, schemas, models
 from . import stack
 from . import discovery
+from . import http_cache
+from . import invalidation
 import pandas as pd
 
 router = APIRouter(tags=["analytics"])
 
+def _conditional(request: Request, response: Response, etag_fn, compute):
+    """
+    Answers If-None-Match with 304 when the cached result is unchanged, without loading it.
+    Otherwise computes the payload and tags it with the ETag of the version just served.
+    """
+    not_modified = http_cache.not_modified(request, etag_fn())
+    if not_modified:
+        return not_modified
+    result = compute()
+    http_cache.tag_response(response, etag_fn())
+    return result
+
 # EDA Produce Category
 @router.get("/eda/exclude-analysis", response_model=Dict[str, Any])
 async def get_exclude_analysis(
@@ -31,6 +45,7 @@ async def update_relevance(
 # File Management & Analysis
 @router.post("/files/upload")
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...), 
     category: Optional[str] = Query(None),
     model_id: Optional[int] = Query(None),
@@ -38,7 +53,7 @@ async def upload_file(
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_user)
 ):
-    return await service.handle_file_upload(db, file, current_user.user_id, category, model_id, is_analysis)
+    return await service.handle_file_upload(db, file, current_user.user_id, category, model_id, is_analysis, background_tasks)
 
 from app.modules.governance import schemas as gov_schemas
 
@@ -65,6 +80,24 @@ def delete_file(file_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="File not found")
     return {"status": "success", "message": "File deleted"}
 
+@router.get("/files/cache-stats")
+def get_cache_stats():
+    return {
+        "dataframes": service.frame_cache.stats(),
+        "results": service.result_store.result_cache.stats(),
+        "prefix_sums": service.prefix_cache.stats(),
+        "sorted_indexes": service.index_cache.stats(),
+        "correlation_series": service.series_cache.stats(),
+        "shared": service.shared_cache.shared_cache.stats(),
+    }
+
+@router.get("/files/{file_id}/processing-status")
+def get_processing_status(file_id: int, db: Session = Depends(get_db)):
+    result = service.get_processing_status_data(db, file_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="File not found")
+    return result
+
 @router.get("/files/{file_id}/preview")
 def get_file_preview(file_id: str, rows: int = 5):
     return service.get_file_preview_data(file_id, rows)
@@ -72,17 +105,27 @@ def get_file_preview(file_id: str, rows: int = 5):
 @router.get("/files/{file_id}/subcategory-summary", response_model=schemas.SubcategorySummaryResponse)
 def get_subcategory_summary(
     file_id: str,
+    request: Request,
+    response: Response,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     group_by: str = "l2",
     auto_bucket: bool = False,
     db: Session = Depends(get_db)
 ):
-    return service.get_subcategory_summary_data(db, file_id, start_date, end_date, group_by, auto_bucket)
+    return _conditional(
+        request, response,
+        lambda: service.subcategory_summary_etag(db, file_id, group_by, start_date, end_date),
+        lambda: service.get_subcategory_summary_data(db, file_id, start_date, end_date, group_by, auto_bucket)
+    )
 
 @router.get("/files/{file_id}/l2-values", response_model=schemas.L2ValuesResponse)
-def get_l2_values(file_id: str, db: Session = Depends(get_db)):
-    return service.get_l2_values_data(db, file_id)
+def get_l2_values(file_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    return _conditional(
+        request, response,
+        lambda: service.result_etag(db, file_id, service.L2_VALUES_RESULT),
+        lambda: service.get_l2_values_data(db, file_id)
+    )
 
 @router.get("/files/{file_id}/model-groups", response_model=schemas.ModelGroupsResponse)
 def get_model_groups(file_id: str, db: Session = Depends(get_db)):
@@ -103,21 +146,106 @@ def apply_auto_model_groups(file_id: str, payload: schemas.AutoGroupingApplyRequ
 @router.get("/files/{file_id}/l3-analysis", response_model=schemas.L3AnalysisResponse)
 def get_l3_analysis(
     file_id: str,
+    request: Request,
+    response: Response,
     limit_l2: Optional[str] = None,
-    rows: int = 100,
+    rows: int = Query(100, ge=0),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_dir: Optional[str] = None,
+    search: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    return service.get_l3_analysis_data(db, file_id, limit_l2, rows, start_date, end_date)
+    query = (limit_l2, rows, offset, cursor, sort_by, sort_dir, search)
+    try:
+        return _conditional(
+            request, response,
+            lambda: service.l3_analysis_etag(db, file_id, *query),
+            lambda: service.get_l3_analysis_data(db, file_id, limit_l2, rows, start_date, end_date, offset, cursor, sort_by, sort_dir, search)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/files/{file_id}/correlation", response_model=schemas.CorrelationResponse)
-def get_correlation(file_id: str, db: Session = Depends(get_db)):
-    return service.get_correlation_data(db, file_id)
+def get_correlation(file_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    return _conditional(
+        request, response,
+        lambda: service.result_etag(db, file_id, service.CORRELATION_RESULT),
+        lambda: service.get_correlation_data(db, file_id)
+    )
+
+@router.get("/files/{file_id}/correlation/edges", response_model=schemas.CorrelationEdgesResponse)
+def get_correlation_edges(
+    file_id: str,
+    request: Request,
+    response: Response,
+    level: str = "l2",
+    top_k: Optional[int] = Query(None, ge=1),
+    threshold: Optional[float] = Query(None, ge=0, le=1),
+    series: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        return _conditional(
+            request, response,
+            lambda: service.correlation_edges_etag(db, file_id, level, top_k, threshold, series),
+            lambda: service.get_correlation_edges(file_id, level, top_k, threshold, series)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/files/{file_id}/spend-lag-correlation", response_model=schemas.SpendLagCorrelationResponse)
+def get_spend_lag_correlation(
+    file_id: str,
+    request: Request,
+    response: Response,
+    metric: str = "sales",
+    min_lag: int = Query(0, ge=-52, le=52),
+    max_lag: int = Query(8, ge=-52, le=52),
+    l2: Optional[str] = None,
+    group: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        return _conditional(
+            request, response,
+            lambda: service.spend_lag_correlation_etag(db, file_id, metric, min_lag, max_lag, l2, group),
+            lambda: service.get_spend_lag_correlation(db, file_id, metric, min_lag, max_lag, l2, group)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/files/{file_id}/weekly-sales", response_model=schemas.WeeklySalesResponse)
-def get_weekly_sales(file_id: str, metric: str = "sales", db: Session = Depends(get_db)):
-    return service.get_weekly_sales_data(db, file_id, metric)
+def get_weekly_sales(file_id: str, request: Request, response: Response, metric: str = "sales", db: Session = Depends(get_db)):
+    return _conditional(
+        request, response,
+        lambda: service.result_etag(db, file_id, service.weekly_sales_result_type(metric)),
+        lambda: service.get_weekly_sales_data(db, file_id, metric)
+    )
+
+@router.get("/files/{file_id}/weekly-series", response_model=schemas.WeeklySeriesResponse)
+def get_weekly_series(
+    file_id: str,
+    request: Request,
+    response: Response,
+    metrics: Optional[List[str]] = Query(None),
+    dimensions: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    # Accepts repeated parameters or comma-separated lists; dimensions= (empty) gives totals per week
+    metrics = [m for value in metrics for m in value.split(",") if m] if metrics else None
+    dimensions = [d for value in dimensions for d in value.split(",") if d] if dimensions is not None else None
+    try:
+        return _conditional(
+            request, response,
+            lambda: service.result_etag(db, file_id, service.weekly_series_result_type(metrics, dimensions)),
+            lambda: service.get_weekly_series_data(db, file_id, metrics, dimensions)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/files/{file_id}/model-group-weekly-sales", response_model=schemas.ModelGroupWeeklySalesResponse)
 def get_model_group_weekly_sales(file_id: str, db: Session = Depends(get_db)):
@@ -151,10 +279,68 @@ def get_report_comments(file_id: str, db: Session = Depends(get_db)):
 @router.get("/files/{file_id}/brand-exclusion", response_model=schemas.BrandExclusionResponse)
 async def get_brand_exclusion(
     file_id: str,
+    request: Request,
+    response: Response,
+    model_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    result_type = service.brand_exclusion_result_type(model_id)
+    not_modified = http_cache.not_modified(request, service.result_etag(db, file_id, result_type))
+    if not_modified:
+        return not_modified
+    result = await service.get_brand_exclusion_data(file_id, db, model_id)
+    http_cache.tag_response(response, service.result_etag(db, file_id, result_type))
+    return result
+
+@router.get("/files/{file_id}/brand-exclusion/summary", response_model=schemas.BrandExclusionSummaryResponse)
+async def get_brand_exclusion_summary(
+    file_id: str,
+    request: Request,
+    response: Response,
+    model_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    result_type = service.brand_exclusion_result_type(model_id)
+    not_modified = http_cache.not_modified(request, service.result_etag(db, file_id, result_type))
+    if not_modified:
+        return not_modified
+    result = await service.get_brand_exclusion_summary(file_id, db, model_id)
+    http_cache.tag_response(response, service.result_etag(db, file_id, result_type))
+    return result
+
+@router.get("/files/{file_id}/brand-exclusion/buckets/{part}/{bucket}", response_model=schemas.BrandExclusionBucketResponse)
+async def get_brand_exclusion_bucket(
+    file_id: str,
+    part: str,
+    bucket: str,
+    request: Request,
+    response: Response,
     model_id: Optional[int] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
     db: Session = Depends(get_db)
 ):
-    return await service.get_brand_exclusion_data(file_id, db, model_id)
+    if service.find_brand_bucket(part, bucket) is None:
+        raise HTTPException(status_code=404, detail="Unknown bucket")
+    result_type = service.brand_exclusion_result_type(model_id)
+    not_modified = http_cache.not_modified(request, service.result_etag(db, file_id, result_type))
+    if not_modified:
+        return not_modified
+    result = await service.get_brand_exclusion_bucket(file_id, db, model_id, part, bucket, offset, limit)
+    http_cache.tag_response(response, service.result_etag(db, file_id, result_type))
+    return result
+
+@router.get("/files/{file_id}/brand-exclusion/brands/{brand}", response_model=schemas.BrandExclusionRow)
+async def get_brand_exclusion_brand(
+    file_id: str,
+    brand: str,
+    model_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    row = await service.get_brand_exclusion_brand(file_id, db, model_id, brand)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Brand not found in result")
+    return row
 
 @router.post("/eda/brand-exclusion/update")
 async def update_brand_exclusion(
@@ -185,14 +371,22 @@ async def build_stack(
 @router.get("/files/{file_id}/build-stack", response_model=schemas.StackBuildResponse)
 async def get_built_stack(
     file_id: int,
+    request: Request,
+    response: Response,
     stack_type: str = Query("brand"),
     db: Session = Depends(get_db)
 ):
     try:
         from .service import get_persisted_result
-        res = get_persisted_result(db, file_id, f"brand_stacks_build_{stack_type}")
+        result_type = f"brand_stacks_build_{stack_type}"
+        etag = service.result_etag(db, file_id, result_type)
+        not_modified = http_cache.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        res = get_persisted_result(db, file_id, result_type)
         if not res:
             raise HTTPException(status_code=404, detail="Stack not built yet.")
+        http_cache.tag_response(response, etag)
         return res
     except HTTPException:
         raise
@@ -204,11 +398,19 @@ async def get_built_stack(
 @router.get("/eda/discovery/{model_id}", response_model=schemas.DiscoveryChartResponse)
 async def get_discovery_analysis(
     model_id: int,
+    request: Request,
+    response: Response,
     refresh: bool = False,
     db: Session = Depends(get_db)
 ):
     try:
-        return discovery.get_discovery_data(db, model_id, force_refresh=refresh)
+        if not refresh:
+            not_modified = http_cache.not_modified(request, discovery.get_discovery_etag(db, model_id))
+            if not_modified:
+                return not_modified
+        result = discovery.get_discovery_data(db, model_id, force_refresh=refresh)
+        http_cache.tag_response(response, discovery.get_discovery_etag(db, model_id))
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -240,10 +442,16 @@ async def generate_discovery_insights(
 @router.get("/eda/brand-agg/{model_id}")
 async def get_brand_agg_analysis(
     model_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     try:
-        return service.get_brand_agg_stack(db, model_id)
+        return _conditional(
+            request, response,
+            lambda: service.get_brand_agg_etag(db, model_id),
+            lambda: service.get_brand_agg_stack(db, model_id)
+        )
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -264,6 +472,7 @@ def create_mapping_issue(
     issue = models.MappingIssue(**payload.dict())
     db.add(issue)
     try:
+        invalidation.bump(db, invalidation.MAPPING_ISSUES)
         db.commit()
         db.refresh(issue)
     except Exception as e:
@@ -286,6 +495,7 @@ def update_mapping_issue(
     for key, value in update_data.items():
         setattr(issue, key, value)
         
+    invalidation.bump(db, invalidation.MAPPING_ISSUES)
     db.commit()
     db.refresh(issue)
     return issue
@@ -301,6 +511,7 @@ def delete_mapping_issue(
         raise HTTPException(status_code=404, detail="Mapping issue not found")
     
     db.delete(issue)
+    invalidation.bump(db, invalidation.MAPPING_ISSUES)
     db.commit()
     return None
 
@@ -318,6 +529,7 @@ def create_private_brand(
     pb = models.PrivateBrand(**payload.dict())
     db.add(pb)
     try:
+        invalidation.bump(db, invalidation.PRIVATE_BRANDS)
         db.commit()
         db.refresh(pb)
     except Exception as e:
@@ -340,6 +552,7 @@ def update_private_brand(
     for key, value in update_data.items():
         setattr(pb, key, value)
         
+    invalidation.bump(db, invalidation.PRIVATE_BRANDS)
     db.commit()
     db.refresh(pb)
     return pb
@@ -355,5 +568,6 @@ def delete_private_brand(
         raise HTTPException(status_code=404, detail="Private brand not found")
     
     db.delete(pb)
+    invalidation.bump(db, invalidation.PRIVATE_BRANDS)
     db.commit()
     return None
@@ -146,6 +146,35 @@ class CorrelationResponse(BaseModel):
     l2_values: List[str]
     matrix: List[List[float]]
 
+class CorrelationEdge(BaseModel):
+    source: str
+    target: str
+    r: float
+
+class CorrelationEdgesResponse(BaseModel):
+    file_id: Any
+    level: str
+    series_count: int
+    date_count: int
+    edges: List[CorrelationEdge]
+    missing: List[str] = []
+
+class SpendLagTactic(BaseModel):
+    tactic: str
+    label: str
+    r: List[float]
+    peak_lag: int
+    peak_r: float
+
+class SpendLagCorrelationResponse(BaseModel):
+    file_id: Any
+    metric: str
+    l2_values: Optional[List[str]] = None
+    group: Optional[str] = None
+    weeks: int
+    lags: List[int]
+    tactics: List[SpendLagTactic]
+
 # Model Group Weekly Metrics
 class ModelGroupWeeklyMetricsRequest(BaseModel):
     group_names: List[str]
@@ -165,6 +194,14 @@ class WeeklySalesResponse(BaseModel):
     l2_values: List[str]
     series: List[Dict[str, Any]]
 
+class WeeklySeriesResponse(BaseModel):
+    file_id: Any
+    metrics: List[str]
+    dimensions: List[str]
+    columns: Dict[str, List[Any]]
+    row_count: int
+    missing_metrics: List[str] = []
+
 # L3 Analysis
 class L3AnalysisRow(BaseModel):
     l2: str
@@ -178,6 +215,11 @@ class L3AnalysisMeta(BaseModel):
     unique_l2: int
     unique_l3: int
     row_count: int
+    total_rows: Optional[int] = None
+    offset: int = 0
+    next_cursor: Optional[str] = None
+    sort_by: Optional[str] = None
+    sort_dir: Optional[str] = None
 
 class L3AnalysisResponse(BaseModel):
     file_id: Any
@@ -261,6 +303,20 @@ class BrandExclusionResponse(BaseModel):
     summary: BrandExclusionSummary
     warnings: List[str] = []
 
+class BrandExclusionSummaryResponse(BaseModel):
+    file_id: Any
+    summary: BrandExclusionSummary
+    warnings: List[str] = []
+    row_count: int = 0
+
+class BrandExclusionBucketResponse(BaseModel):
+    file_id: Any
+    part: str
+    bucket: str
+    type: str
+    total: int
+    rows: List[BrandExclusionRow]
+
 # Discovery Tool Schemas
 class DiscoveryChartResponse(BaseModel):
     columns: List[str]
@@ -1,19 +1,35 @@
 import os
 import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from datetime import datetime
 from uuid import uuid4
-from fastapi import UploadFile
+from fastapi import UploadFile, BackgroundTasks
 from sqlalchemy.orm import Session
 import re
 from difflib import SequenceMatcher
 
 from app.core.database import SessionLocal
+from app.core.config import get_settings
 from app.core import storage as file_storage
 from . import schemas, models
 from .models import DiscoveryStack, DiscoveryStackData
+from .frame_cache import frame_cache
+from .prefix_sums import PrefixSums, prefix_cache, daily_sums, merge_daily_sums, GROUP_COLUMN
+from .sorted_index import SortedIndex, index_cache
+from .correlation import StandardizedSeries, series_cache, series_sums, lagged_cross_correlation, DEFAULT_TOP_K
+from . import arrow_cache
+from . import result_store
+from . import ingest
+from . import http_cache
+from . import invalidation
+from . import single_flight
+from . import shared_cache
 from app.modules.analytics.exclude_flag_automation.Exclude_Flag_function import exclude_flag_automation_function
 
 # ==========================================================
@@ -22,46 +38,64 @@ from app.modules.analytics.exclude_flag_automation.Exclude_Flag_function import
 MAPPING_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "mappings"))
 EDA_DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "produce_category_data.csv"))
 
+# Logical fields mapped to the physical column names seen across raw files, in resolution order
+FIELD_ALIASES = {
+    "sales": ["O_SALE", "O_Sales", "Sales", "Sale", "Total_Sales", "SALES"],
+    "units": ["O_UNIT", "O_Units", "Units", "Unit", "Total_Units", "UNITS"],
+    "search_spends": ["M_SEARCH_SPEND", "Search_Spend", "SEARCH_SPEND"],
+    "onsite_display_spends": [
+        "M_ON_DIS_TOTAL_SPEND", "ONDisplay_Spend", "ON_DIS_SPEND",
+        "M_ON_DIS_TOTAL_SUM_SPEND", "M_TOTAL_DISPLAY_SUM_SPEND"
+    ],
+    "offsite_display_spends": [
+        "M_OFF_DIS_TOTAL_SPEND", "OFFDisplay_Spend", "OFF_DIS_SPEND",
+        "M_OFF_DIS_TOTAL_SUM_SPEND"
+    ],
+    "total_spends": [
+        "Total", "Total_Spend", "TOTAL_SPEND", "SPEND_TOTAL",
+        "M_TOTAL_DISPLAY_SUM_SPEND"
+    ],
+    "l2": ["L2"],
+    "l3": ["L3"],
+    "model_group": ["Model_Group"],
+    "brand": ["UNIQUE_BRAND_NAME", "Brand", "BRAND_NAME"],
+    "date": ["Date", "week_start_date", "week"],
+}
+CUBE_DIMENSIONS = ["date", "l2", "l3", "brand", "model_group"]
+SUMMARY_METRICS = [
+    "sales", "units", "search_spends", "onsite_display_spends",
+    "offsite_display_spends", "total_spends"
+]
+STREAM_CHUNK_ROWS = 500_000  # rows per chunk / Parquet batch in out-of-core aggregation
+
+settings = get_settings()
+
 # ==========================================================
 # CORE ENGINES (MIGRATED FROM LEGACY SERVICES)
 # ==========================================================
 
 def _coerce_numeric(series: pd.Series) -> pd.Series:
+    # Typed sidecars already hold numeric dtypes; only text columns need comma stripping
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.fillna(0)
     cleaned = series.astype(str).str.replace(",", "", regex=False)
     return pd.to_numeric(cleaned, errors="coerce").fillna(0)
 
-def calculate_summary(df: pd.DataFrame, group_by: str = "L2") -> pd.DataFrame:
-    """Core logic to calculate subcategory summary metrics with flexible column mapping."""
-    print(f"[DEBUG] Calculating summary. Columns: {df.columns.tolist()}")
-    
-    # Define mapping of logical fields to possible CSV column names
-    mapping = {
-        "sales": ["O_SALE", "O_Sales", "Sales", "Sale", "Total_Sales", "SALES"],
-        "units": ["O_UNIT", "O_Units", "Units", "Unit", "Total_Units", "UNITS"],
-        "search_spends": ["M_SEARCH_SPEND", "Search_Spend", "SEARCH_SPEND", "M_SEARCH_SPEND"],
-        "onsite_display_spends": [
-            "M_ON_DIS_TOTAL_SPEND", "ONDisplay_Spend", "ON_DIS_SPEND",
-            "M_ON_DIS_TOTAL_SUM_SPEND", "M_TOTAL_DISPLAY_SUM_SPEND"
-        ],
-        "offsite_display_spends": [
-            "M_OFF_DIS_TOTAL_SPEND", "OFFDisplay_Spend", "OFF_DIS_SPEND",
-            "M_OFF_DIS_TOTAL_SUM_SPEND"
-        ],
-        "total_spends": [
-            "Total", "Total_Spend", "TOTAL_SPEND", "SPEND_TOTAL",
-            "TOTAL_SPEND", "M_TOTAL_DISPLAY_SUM_SPEND"
-        ]
-    }
-
-    # Resolve actual columns in df
+def _resolve_summary_columns(columns: List[str], column_map: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Logical summary metric -> physical column, preferring the file's catalogued map."""
+    mapping = {logical: FIELD_ALIASES[logical] for logical in SUMMARY_METRICS}
     resolved_mapping = {}
-    cols_upper = {c.upper(): c for c in df.columns}
+    cols_upper = {c.upper(): c for c in columns}
     
     # Fields that are intentionally derived from other columns (not expected in raw data)
     DERIVED_FIELDS = {"total_spends"}
 
     for logical, alternatives in mapping.items():
         found = False
+        catalogued = (column_map or {}).get(logical)
+        if catalogued in columns:
+            resolved_mapping[logical] = catalogued
+            continue
         for alt in alternatives:
             if alt.upper() in cols_upper:
                 resolved_mapping[logical] = cols_upper[alt.upper()]
@@ -71,34 +105,26 @@ def calculate_summary(df: pd.DataFrame, group_by: str = "L2") -> pd.DataFrame:
             print(f"[WARNING] Could not resolve column for logical field: {logical}")
         elif not found and logical in DERIVED_FIELDS:
             print(f"[DEBUG] '{logical}' will be derived from component columns (search + onsite + offsite).")
-    
-    # Ensure numeric and aggregate
-    for logical, physical in resolved_mapping.items():
-        df[physical] = _coerce_numeric(df[physical])
+    return resolved_mapping
 
-    # Resolving group_col
+def _summary_group_col(columns: List[str], group_by: str) -> str:
+    cols_upper = {c.upper(): c for c in columns}
     target_group = "L2" if group_by.lower() == "l2" else "Model_Group"
-    group_col = cols_upper.get(target_group.upper(), cols_upper.get("L2", df.columns[0]))
-
-    print(f"[DEBUG] Grouping by: {group_col}, resolved_mapping: {list(resolved_mapping.keys())}")
-
-    # Guard: if nothing resolved, we cannot aggregate — return empty summary
-    if not resolved_mapping:
-        print("[WARNING] No numeric columns resolved. Returning empty summary.")
-        return pd.DataFrame(columns=["subcategory", "sales", "units", "search_spends",
-                                     "onsite_display_spends", "offsite_display_spends", "total_spends"])
+    return cols_upper.get(target_group.upper(), cols_upper.get("L2", columns[0]))
 
-    # Aggregator
-    agg_map = {physical: "sum" for physical in resolved_mapping.values()}
-    summary = df.groupby(group_col).agg(agg_map).reset_index()
+def _empty_summary() -> pd.DataFrame:
+    return pd.DataFrame(columns=["subcategory", "sales", "units", "search_spends",
+                                 "onsite_display_spends", "offsite_display_spends", "total_spends"])
 
+def _finalize_summary(summary: pd.DataFrame, resolved_mapping: Dict[str, str], group_col: str) -> pd.DataFrame:
+    """Turns per-group sums of the resolved physical columns into the summary table with derived fields and shares."""
     # Re-map back to logical names
     inv_map = {v: k for k, v in resolved_mapping.items()}
     summary = summary.rename(columns={group_col: "subcategory"})
     summary = summary.rename(columns=inv_map)
 
     # Ensure all columns exist
-    for col in mapping.keys():
+    for col in SUMMARY_METRICS:
         if col not in summary.columns:
             summary[col] = 0.0
 
@@ -131,19 +157,115 @@ def calculate_summary(df: pd.DataFrame, group_by: str = "L2") -> pd.DataFrame:
 
     return summary.fillna(0)
 
+def calculate_summary(df: pd.DataFrame, group_by: str = "L2", column_map: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Core logic to calculate subcategory summary metrics with flexible column mapping.
+    `column_map` is a file's catalogued logical->physical map; fields it covers skip alias resolution.
+    """
+    print(f"[DEBUG] Calculating summary. Columns: {df.columns.tolist()}")
+    resolved_mapping = _resolve_summary_columns(list(df.columns), column_map)
+    
+    # Ensure numeric and aggregate
+    for logical, physical in resolved_mapping.items():
+        df[physical] = _coerce_numeric(df[physical])
+
+    # Resolving group_col
+    group_col = _summary_group_col(list(df.columns), group_by)
+
+    print(f"[DEBUG] Grouping by: {group_col}, resolved_mapping: {list(resolved_mapping.keys())}")
+
+    # Guard: if nothing resolved, we cannot aggregate — return empty summary
+    if not resolved_mapping:
+        print("[WARNING] No numeric columns resolved. Returning empty summary.")
+        return _empty_summary()
+
+    # Aggregator
+    agg_map = {physical: "sum" for physical in resolved_mapping.values()}
+    summary = df.groupby(group_col).agg(agg_map).reset_index()
+    return _finalize_summary(summary, resolved_mapping, group_col)
+
+def calculate_summary_streaming(chunks, group_by: str = "L2", column_map: Optional[Dict[str, str]] = None,
+                                date_col: Optional[str] = None, start_date=None, end_date=None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Out-of-core variant of calculate_summary over an iterator of DataFrame chunks.
+    Each chunk is reduced to per-group partial sums which are merged as they arrive, so memory is
+    proportional to the number of groups. Also returns the date bounds seen before range filtering.
+    """
+    resolved_mapping = None
+    group_col = None
+    partials = None
+    date_min = date_max = None
+
+    for chunk in chunks:
+        if resolved_mapping is None:
+            resolved_mapping = _resolve_summary_columns(list(chunk.columns), column_map)
+            group_col = _summary_group_col(list(chunk.columns), group_by)
+            print(f"[DEBUG] Streaming summary. Grouping by: {group_col}, resolved_mapping: {list(resolved_mapping.keys())}")
+            if not resolved_mapping:
+                print("[WARNING] No numeric columns resolved. Returning empty summary.")
+                return _empty_summary(), {"start_date": "N/A", "end_date": "N/A"}
+
+        if date_col:
+            chunk[date_col] = pd.to_datetime(chunk[date_col], errors="coerce")
+            chunk = chunk.dropna(subset=[date_col])
+            if chunk.empty:
+                continue
+            chunk_min, chunk_max = chunk[date_col].min(), chunk[date_col].max()
+            date_min = chunk_min if date_min is None else min(date_min, chunk_min)
+            date_max = chunk_max if date_max is None else max(date_max, chunk_max)
+            if start_date:
+                chunk = chunk[chunk[date_col] >= pd.to_datetime(start_date)]
+            if end_date:
+                chunk = chunk[chunk[date_col] <= pd.to_datetime(end_date)]
+
+        # One physical column can serve two logical fields (e.g. a display spend that is also the total)
+        physical_cols = list(dict.fromkeys(resolved_mapping.values()))
+        for physical in physical_cols:
+            chunk[physical] = _coerce_numeric(chunk[physical])
+        part = chunk.groupby(group_col)[physical_cols].sum()
+        partials = part if partials is None else pd.concat([partials, part]).groupby(level=0).sum()
+
+    date_bounds = {"start_date": "N/A", "end_date": "N/A"}
+    if date_min is not None:
+        date_bounds = {"start_date": date_min.strftime("%Y-%m-%d"), "end_date": date_max.strftime("%Y-%m-%d")}
+
+    if resolved_mapping is None:
+        return _empty_summary(), date_bounds
+    if partials is None:
+        partials = pd.DataFrame(columns=list(dict.fromkeys(resolved_mapping.values())), index=pd.Index([], name=group_col))
+    return _finalize_summary(partials.reset_index(), resolved_mapping, group_col), date_bounds
+
 # ==========================================================
 # FILE OPERATIONS
 # ==========================================================
-def load_data(file_id: str) -> pd.DataFrame:
+def _source_fingerprint(saved_path: str, checksum: Optional[str]) -> str:
+    """Cache key component that changes whenever the stored source changes."""
+    if checksum:
+        return checksum
+    if os.path.exists(saved_path):
+        stat = os.stat(saved_path)
+        return f"{saved_path}:{stat.st_mtime_ns}:{stat.st_size}"
+    return saved_path
+
+def _resolve_source(file_id: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Returns (stored path, sidecar path, checksum) for a file_id."""
     saved_path = None
+    sidecar_path = None
+    checksum = None
     db = SessionLocal()
     try:
         try:
             db_id = int(file_id)
-            from app.modules.governance.models import ModelFile
+            from app.modules.governance.models import ModelFile, RawDataFile
             db_file = db.query(ModelFile).filter(ModelFile.file_id == db_id).first()
             if db_file:
                 saved_path = db_file.file_path
+                sidecar_path = db_file.sidecar_path
+                raw_file = db.query(RawDataFile).filter(
+                    RawDataFile.file_path == db_file.file_path
+                ).order_by(RawDataFile.uploaded_at.desc()).first()
+                if raw_file:
+                    checksum = raw_file.checksum
         except (ValueError, TypeError):
             pass
     finally:
@@ -156,30 +278,497 @@ def load_data(file_id: str) -> pd.DataFrame:
         except FileNotFoundError:
             pass
 
-    if not saved_path or not file_storage.file_exists(saved_path):
+    if not saved_path:
         raise FileNotFoundError(f"Source file not found for: {file_id}")
+    return saved_path, sidecar_path, checksum
+
+def _readable_local_path(file_id: str, saved_path: str, sidecar_path: Optional[str], checksum: Optional[str] = None) -> str:
+    # Prefer the typed Parquet sidecar written at upload time over re-parsing the CSV
+    if sidecar_path and file_storage.file_exists(sidecar_path):
+        return file_storage.ensure_local_file(sidecar_path)
 
-    # Ensure the file is available locally (downloads from S3/Azure if needed)
-    local_path = file_storage.ensure_local_file(saved_path)
+    if not file_storage.file_exists(saved_path):
+        raise FileNotFoundError(f"Source file not found for: {file_id}")
 
-    if str(local_path).lower().endswith(".parquet"):
-        return pd.read_parquet(local_path)
-    return pd.read_csv(local_path)
+    # Ensure the file is available locally (downloads from S3/Azure if needed, verified against the upload checksum)
+    return file_storage.ensure_local_file(saved_path, checksum)
+
+def local_source_path(file_id: str) -> str:
+    """Local path of the copy load_data reads for a file (sidecar or source), downloading it if needed."""
+    saved_path, sidecar_path, checksum = _resolve_source(file_id)
+    return _readable_local_path(file_id, saved_path, sidecar_path, checksum)
+
+def _is_parquet(path: str) -> bool:
+    return str(path).lower().endswith(".parquet")
+
+def resolve_columns(available: List[str], fields: List[str]) -> List[str]:
+    """
+    Maps logical fields (keys of FIELD_ALIASES) or physical names to the physical columns present,
+    case-insensitively and in file order. Every matching alias is kept so each endpoint's own
+    first-match resolution behaves exactly as it would on the full frame.
+    """
+    wanted = set()
+    for field in fields:
+        for alias in FIELD_ALIASES.get(field, [field]):
+            wanted.add(alias.upper())
+    return [c for c in available if str(c).upper() in wanted]
+
+def _source_columns(file_id: str, saved_path: str, sidecar_path: Optional[str], checksum: Optional[str]) -> List[str]:
+    cached_columns = frame_cache.columns_of(file_id, _source_fingerprint(saved_path, checksum))
+    if cached_columns is not None:
+        return cached_columns
+    schema = get_file_schema(file_id)
+    if schema and schema["dtypes"]:
+        return list(schema["dtypes"].keys())
+
+    # The same verified copy load_data goes on to read, so a cloud source is downloaded once
+    local_path = _readable_local_path(file_id, saved_path, sidecar_path, checksum)
+    if _is_parquet(local_path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(local_path).names)
+    return list(pd.read_csv(local_path, nrows=0).columns)
+
+def infer_column_map(columns: List[str]) -> Dict[str, str]:
+    """First physical column matching each logical field, in FIELD_ALIASES order."""
+    cols_upper = {str(c).upper(): c for c in columns}
+    column_map = {}
+    for logical, alternatives in FIELD_ALIASES.items():
+        for alt in alternatives:
+            if alt.upper() in cols_upper:
+                column_map[logical] = cols_upper[alt.upper()]
+                break
+    return column_map
+
+def save_file_schema(db: Session, file_id: int, ingest_info: Dict[str, Any]):
+    """Persists the schema inferred at ingest so requests can skip column resolution and coercion."""
+    from .models import FileSchema
+    columns = list(ingest_info["dtypes"].keys())
+    column_map = infer_column_map(columns)
+
+    db_schema = db.query(FileSchema).filter(FileSchema.file_id == file_id).first()
+    if not db_schema:
+        db_schema = FileSchema(file_id=file_id)
+        db.add(db_schema)
+    db_schema.column_map = json.dumps(column_map)
+    db_schema.date_column = ingest_info.get("date_column") or column_map.get("date")
+    db_schema.dtypes = json.dumps(ingest_info["dtypes"])
+    db_schema.row_count = ingest_info.get("row_count")
+    db_schema.comma_stripped = json.dumps(ingest_info.get("comma_stripped", []))
+    db_schema.date_min = ingest_info.get("date_min")
+    db_schema.date_max = ingest_info.get("date_max")
+    db_schema.partitions = json.dumps(ingest_info.get("partitions", []))
+    db_schema.created_at = datetime.utcnow()
+    db_schema.updated_at = db_schema.created_at
+    try:
+        db.commit()
+        _schema_cache.pop(str(file_id), None)
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Failed to save schema catalog for file {file_id}: {e}")
+
+# Per-worker copies of catalogued schemas, keyed by the row's updated_at. The catalog is written by
+# whichever worker ran the upload (partitions and cube land after the first save), so every lookup
+# checks the version with a one-column query and re-reads the row when another worker changed it.
+SCHEMA_CACHE_MAX_ENTRIES = 256
+_schema_cache: "OrderedDict[str, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+_schema_cache_lock = threading.Lock()
+
+def get_file_schema(file_id: str) -> Optional[Dict[str, Any]]:
+    """Catalogued schema for a file (column map, date column and bounds, dtypes, row count, comma_stripped, month partitions), or None for legacy uploads."""
+    key = str(file_id)
+    try:
+        db_id = int(file_id)
+    except (ValueError, TypeError):
+        return None
+
+    from .models import FileSchema
+    db = SessionLocal()
+    try:
+        version = db.query(FileSchema.updated_at, FileSchema.created_at).filter(FileSchema.file_id == db_id).first()
+        if version is None:
+            _schema_cache.pop(key, None)
+            return None
+        version = tuple(version)
+        with _schema_cache_lock:
+            cached = _schema_cache.get(key)
+            if cached is not None and cached[0] == version:
+                _schema_cache.move_to_end(key)
+                return cached[1]
+
+        db_schema = db.query(FileSchema).filter(FileSchema.file_id == db_id).first()
+        if not db_schema:
+            return None
+        version = (db_schema.updated_at, db_schema.created_at)
+        schema = {
+            "column_map": json.loads(db_schema.column_map or "{}"),
+            "date_column": db_schema.date_column,
+            "dtypes": json.loads(db_schema.dtypes or "{}"),
+            "row_count": db_schema.row_count,
+            "comma_stripped": json.loads(db_schema.comma_stripped or "[]"),
+            "date_min": db_schema.date_min,
+            "date_max": db_schema.date_max,
+            "partitions": json.loads(db_schema.partitions or "[]"),
+            "cube": json.loads(db_schema.cube) if db_schema.cube else None,
+        }
+    finally:
+        db.close()
+    with _schema_cache_lock:
+        _schema_cache[key] = (version, schema)
+        _schema_cache.move_to_end(key)
+        while len(_schema_cache) > SCHEMA_CACHE_MAX_ENTRIES:
+            _schema_cache.popitem(last=False)
+    return schema
+
+def _schema_column(schema: Optional[Dict[str, Any]], df: pd.DataFrame, logical: str) -> Optional[str]:
+    """Catalogued physical column for a logical field, if it is present in df."""
+    if not schema:
+        return None
+    physical = schema["column_map"].get(logical)
+    return physical if physical in df.columns else None
+
+def save_file_cube(db: Session, file_id: int, df: pd.DataFrame):
+    """Builds the aggregation cube from the full typed frame and records it in the schema catalog."""
+    from .models import FileSchema
+    db_schema = db.query(FileSchema).filter(FileSchema.file_id == file_id).first()
+    if not db_schema:
+        return None
+    column_map = json.loads(db_schema.column_map or "{}")
+    dims = [column_map[d] for d in CUBE_DIMENSIONS if column_map.get(d) in df.columns]
+    from app.modules.governance.models import ModelFile
+    source_path = db.query(ModelFile).filter(ModelFile.file_id == file_id).first().file_path
+
+    cube_info = ingest.write_cube(df, source_path, dims)
+    db_schema.cube = json.dumps(cube_info) if cube_info else None
+    db_schema.updated_at = datetime.utcnow()
+    try:
+        db.commit()
+        _schema_cache.pop(str(file_id), None)
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Failed to save cube for file {file_id}: {e}")
+    return cube_info
+
+def load_cube_frame(file_id: str, columns: List[str]) -> Optional[pd.DataFrame]:
+    """
+    The file's aggregation cube projected to `columns` (logical fields or physical names), or None
+    when there is no cube or it lacks one of the requested columns the raw file has. Callers then
+    fall back to load_data; any view built only from sums gives the same answer on either.
+    """
+    schema = get_file_schema(file_id)
+    if not schema or not schema["cube"]:
+        return None
+    wanted = resolve_columns(list(schema["dtypes"].keys()), columns)
+    if not wanted or any(c not in schema["cube"]["columns"] for c in wanted):
+        return None
+
+    saved_path, _, checksum = _resolve_source(file_id)
+    fingerprint = f"{_source_fingerprint(saved_path, checksum)}#cube"
+    cached = frame_cache.get(file_id, fingerprint, wanted)
+    if cached is not None:
+        return cached
+    local_path = file_storage.ensure_local_file(schema["cube"]["path"])
+    return frame_cache.put(file_id, fingerprint, pd.read_parquet(local_path, columns=wanted), wanted)
+
+def load_date_range(file_id: str, start_date=None, end_date=None, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Reads only the month partitions overlapping [start_date, end_date] (either bound may be open).
+    Rows still need the caller's exact date filter. Returns None when the file has no partitions.
+    """
+    schema = get_file_schema(file_id)
+    if not schema or not schema["partitions"]:
+        return None
+
+    projection = resolve_columns(list(schema["dtypes"].keys()), columns) or None if columns else None
+    start = pd.to_datetime(start_date) if start_date else None
+    end = pd.to_datetime(end_date) if end_date else None
+    overlapping = [
+        part for part in schema["partitions"]
+        if (start is None or pd.to_datetime(part["max"]) >= start)
+        and (end is None or pd.to_datetime(part["min"]) <= end)
+    ]
+    print(f"[DEBUG] Date range {start_date}..{end_date} for file {file_id}: reading {len(overlapping)}/{len(schema['partitions'])} partitions")
+
+    share_key = None
+    if overlapping and shared_cache.shared_cache.enabled:
+        saved_path, _, checksum = _resolve_source(file_id)
+        share_key = shared_cache.frame_key(
+            "date_range", _source_fingerprint(saved_path, checksum),
+            [part["month"] for part in overlapping], projection
+        )
+        shared = shared_cache.get_frame(share_key)
+        if shared is not None:
+            return shared
+
+    if not overlapping:
+        # Keep the column dtypes of a real partition so downstream code sees the same schema
+        local_path = file_storage.ensure_local_file(schema["partitions"][0]["path"])
+        return pd.read_parquet(local_path, columns=projection).head(0)
+    frames = [
+        pd.read_parquet(file_storage.ensure_local_file(part["path"]), columns=projection)
+        for part in overlapping
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    if share_key:
+        shared_cache.put_frame(share_key, df)
+    return df
+
+def get_file_columns(file_id: str) -> List[str]:
+    """Physical column names of a file, read from the Parquet footer or CSV header only."""
+    saved_path, sidecar_path, checksum = _resolve_source(file_id)
+    return _source_columns(file_id, saved_path, sidecar_path, checksum)
+
+def load_data(file_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Loads a file as a DataFrame. `columns` takes logical fields (see FIELD_ALIASES) and/or
+    physical names; only the resolved columns are read from disk. If none resolve, all columns are loaded.
+    """
+    saved_path, sidecar_path, checksum = _resolve_source(file_id)
+    fingerprint = _source_fingerprint(saved_path, checksum)
+
+    projection = None
+    if columns:
+        available = _source_columns(file_id, saved_path, sidecar_path, checksum)
+        projection = resolve_columns(available, columns) or None
+
+    cached = frame_cache.get(file_id, fingerprint, projection)
+    if cached is not None:
+        return cached
+
+    # Memory-mapped IPC copy shared by all workers; until it exists only the projection is read
+    artifact = _read_artifact(fingerprint, sidecar_path)
+    df = arrow_cache.read_frame(artifact, projection)
+    if df is None:
+        local_path = _readable_local_path(file_id, saved_path, sidecar_path, checksum)
+        df = _read_source(local_path, projection)
+        arrow_cache.build_in_background(artifact, lambda: _read_source(local_path))
+    return frame_cache.put(file_id, fingerprint, df, projection)
+
+def _read_artifact(fingerprint: str, sidecar_path: Optional[str]) -> str:
+    """
+    Key of what load_data actually reads: the typed sidecar once ingest wrote it, else the raw source.
+    Both share the source checksum, so a copy taken from the untyped CSV must never answer for the sidecar.
+    """
+    return f"{fingerprint}#{sidecar_path}" if sidecar_path else fingerprint
+
+def _read_source(local_path: str, projection: Optional[List[str]] = None) -> pd.DataFrame:
+    if _is_parquet(local_path):
+        return pd.read_parquet(local_path, columns=projection)
+    return pd.read_csv(local_path, usecols=projection)
+
+def iter_data_chunks(file_id: str, columns: Optional[List[str]] = None, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """
+    Yields a file as DataFrame chunks (Parquet record batches or CSV chunks) without materialising it.
+    `columns` is resolved exactly as in load_data.
+    """
+    saved_path, sidecar_path, checksum = _resolve_source(file_id)
+
+    projection = None
+    if columns:
+        available = _source_columns(file_id, saved_path, sidecar_path, checksum)
+        projection = resolve_columns(available, columns) or None
+
+    local_path = _readable_local_path(file_id, saved_path, sidecar_path, checksum)
+    if _is_parquet(local_path):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(local_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=projection):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(local_path, usecols=projection, chunksize=chunk_rows)
+
+def _should_stream(file_id: str) -> bool:
+    """Streams when the file is not already cached in memory and its readable source is large."""
+    saved_path, sidecar_path, checksum = _resolve_source(file_id)
+    if frame_cache.columns_of(file_id, _source_fingerprint(saved_path, checksum)) is not None:
+        return False
+    local_path = _readable_local_path(file_id, saved_path, sidecar_path, checksum)
+    return os.path.getsize(local_path) >= settings.summary_streaming_min_bytes
+
+# Result types of the cached per-file views; shared with the router for ETag lookups
+L2_VALUES_RESULT = "l2_values"
+CORRELATION_RESULT = "correlation"
+
+
+def subcategory_summary_result_type(group_by="l2", start_date=None, end_date=None) -> str:
+    return f"subcategory_summary_{group_by}_{start_date}_{end_date}"
+
+
+def weekly_sales_result_type(metric="sales") -> str:
+    return f"weekly_sales_{metric}"
+
+
+def brand_exclusion_result_type(model_id: Optional[int]) -> str:
+    return f"brand_exclusion_{model_id}"
+
+
+def result_inputs(file_id: Any, *extra: str) -> List[str]:
+    """Inputs a per-file result depends on: the file itself plus any model-level inputs passed in."""
+    return [invalidation.input_key(invalidation.FILE, int(file_id)), *extra]
+
+
+def result_etag(db: Session, file_id: Any, result_type: str) -> Optional[str]:
+    """ETag of a persisted result from its version alone, without loading the payload. None when not cached."""
+    try:
+        file_id = int(file_id)
+    except (TypeError, ValueError):
+        return None
+    return http_cache.make_etag("result", file_id, result_type, result_store.result_version(db, file_id, result_type))
+
+
+def subcategory_summary_etag(db: Session, file_id: Any, group_by: str = "l2", start_date=None, end_date=None) -> Optional[str]:
+    """Date-bounded summaries are answered from prefix sums, not persisted: their ETag follows the file's inputs."""
+    if not (start_date or end_date):
+        return result_etag(db, file_id, subcategory_summary_result_type(group_by, start_date, end_date))
+    try:
+        file_id = int(file_id)
+    except (TypeError, ValueError):
+        return None
+    versions = invalidation.current_versions(db, result_inputs(file_id))
+    return http_cache.make_etag(
+        "summary_range", file_id, group_by, start_date, end_date,
+        json.dumps(versions, sort_keys=True), invalidation.ALGORITHM_VERSIONS["subcategory_summary"]
+    )
 
 def get_persisted_result(db: Session, file_id: int, result_type: str) -> Optional[Dict[str, Any]]:
-    """Retrieves a persisted analytical result from the database."""
-    from .models import AnalyticalResult
-    db_result = db.query(AnalyticalResult).filter(
-        AnalyticalResult.file_id == file_id,
-        AnalyticalResult.result_type == result_type
-    ).first()
-    
-    if db_result and db_result.result_data:
-        return json.loads(db_result.result_data)
-    return None
+    """
+    Retrieves a persisted analytical result from the database.
+    Decoded payloads are served from a per-worker LRU; the returned object is shared and must not be mutated.
+    """
+    return result_store.load_result(db, file_id, result_type)
+
+def _result_flight_key(file_id: Any, result_type: str) -> str:
+    return f"result:{int(file_id)}:{result_type}"
+
+def _serve_stale_result(db: Session, file_id: Any, result_type: str, compute) -> Optional[Any]:
+    """
+    Stale-while-revalidate: returns the outdated payload of a result whose inputs changed and
+    recomputes it with compute(session) on a background thread. None when there is nothing to serve.
+    """
+    if not settings.stale_while_revalidate:
+        return None
+    stale = result_store.load_stale_result(db, int(file_id), result_type)
+    if stale is None:
+        return None
+
+    def refresh():
+        bg_db = SessionLocal()
+        try:
+            # Another worker may already have refreshed it
+            if get_persisted_result(bg_db, int(file_id), result_type) is None:
+                compute(bg_db)
+        finally:
+            bg_db.close()
+
+    single_flight.refresh_in_background(_result_flight_key(file_id, result_type), refresh)
+    return stale
+
+# ==========================================================
+# RESULT UPGRADES (algorithm versions)
+# ==========================================================
+# Entries written under an older invalidation.ALGORITHM_VERSIONS entry are never served. An upgrade
+# registered for the family rebuilds them: cheap ones (format migrations from the stored payload) may
+# run when a request hits the entry; the rest only run in the background upgrade job after a deploy.
+# Each takes (db, file_id, result_type, old_payload, old_dependencies), persists and returns the new payload.
+RESULT_UPGRADES: Dict[str, Tuple[Callable, bool]] = {}
+
+
+def register_result_upgrade(family: str, cheap: bool = False):
+    """Decorator registering the upgrade path of a result family."""
+    def decorator(func: Callable) -> Callable:
+        RESULT_UPGRADES[family] = (func, cheap)
+        return func
+    return decorator
+
+
+def _upgrade_outdated_result(db: Session, file_id: Any, result_type: str, cheap_only: bool = True) -> Optional[Any]:
+    """Upgrades an outdated-version entry in place if its family allows it here; None if nothing was upgraded."""
+    upgrade = RESULT_UPGRADES.get(invalidation.result_family(result_type))
+    if not upgrade or (cheap_only and not upgrade[1]):
+        return None
+    outdated = result_store.load_outdated_result(db, int(file_id), result_type)
+    if outdated is None or outdated[0] is None:
+        return None
+    payload, dependencies = outdated
+    print(f"[CACHE] Upgrading {result_type} for file {file_id} to algorithm version {invalidation.ALGORITHM_VERSIONS[invalidation.result_family(result_type)]}")
+    if not cheap_only:
+        return upgrade[0](db, file_id, result_type, payload, dependencies)
+    try:
+        return upgrade[0](db, file_id, result_type, payload, dependencies)
+    except Exception as e:
+        # The caller falls back to a full computation
+        db.rollback()
+        print(f"[WARNING] Could not upgrade {result_type} for file {file_id}: {e}")
+        return None
+
+
+def upgrade_outdated_results() -> Dict[str, int]:
+    """Upgrades every outdated-version entry that has a registered upgrade, one single-flight at a time."""
+    from . import discovery
+    from .models import DiscoveryAnalysisCache
+    db = SessionLocal()
+    counts = {"upgraded": 0, "skipped": 0, "failed": 0}
+    try:
+        for file_id, result_type in result_store.outdated_results(db):
+            if invalidation.result_family(result_type) not in RESULT_UPGRADES:
+                counts["skipped"] += 1  # recomputed when next requested
+                continue
+            try:
+                with single_flight.flight(_result_flight_key(file_id, result_type)):
+                    if _upgrade_outdated_result(db, file_id, result_type, cheap_only=False) is not None:
+                        counts["upgraded"] += 1
+            except Exception as e:
+                db.rollback()
+                counts["failed"] += 1
+                print(f"[WARNING] Failed to upgrade {result_type} for file {file_id}: {e}")
+
+        for entry in db.query(DiscoveryAnalysisCache.model_id, DiscoveryAnalysisCache.dependencies).all():
+            if invalidation.algorithm_current(entry.dependencies, discovery.DISCOVERY_FAMILY):
+                continue
+            try:
+                with single_flight.flight(f"discovery:{entry.model_id}"):
+                    discovery._refresh_discovery(entry.model_id)
+                counts["upgraded"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"[WARNING] Failed to upgrade discovery analysis for model {entry.model_id}: {e}")
+    finally:
+        db.close()
+    if any(counts.values()):
+        print(f"[CACHE] Result upgrade pass: {counts}")
+    return counts
 
-def save_analytical_result(db: Session, file_id: int, result_type: str, data: Any):
-    """Persists an analytical result to the database."""
+
+def start_result_upgrade_job() -> None:
+    """Runs one upgrade pass on a daemon thread, so a deploy that bumps a version never upgrades on a request."""
+    threading.Thread(target=upgrade_outdated_results, name="result-upgrade", daemon=True).start()
+
+
+def _single_flight_result(db: Session, file_id: Any, result_type: str, compute, allow_stale: bool = True) -> Any:
+    """
+    Persisted result if current; else a stale one being refreshed; else compute(db), with concurrent
+    callers for the same key waiting on one computation and reading its saved result.
+    """
+    persisted = get_persisted_result(db, int(file_id), result_type)
+    if persisted:
+        return persisted
+    if allow_stale:
+        stale = _serve_stale_result(db, file_id, result_type, compute)
+        if stale is not None:
+            return stale
+    with single_flight.flight(_result_flight_key(file_id, result_type)):
+        persisted = get_persisted_result(db, int(file_id), result_type)
+        if persisted:
+            return persisted
+        upgraded = _upgrade_outdated_result(db, file_id, result_type)
+        if upgraded is not None:
+            return upgraded
+        return compute(db)
+
+def save_analytical_result(db: Session, file_id: int, result_type: str, data: Any, dependencies: Optional[str] = None):
+    """
+    Persists an analytical result to the database. dependencies is the invalidation.snapshot of
+    its inputs taken before computing; by default the result depends on its file only.
+    """
     from .models import AnalyticalResult
     
     # Handle non-JSON compliant floats (NaN, Inf)
@@ -195,7 +784,6 @@ def save_analytical_result(db: Session, file_id: int, result_type: str, data: An
         return obj
 
     data = clean_data(data)
-    serialized_data = json.dumps(data)
     
     # Avoid saving if file_id is 0 and no such file exists
     if file_id == 0:
@@ -208,15 +796,17 @@ def save_analytical_result(db: Session, file_id: int, result_type: str, data: An
     ).first()
     
     if db_result:
-        db_result.result_data = serialized_data
         db_result.created_at = datetime.utcnow()
     else:
         db_result = AnalyticalResult(
             file_id=file_id,
-            result_type=result_type,
-            result_data=serialized_data
+            result_type=result_type
         )
         db.add(db_result)
+    if dependencies is None:
+        dependencies = invalidation.snapshot(db, result_inputs(file_id))
+    dependencies = invalidation.with_algorithm(dependencies, invalidation.result_family(result_type))
+    result_store.write_payload(db_result, data, dependencies)
     
     try:
         db.commit()
@@ -224,7 +814,7 @@ def save_analytical_result(db: Session, file_id: int, result_type: str, data: An
         db.rollback()
         print(f"[ERROR] Failed to save analytical result {result_type} for file {file_id}: {e}")
 
-async def handle_file_upload(db: Session, file: UploadFile, user_id: int, category: Optional[str] = None, model_id: Optional[int] = None, is_analysis: bool = False):
+async def handle_file_upload(db: Session, file: UploadFile, user_id: int, category: Optional[str] = None, model_id: Optional[int] = None, is_analysis: bool = False, background_tasks: Optional[BackgroundTasks] = None):
     from app.modules.governance import service as gov_service
     from app.modules.governance import models as gov_models
     from app.modules.governance.schemas import ModelCreate
@@ -246,18 +836,8 @@ async def handle_file_upload(db: Session, file: UploadFile, user_id: int, catego
     file_storage.ensure_upload_root()
     # Pass model_name and is_analysis to storage
     metadata = await file_storage.save_file(file, model_name, is_analysis)
-    
-    # Calculate row count for CSV files
-    row_count = 0
-    if metadata["file_name"].lower().endswith(".csv"):
-        try:
-            local_path = file_storage.ensure_local_file(metadata["file_path"])
-            df = pd.read_csv(local_path)
-            row_count = len(df)
-        except Exception as e:
-            print(f"[WARNING] Failed to calculate row count: {e}")
 
-    # Create RawDataFile record
+    # Create RawDataFile record; row_count is filled in by the background ingest
     raw_file = gov_models.RawDataFile(
         file_name=metadata["file_name"],
         storage_type=metadata["storage_type"],
@@ -269,7 +849,6 @@ async def handle_file_upload(db: Session, file: UploadFile, user_id: int, catego
         uploaded_by=user_id,
         uploaded_at=metadata["uploaded_at"],
         status=metadata["status"],
-        row_count=row_count,
         remarks=f"Category: {category}" if category else None
     )
     db.add(raw_file)
@@ -286,16 +865,15 @@ async def handle_file_upload(db: Session, file: UploadFile, user_id: int, catego
         category=category,
         is_analysis=is_analysis
     )
-    
-    # Pre-calculate common analytical results to ensure they are persisted immediately
-    try:
-        # These are synchronous calls if they use the newly created df
-        # For simplicity, we just call them, and they will load the file and save the results
-        get_subcategory_summary_data(db, db_file.file_id)
-        get_l2_values_data(db, db_file.file_id)
-        get_correlation_data(db, db_file.file_id)
-    except Exception as e:
-        print(f"[WARNING] Failed to pre-calculate results during upload: {e}")
+    db_file.processing_status = "queued"
+    db_file.processing_progress = 0
+    db.commit()
+
+    # Sidecar, schema catalog and precomputes run after the response is sent
+    if background_tasks is not None:
+        background_tasks.add_task(process_uploaded_file, db_file.file_id, raw_file.raw_file_id)
+    else:
+        process_uploaded_file(db_file.file_id, raw_file.raw_file_id)
 
     return {
         "file_id": db_file.file_id, 
@@ -303,7 +881,89 @@ async def handle_file_upload(db: Session, file: UploadFile, user_id: int, catego
         "filename": file.filename, 
         "category": category, 
         "model_id": active_model_id,
-        "row_count": row_count
+        "row_count": raw_file.row_count,
+        "processing_status": db_file.processing_status
+    }
+
+def _set_processing_state(db: Session, db_file, status: str, progress: int, error: Optional[str] = None):
+    db_file.processing_status = status
+    db_file.processing_progress = progress
+    db_file.processing_error = error[:500] if error else None
+    db.commit()
+
+def process_uploaded_file(file_id: int, raw_file_id: int):
+    """
+    Background ingest for an upload: builds the typed sidecar and schema catalog, loads the
+    DataFrame once and fans it out to every registered precompute. Progress is tracked on ModelFile.
+    """
+    from app.modules.governance.models import ModelFile, RawDataFile
+    db = SessionLocal()
+    try:
+        db_file = db.query(ModelFile).filter(ModelFile.file_id == file_id).first()
+        if not db_file:
+            return
+        raw_file = db.query(RawDataFile).filter(RawDataFile.raw_file_id == raw_file_id).first()
+        total_steps = len(ingest.PRECOMPUTES) + 1
+        # Results cached from an earlier ingest of this file are superseded
+        invalidation.bump(db, invalidation.input_key(invalidation.FILE, file_id))
+        _set_processing_state(db, db_file, "processing", 0)
+
+        try:
+            ingest_info = ingest.build_sidecar(
+                db_file.file_path, db_file.file_name, FIELD_ALIASES["date"], raw_file.checksum if raw_file else None
+            )
+            if ingest_info:
+                db_file.sidecar_path = ingest_info["sidecar_path"]
+                if raw_file:
+                    raw_file.sidecar_path = ingest_info["sidecar_path"]
+                db.commit()
+                save_file_schema(db, file_id, ingest_info)
+            # Anything read before the sidecar existed came from the untyped CSV
+            frame_cache.invalidate(file_id)
+            prefix_cache.invalidate(file_id)
+            index_cache.invalidate(file_id)
+            series_cache.invalidate(file_id)
+            if ingest_info and ingest_info["sidecar_path"]:
+                # load_data now reads the sidecar under its own Arrow cache key; the CSV copy is dead weight
+                saved_path, _, checksum = _resolve_source(file_id)
+                arrow_cache.remove(_source_fingerprint(saved_path, checksum))
+
+            df = load_data(str(file_id))
+            if raw_file:
+                raw_file.row_count = len(df)
+            if ingest_info:
+                save_file_cube(db, file_id, df)
+            _set_processing_state(db, db_file, "processing", int(100 / total_steps))
+        except Exception as e:
+            print(f"[WARNING] Background ingest failed to load file {file_id}: {e}")
+            _set_processing_state(db, db_file, "failed", 0, str(e))
+            return
+
+        # Precomputes run on the raw frame: the cube only keeps measures that were already numeric,
+        # so a metric column with one non-numeric cell would be missing from it
+        for step, (name, precompute) in enumerate(ingest.PRECOMPUTES, start=2):
+            try:
+                precompute(db, str(file_id), df.copy(deep=False))
+            except Exception as e:
+                print(f"[WARNING] Precompute '{name}' failed for file {file_id}: {e}")
+            _set_processing_state(db, db_file, "processing", int(step * 100 / total_steps))
+
+        _set_processing_state(db, db_file, "ready", 100)
+        print(f"[INGEST] File {file_id} processed ({len(df)} rows, {len(ingest.PRECOMPUTES)} precomputes)")
+    finally:
+        db.close()
+
+def get_processing_status_data(db: Session, file_id: int) -> Optional[Dict[str, Any]]:
+    from app.modules.governance.models import ModelFile
+    db_file = db.query(ModelFile).filter(ModelFile.file_id == file_id).first()
+    if not db_file:
+        return None
+    return {
+        "file_id": db_file.file_id,
+        # Files uploaded before background ingest have no status; their results are computed on demand
+        "processing_status": db_file.processing_status or "ready",
+        "processing_progress": db_file.processing_progress if db_file.processing_status else 100,
+        "processing_error": db_file.processing_error,
     }
 
 def get_latest_file_record(db: Session, category: Optional[str] = None, model_id: Optional[int] = None, is_analysis: Optional[bool] = None):
@@ -430,13 +1090,39 @@ def delete_file_record(db: Session, file_id: int):
     if not db_file:
         return False
     
+    try:
+        saved_path, sidecar_path, checksum = _resolve_source(file_id)
+        fingerprint = _source_fingerprint(saved_path, checksum)
+        arrow_cache.remove(fingerprint)
+        arrow_cache.remove(_read_artifact(fingerprint, sidecar_path))
+    except Exception as e:
+        print(f"[WARNING] Failed to drop Arrow cache for file {file_id}: {e}")
+
     # Delete physical file if possible
     if db_file.file_path and file_storage.file_exists(db_file.file_path):
         try:
             file_storage.delete_file(db_file.file_path)
         except Exception as e:
             print(f"[WARNING] Failed to delete physical file: {e}")
-            
+    if db_file.sidecar_path:
+        file_storage.delete_file(db_file.sidecar_path)
+
+    schema = get_file_schema(file_id)
+    for part in (schema["partitions"] if schema else []):
+        file_storage.delete_file(part["path"])
+    if schema and schema["cube"]:
+        file_storage.delete_file(schema["cube"]["path"])
+
+    from .models import FileSchema
+    db.query(FileSchema).filter(FileSchema.file_id == file_id).delete()
+    db.query(models.BrandExclusionResultRow).filter(models.BrandExclusionResultRow.file_id == file_id).delete()
+    _schema_cache.pop(str(file_id), None)
+
+    frame_cache.invalidate(file_id)
+    prefix_cache.invalidate(file_id)
+    index_cache.invalidate(file_id)
+    series_cache.invalidate(file_id)
+    result_store.result_cache.invalidate(file_id)
     db.delete(db_file)
     db.commit()
     return True
@@ -445,18 +1131,40 @@ def delete_file_record(db: Session, file_id: int):
 # SERVICE INTERFACES
 # ==========================================================
 
-def get_subcategory_summary_data(db: Session, file_id: str, start_date=None, end_date=None, group_by="l2", auto_bucket=False):
+def get_subcategory_summary_data(db: Session, file_id: str, start_date=None, end_date=None, group_by="l2", auto_bucket=False, df: Optional[pd.DataFrame] = None):
+    # Date-bounded summaries come from the file's cumulative date sums instead of one cached entry per range
+    if (start_date or end_date) and df is None:
+        ranged = _prefix_subcategory_summary(file_id, start_date, end_date, group_by)
+        if ranged is not None:
+            return ranged
+
     # Try to load from persistence
-    result_type = f"subcategory_summary_{group_by}_{start_date}_{end_date}"
+    result_type = subcategory_summary_result_type(group_by, start_date, end_date)
     persisted = get_persisted_result(db, int(file_id), result_type)
     if persisted:
         return persisted
 
-    df = load_data(file_id)
+    summary_fields = SUMMARY_METRICS + ["l2", "model_group", "date"]
+    schema = get_file_schema(file_id)
+    if df is None:
+        df = load_cube_frame(file_id, summary_fields)
+    if df is None and _should_stream(file_id):
+        summary_df, date_bounds = _streamed_subcategory_summary(file_id, summary_fields, schema, start_date, end_date, group_by)
+        return _build_subcategory_summary_result(db, file_id, result_type, summary_df, date_bounds)
+
+    # Date-bounded requests only open the overlapping month partitions; bounds then come from the catalog
+    ranged = False
+    if df is None and (start_date or end_date):
+        df = load_date_range(file_id, start_date, end_date, summary_fields)
+        ranged = df is not None and schema["date_column"] in df.columns
+        if df is not None and not ranged:
+            df = None
+    if df is None:
+        df = load_data(file_id, columns=summary_fields)
     
     # Flexible Date Resolution
-    date_col = None
-    for cand in ["Date", "week_start_date", "week"]:
+    date_col = _schema_column(schema, df, "date")
+    for cand in ([] if date_col else ["Date", "week_start_date", "week"]):
         if cand.lower() in [c.lower() for c in df.columns]:
             date_col = [c for c in df.columns if c.lower() == cand.lower()][0]
             break
@@ -465,18 +1173,112 @@ def get_subcategory_summary_data(db: Session, file_id: str, start_date=None, end
     if date_col:
         df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
         df = df.dropna(subset=[date_col])
+        if ranged and schema["date_min"]:
+            date_bounds = {"start_date": schema["date_min"], "end_date": schema["date_max"]}
         if not df.empty:
-            date_bounds = {
-                "start_date": df[date_col].min().strftime("%Y-%m-%d"),
-                "end_date": df[date_col].max().strftime("%Y-%m-%d")
-            }
+            if not ranged:
+                date_bounds = {
+                    "start_date": df[date_col].min().strftime("%Y-%m-%d"),
+                    "end_date": df[date_col].max().strftime("%Y-%m-%d")
+                }
             if start_date:
                 df = df[df[date_col] >= pd.to_datetime(start_date)]
             if end_date:
                 df = df[df[date_col] <= pd.to_datetime(end_date)]
 
-    summary_df = calculate_summary(df, group_by)
+    summary_df = calculate_summary(df, group_by, schema["column_map"] if schema else None)
+    return _build_subcategory_summary_result(db, file_id, result_type, summary_df, date_bounds)
+
+def _streamed_subcategory_summary(file_id: str, fields: List[str], schema: Optional[Dict[str, Any]], start_date, end_date, group_by: str):
+    columns = get_file_columns(file_id)
+    projected = resolve_columns(columns, fields) or columns
+    date_col = schema["date_column"] if schema and schema["date_column"] in projected else None
+    for cand in ([] if date_col else ["Date", "week_start_date", "week"]):
+        if cand.lower() in [c.lower() for c in projected]:
+            date_col = [c for c in projected if c.lower() == cand.lower()][0]
+            break
+    print(f"[DEBUG] Streaming subcategory summary for file {file_id} in chunks of {STREAM_CHUNK_ROWS} rows")
+    return calculate_summary_streaming(
+        iter_data_chunks(file_id, fields), group_by, schema["column_map"] if schema else None,
+        date_col, start_date, end_date
+    )
+
+def _summary_date_col(schema: Optional[Dict[str, Any]], columns: List[str]) -> Optional[str]:
+    date_col = schema["column_map"].get("date") if schema else None
+    if date_col in columns:
+        return date_col
+    for cand in ["Date", "week_start_date", "week"]:
+        if cand.lower() in [c.lower() for c in columns]:
+            return [c for c in columns if c.lower() == cand.lower()][0]
+    return None
+
+def _summary_daily_sums(file_id: str, group_by: str, schema: Optional[Dict[str, Any]], df: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+    """Per (date, group) sums of the summary measures, or None without a date column or measures."""
+    fields = SUMMARY_METRICS + ["l2", "model_group", "date"]
+    columns = list(df.columns) if df is not None else get_file_columns(file_id)
+    projected = resolve_columns(columns, fields) or columns
+    date_col = _summary_date_col(schema, projected)
+    mapping = _resolve_summary_columns(projected, schema["column_map"] if schema else None)
+    if not date_col or not mapping:
+        return None
+    group_col = _summary_group_col(projected, group_by)
+    measures = list(dict.fromkeys(mapping.values()))
+
+    if df is None:
+        df = load_cube_frame(file_id, fields)
+    if df is not None:
+        chunks = [df]
+    elif _should_stream(file_id):
+        chunks = iter_data_chunks(file_id, fields)
+    else:
+        chunks = [load_data(file_id, columns=fields)]
+
+    parts = [
+        daily_sums(chunk.assign(**{m: _coerce_numeric(chunk[m]) for m in measures}), date_col, group_col, measures)
+        for chunk in chunks
+    ]
+    return merge_daily_sums(parts) if parts else None
+
+def summary_prefix_sums(file_id: str, group_by: str = "l2", df: Optional[pd.DataFrame] = None) -> Optional[PrefixSums]:
+    """
+    Cumulative per-date sums of the summary measures by group, built once per source version and
+    shared across workers; None when the file has no date column or no summary measures.
+    """
+    saved_path, _, checksum = _resolve_source(file_id)
+    fingerprint = _source_fingerprint(saved_path, checksum)
+    cached = prefix_cache.get(file_id, fingerprint, group_by)
+    if cached is not None:
+        return cached
+
+    schema = get_file_schema(file_id)
+    share_key = shared_cache.frame_key("summary_prefix", fingerprint, group_by)
+    daily = shared_cache.get_frame(share_key) if shared_cache.shared_cache.enabled else None
+    if daily is None:
+        daily = _summary_daily_sums(file_id, group_by, schema, df)
+        if daily is None:
+            return None
+        shared_cache.put_frame(share_key, daily)
+
+    sums = PrefixSums(daily)
+    sums.mapping = _resolve_summary_columns(sums.measures, schema["column_map"] if schema else None)
+    return prefix_cache.put(file_id, fingerprint, group_by, sums)
+
+def _prefix_subcategory_summary(file_id: str, start_date, end_date, group_by: str) -> Optional[Dict[str, Any]]:
+    sums = summary_prefix_sums(file_id, group_by)
+    if sums is None:
+        return None
+    summary_df = _finalize_summary(sums.range_sums(start_date, end_date), sums.mapping, GROUP_COLUMN)
+    return _subcategory_summary_payload(file_id, summary_df, sums.bounds())
+
+def _build_subcategory_summary_result(db: Session, file_id: str, result_type: str, summary_df: pd.DataFrame, date_bounds: Dict[str, str]):
+    result = _subcategory_summary_payload(file_id, summary_df, date_bounds)
+
+    # Persist the result
+    save_analytical_result(db, int(file_id), result_type, result)
     
+    return result
+
+def _subcategory_summary_payload(file_id: str, summary_df: pd.DataFrame, date_bounds: Dict[str, str]) -> Dict[str, Any]:
     # Calculate Totals
     totals = {
         "sales": float(summary_df["sales"].sum()) if not summary_df.empty else 0.0,
@@ -501,19 +1303,18 @@ def get_subcategory_summary_data(db: Session, file_id: str, start_date=None, end
         },
         "totals": totals
     }
-    
-    # Persist the result
-    save_analytical_result(db, int(file_id), result_type, result)
-    
     return result
 
-def get_l2_values_data(db: Session, file_id: str):
-    result_type = "l2_values"
+def get_l2_values_data(db: Session, file_id: str, df: Optional[pd.DataFrame] = None):
+    result_type = L2_VALUES_RESULT
     persisted = get_persisted_result(db, int(file_id), result_type)
     if persisted:
         return persisted
 
-    df = load_data(file_id)
+    if df is None:
+        df = load_cube_frame(file_id, ["l2"])
+    if df is None:
+        df = load_data(file_id, columns=["l2"])
     col = "L2" if "L2" in df.columns else df.columns[0]
     l2_list = sorted(df[col].dropna().unique().tolist())
     result = {"file_id": file_id, "l2_values": l2_list}
@@ -521,22 +1322,31 @@ def get_l2_values_data(db: Session, file_id: str):
     save_analytical_result(db, int(file_id), result_type, result)
     return result
 
-def get_l3_analysis_data(db: Session, file_id: str, limit_l2=None, rows=100, start_date=None, end_date=None):
-    result_type = f"l3_analysis_{limit_l2}_{rows}_{start_date}_{end_date}"
-    persisted = get_persisted_result(db, int(file_id), result_type)
-    if persisted:
-        return persisted
+# ==========================================================
+# L3 ANALYSIS TABLE
+# ==========================================================
+# The per-file L2 x L3 aggregate is computed and persisted once; each worker keeps it as a
+# SortedIndex, so a page for any sort column and filter is a slice of a cached view.
+L3_AGGREGATE_RESULT = "l3_analysis_aggregate"
+L3_TEXT_COLUMNS = ["l2", "l3"]
+L3_MEASURES = ["sales", "units", "onsite_display_spends", "total"]
+L3_SORT_COLUMNS = L3_TEXT_COLUMNS + L3_MEASURES
+
+
+def _compute_l3_aggregate(db: Session, file_id: str, df: Optional[pd.DataFrame] = None):
+    if df is None:
+        l3_fields = ["l2", "l3", "sales", "units", "onsite_display_spends", "total_spends"]
+        df = load_cube_frame(file_id, l3_fields)
+        if df is None:
+            df = load_data(file_id, columns=l3_fields)
+    else:
+        df = df.copy()
 
-    df = load_data(file_id)
-    
     # Flexible column mapping for L3
     cols_upper = {c.upper(): c for c in df.columns}
     l2_col = cols_upper.get("L2", df.columns[0])
     l3_col = cols_upper.get("L3", df.columns[1] if len(df.columns) > 1 else df.columns[0])
-    
-    if limit_l2:
-        df = df[df[l2_col] == limit_l2]
-    
+
     # Map L3 fields locally
     # Class L3AnalysisRow: l2, l3, sales, units, onsite_display_spends, total
     # Use calculate_summary technique for consistency
@@ -546,9 +1356,13 @@ def get_l3_analysis_data(db: Session, file_id: str, limit_l2=None, rows=100, sta
         "onsite_display_spends": ["ONDisplay_Spend", "M_ON_DIS_TOTAL_SPEND"],
         "total": ["Total_Spend", "Total"]
     }
-    
+
+    schema = get_file_schema(file_id)
     for logical, alternatives in mapping.items():
-        for alt in alternatives:
+        catalogued = _schema_column(schema, df, "total_spends" if logical == "total" else logical)
+        if catalogued:
+            df[logical] = _coerce_numeric(df[catalogued])
+        for alt in ([] if catalogued else alternatives):
             if alt.upper() in cols_upper:
                 df[logical] = _coerce_numeric(df[cols_upper[alt.upper()]])
                 break
@@ -557,37 +1371,120 @@ def get_l3_analysis_data(db: Session, file_id: str, limit_l2=None, rows=100, sta
 
     df["l2"] = df[l2_col]
     df["l3"] = df[l3_col]
-    
-    data = df.head(rows).fillna(0).to_dict(orient="records")
-    result = {
+
+    # One row per L2 x L3; raw rows and cube cells aggregate to the same totals
+    df = df.groupby(L3_TEXT_COLUMNS)[L3_MEASURES].sum().reset_index().fillna(0)
+
+    result = {"file_id": str(file_id), "columns": {c: df[c].tolist() for c in L3_SORT_COLUMNS}}
+    save_analytical_result(db, int(file_id), L3_AGGREGATE_RESULT, result)
+    return result
+
+
+def l3_index(db: Session, file_id: str) -> SortedIndex:
+    """This worker's SortedIndex of the file's L3 aggregate, built from the persisted result when missing."""
+    version = result_store.result_version(db, int(file_id), L3_AGGREGATE_RESULT)
+    index = index_cache.get(file_id, L3_AGGREGATE_RESULT, version) if version else None
+    if index is not None:
+        return index
+
+    payload = _single_flight_result(db, file_id, L3_AGGREGATE_RESULT, lambda session: _compute_l3_aggregate(session, file_id))
+    index = SortedIndex(pd.DataFrame(payload["columns"], columns=L3_SORT_COLUMNS), L3_TEXT_COLUMNS)
+    # A stale aggregate being refreshed has no current version; it is rebuilt once the refresh lands
+    version = result_store.result_version(db, int(file_id), L3_AGGREGATE_RESULT)
+    return index_cache.put(file_id, L3_AGGREGATE_RESULT, version, index) if version else index
+
+
+def _l3_query_key(file_id, version, limit_l2, search, sort_by, sort_dir) -> str:
+    return hashlib.sha1(json.dumps([str(file_id), str(version), limit_l2, search, sort_by, sort_dir]).encode()).hexdigest()[:16]
+
+
+def encode_l3_cursor(offset: int, query_key: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset, "query": query_key}).encode()).decode().rstrip("=")
+
+
+def decode_l3_cursor(cursor: str, query_key: str) -> int:
+    """Offset a cursor points at. Raises ValueError when it is malformed or was issued for another query or data version."""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset, issued_for = int(decoded["offset"]), decoded["query"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if issued_for != query_key or offset < 0:
+        raise ValueError("Cursor does not match this query or the data has changed; start from the first page")
+    return offset
+
+
+def get_l3_analysis_data(db: Session, file_id: str, limit_l2=None, rows=100, start_date=None, end_date=None,
+                         offset: int = 0, cursor: Optional[str] = None, sort_by: Optional[str] = None,
+                         sort_dir: Optional[str] = None, search: Optional[str] = None):
+    """
+    One page of the L2 x L3 table, optionally filtered to one L2 (limit_l2) and to L2/L3 names containing
+    search, and sorted by any column (sort_dir defaults to desc for measures, asc for names). Without a
+    sort the table is in L2, L3 order. meta.total_rows counts the filtered table; next_cursor is None on
+    the last page. Raises ValueError for an unknown sort column or an invalid cursor.
+    """
+    if sort_by is not None and sort_by not in L3_SORT_COLUMNS:
+        raise ValueError(f"sort_by must be one of {', '.join(L3_SORT_COLUMNS)}")
+    if sort_dir not in (None, "asc", "desc"):
+        raise ValueError("sort_dir must be asc or desc")
+    if sort_by is not None and sort_dir is None:
+        sort_dir = "asc" if sort_by in L3_TEXT_COLUMNS else "desc"
+    search = (search or "").strip() or None
+    rows = max(int(rows), 0)
+
+    index = l3_index(db, file_id)
+    query_key = _l3_query_key(file_id, result_store.result_version(db, int(file_id), L3_AGGREGATE_RESULT), limit_l2, search, sort_by, sort_dir)
+    offset = decode_l3_cursor(cursor, query_key) if cursor else max(int(offset), 0)
+
+    view = index.view(sort_by, sort_dir == "desc", {"l2": limit_l2}, search)
+    page = index.page(view, offset, rows)
+    next_offset = offset + len(page)
+
+    return {
         "file_id": str(file_id),
-        "rows": data,
+        "rows": page.to_dict(orient="records"),
         "date_bounds": {"start_date": "N/A", "end_date": "N/A"},
         "meta": {
-            "unique_l2": df["l2"].nunique(),
-            "unique_l3": df["l3"].nunique(),
-            "row_count": len(df.head(rows))
+            "unique_l2": view.unique["l2"],
+            "unique_l3": view.unique["l3"],
+            "row_count": len(page),
+            "total_rows": len(view),
+            "offset": offset,
+            "next_cursor": encode_l3_cursor(next_offset, query_key) if next_offset < len(view) else None,
+            "sort_by": sort_by,
+            "sort_dir": sort_dir,
         }
     }
-    
-    save_analytical_result(db, int(file_id), result_type, result)
-    return result
 
-def get_correlation_data(db: Session, file_id: str):
-    result_type = "correlation"
-    persisted = get_persisted_result(db, int(file_id), result_type)
-    if persisted:
-        return persisted
 
-    df = load_data(file_id)
+def l3_analysis_etag(db: Session, file_id: Any, *query) -> Optional[str]:
+    """Pages are cut from the persisted aggregate: their ETag is its version plus the page query."""
+    aggregate_etag = result_etag(db, file_id, L3_AGGREGATE_RESULT)
+    if aggregate_etag is None:
+        return None
+    # make_etag treats None as a missing version; absent query parameters are part of the key
+    return http_cache.make_etag("l3_page", aggregate_etag, json.dumps(query))
+
+def get_correlation_data(db: Session, file_id: str, df: Optional[pd.DataFrame] = None):
+    return _single_flight_result(
+        db, file_id, CORRELATION_RESULT, lambda session: _compute_correlation_data(session, file_id, df)
+    )
+
+def _compute_correlation_data(db: Session, file_id: str, df: Optional[pd.DataFrame] = None):
+    result_type = CORRELATION_RESULT
+    if df is None:
+        df = load_cube_frame(file_id, ["l2", "date", "sales"])
+    if df is None:
+        df = load_data(file_id, columns=["l2", "date", "sales"])
     
     # Pearson correlation of O_SALE across L2 values
-    l2_col = next((c for c in df.columns if c.upper() == 'L2'), None)
-    date_col = next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
+    schema = get_file_schema(file_id)
+    l2_col = _schema_column(schema, df, "l2") or next((c for c in df.columns if c.upper() == 'L2'), None)
+    date_col = _schema_column(schema, df, "date") or next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
     
     sale_cands = ['O_SALE', 'O_Sales', 'SALES', 'Sales']
-    sale_col = None
-    for cand in sale_cands:
+    sale_col = _schema_column(schema, df, "sales")
+    for cand in ([] if sale_col else sale_cands):
         if cand.upper() in [c.upper() for c in df.columns]:
             sale_col = [c for c in df.columns if c.upper() == cand.upper()][0]
             break
@@ -597,6 +1494,7 @@ def get_correlation_data(db: Session, file_id: str):
     
     # Pivot: Index=Date, Columns=L2, Values=Sales
     try:
+        df[sale_col] = _coerce_numeric(df[sale_col])
         pivoted = df.pivot_table(index=date_col, columns=l2_col, values=sale_col, aggfunc='sum').fillna(0)
         # Calculate correlation
         corr = pivoted.corr().fillna(0) # Extra safety for JSON serialization
@@ -615,14 +1513,193 @@ def get_correlation_data(db: Session, file_id: str):
         print(f"Correlation error: {e}")
         return {"file_id": str(file_id), "l2_values": [], "matrix": []}
 
-def get_weekly_sales_data(db: Session, file_id: str, metric="sales"):
-    result_type = f"weekly_sales_{metric}"
+CORRELATION_LEVELS = ("l2", "l3")
+
+
+def correlation_series(file_id: str, level: str = "l2", df: Optional[pd.DataFrame] = None) -> Optional[StandardizedSeries]:
+    """
+    Standardized weekly sales per L2 or L3, built once per source version and shared across workers;
+    None when the file has no date, sales or level column.
+    """
+    saved_path, _, checksum = _resolve_source(file_id)
+    fingerprint = _source_fingerprint(saved_path, checksum)
+    cached = series_cache.get(file_id, fingerprint, level)
+    if cached is not None:
+        return cached
+
+    share_key = shared_cache.frame_key("correlation_series", fingerprint, level)
+    sums = shared_cache.get_frame(share_key) if shared_cache.shared_cache.enabled else None
+    if sums is None:
+        fields = [level, "date", "sales"]
+        if df is None:
+            df = load_cube_frame(file_id, fields)
+        if df is None:
+            df = load_data(file_id, columns=fields)
+
+        schema = get_file_schema(file_id)
+        level_col = _schema_column(schema, df, level) or next((c for c in df.columns if c.upper() == level.upper()), None)
+        date_col = _schema_column(schema, df, "date") or next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
+        sale_col = _schema_column(schema, df, "sales")
+        for cand in ([] if sale_col else ['O_SALE', 'O_Sales', 'SALES', 'Sales']):
+            sale_col = next((c for c in df.columns if c.upper() == cand.upper()), None)
+            if sale_col:
+                break
+        if not level_col or not date_col or not sale_col:
+            return None
+
+        sums = series_sums(df.assign(**{sale_col: _coerce_numeric(df[sale_col])}), date_col, level_col, sale_col)
+        shared_cache.put_frame(share_key, sums)
+
+    return series_cache.put(file_id, fingerprint, level, StandardizedSeries(sums))
+
+
+def get_correlation_edges(file_id: str, level: str = "l2", top_k: Optional[int] = None,
+                          threshold: Optional[float] = None, series: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Sparse correlation of weekly sales between the file's L2 or L3 series: for each requested series
+    (all by default), its neighbours with |r| >= threshold, at most top_k of them. Without either
+    limit, the DEFAULT_TOP_K strongest are returned. Raises ValueError for an unknown level.
+    """
+    if level not in CORRELATION_LEVELS:
+        raise ValueError(f"level must be one of {', '.join(CORRELATION_LEVELS)}")
+    if top_k is None and threshold is None:
+        top_k = DEFAULT_TOP_K
+
+    standardized = correlation_series(file_id, level)
+    if standardized is None:
+        return {"file_id": str(file_id), "level": level, "series_count": 0, "date_count": 0, "edges": [], "missing": series or []}
+
+    return {
+        "file_id": str(file_id),
+        "level": level,
+        "series_count": len(standardized.names),
+        "date_count": standardized.date_count,
+        "edges": standardized.edges(series, top_k, threshold),
+        "missing": [name for name in (series or []) if name not in standardized.positions],
+    }
+
+
+def correlation_edges_etag(db: Session, file_id: Any, *query) -> Optional[str]:
+    """Edge lists are computed per request from the cached series: their ETag follows the file's inputs."""
+    try:
+        file_id = int(file_id)
+    except (TypeError, ValueError):
+        return None
+    versions = invalidation.current_versions(db, result_inputs(file_id))
+    return http_cache.make_etag(
+        "correlation_edges", file_id, json.dumps(query),
+        json.dumps(versions, sort_keys=True), invalidation.ALGORITHM_VERSIONS["correlation"]
+    )
+
+LAG_METRICS = ("sales", "units")
+
+
+def _lag_scope(db: Session, file_id: str, l2: Optional[str] = None, group: Optional[str] = None) -> Optional[List[str]]:
+    """L2 values a lag analysis covers: a model group's L2s, one L2, or None for the whole file."""
+    if group:
+        from .models import ModelGroup
+        model_id = _get_model_id_from_file_id(db, int(file_id))
+        db_group = db.query(ModelGroup).filter(
+            ModelGroup.model_id == model_id, ModelGroup.group_name == group
+        ).first() if model_id else None
+        if not db_group:
+            raise ValueError(f"Unknown model group: {group}")
+        return sorted(m.l2_value for m in db_group.l2_mappings)
+    return [l2] if l2 else None
+
+
+def _weekly_lag_frame(file_id: str, metric: str, l2_values: Optional[List[str]]) -> Tuple[Optional[pd.DataFrame], List[str]]:
+    """Weekly sums of the metric (first column) and each spend tactic in the file, with missing weeks as zero."""
+    from .discovery import SPEND_COLS
+    available = {c.upper(): c for c in get_file_columns(file_id)}
+    tactics = [available[c] for c in SPEND_COLS if c in available]
+    fields = ["l2", "date", metric] + tactics
+    df = load_cube_frame(file_id, fields)
+    if df is None:
+        df = load_data(file_id, columns=fields)
+
+    schema = get_file_schema(file_id)
+    l2_col = _schema_column(schema, df, "l2") or next((c for c in df.columns if c.upper() == 'L2'), None)
+    date_col = _schema_column(schema, df, "date") or next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
+    metric_col = _schema_column(schema, df, metric)
+    for cand in ([] if metric_col else FIELD_ALIASES[metric]):
+        metric_col = next((c for c in df.columns if c.upper() == cand.upper()), None)
+        if metric_col:
+            break
+    if not date_col or not metric_col or (l2_values is not None and not l2_col):
+        return None, tactics
+
+    if l2_values is not None:
+        df = df[df[l2_col].isin(l2_values)]
+    columns = [metric_col] + [t for t in tactics if t != metric_col]
+    weeks = pd.to_datetime(df[date_col], errors="coerce")
+    weekly = pd.DataFrame({c: _coerce_numeric(df[c]) for c in columns}).groupby(weeks).sum().sort_index()
+    if len(weekly) > 1:
+        # Lags count weeks, so weeks without rows are filled in when the dates follow one step
+        step = weekly.index.to_series().diff().mode().iloc[0]
+        full = pd.date_range(weekly.index[0], weekly.index[-1], freq=step)
+        if weekly.index.isin(full).all():
+            weekly = weekly.reindex(full, fill_value=0.0)
+    return weekly, columns[1:]
+
+
+def get_spend_lag_correlation(db: Session, file_id: str, metric: str = "sales", min_lag: int = 0, max_lag: int = 8,
+                              l2: Optional[str] = None, group: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cross-correlation of weekly sales (or units) with each spend tactic's weekly spend lagged by min_lag..max_lag
+    weeks (positive: spend leads), for the whole file, one L2 or a model group. peak_lag is the lag of the
+    highest r. Raises ValueError for an unknown metric or group or an empty lag window.
+    """
+    from .discovery import TACTIC_LABELS
+    if metric not in LAG_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(LAG_METRICS)}")
+    if min_lag > max_lag:
+        raise ValueError("min_lag must not exceed max_lag")
+
+    l2_values = _lag_scope(db, file_id, l2, group)
+    result = {"file_id": str(file_id), "metric": metric, "l2_values": l2_values, "group": group, "weeks": 0, "lags": [], "tactics": []}
+    weekly, tactics = _weekly_lag_frame(file_id, metric, l2_values)
+    if weekly is None or weekly.empty or not tactics:
+        return result
+
+    values = weekly.to_numpy(dtype=float)
+    lags, r = lagged_cross_correlation(values[:, 0], values[:, 1:], min_lag, max_lag)
+    # Lags as long as the series have no overlapping weeks
+    r[:, np.abs(lags) >= len(weekly)] = 0.0
+
+    result.update({"weeks": len(weekly), "lags": lags.tolist()})
+    for tactic, row in zip(tactics, r):
+        peak = int(np.argmax(row))
+        result["tactics"].append({
+            "tactic": tactic,
+            "label": TACTIC_LABELS.get(tactic.upper(), tactic),
+            "r": row.tolist(),
+            "peak_lag": int(lags[peak]),
+            "peak_r": float(row[peak]),
+        })
+    return result
+
+
+def spend_lag_correlation_etag(db: Session, file_id: Any, metric: str, min_lag: int, max_lag: int,
+                               l2: Optional[str] = None, group: Optional[str] = None) -> Optional[str]:
+    """Computed per request: the ETag follows the file's inputs and, for a model group, its current L2s."""
+    try:
+        l2_values = _lag_scope(db, file_id, l2, group)
+        file_id = int(file_id)
+    except (TypeError, ValueError):
+        return None
+    versions = invalidation.current_versions(db, result_inputs(file_id))
+    return http_cache.make_etag(
+        "spend_lag", file_id, metric, min_lag, max_lag, json.dumps(l2_values),
+        json.dumps(versions, sort_keys=True), invalidation.ALGORITHM_VERSIONS["correlation"]
+    )
+
+def get_weekly_sales_data(db: Session, file_id: str, metric="sales", df: Optional[pd.DataFrame] = None):
+    result_type = weekly_sales_result_type(metric)
     persisted = get_persisted_result(db, int(file_id), result_type)
     if persisted:
         return persisted
 
-    df = load_data(file_id)
-    
     # Resolve metric column
     metric_map = {
         "sales": ["O_SALE", "O_Sales", "Sales", "Sale", "Total_Sales", "SALES"],
@@ -631,11 +1708,22 @@ def get_weekly_sales_data(db: Session, file_id: str, metric="sales"):
         "onsite_spends": ["M_ON_DIS_TOTAL_SPEND", "ONDisplay_Spend", "ON_DIS_SPEND"],
         "offsite_spends": ["M_OFF_DIS_TOTAL_SPEND", "OFFDisplay_Spend", "OFF_DIS_SPEND"],
     }
-    
-    actual_metric = None
     target_metric = metric.lower()
     cands = metric_map.get(target_metric, [target_metric])
-    for cand in cands:
+    logical_metric = {"onsite_spends": "onsite_display_spends", "offsite_spends": "offsite_display_spends"}.get(target_metric, target_metric)
+
+    # Project to metric/date/L2 only when the metric resolves; otherwise keep the last-column fallback intact
+    if df is None:
+        if resolve_columns(get_file_columns(file_id), cands):
+            df = load_cube_frame(file_id, cands + ["date", "l2"])
+            if df is None:
+                df = load_data(file_id, columns=cands + ["date", "l2"])
+        else:
+            df = load_data(file_id)
+    
+    schema = get_file_schema(file_id)
+    actual_metric = _schema_column(schema, df, logical_metric) if logical_metric in SUMMARY_METRICS else None
+    for cand in ([] if actual_metric else cands):
         if cand.upper() in [c.upper() for c in df.columns]:
             actual_metric = [c for c in df.columns if c.upper() == cand.upper()][0]
             break
@@ -644,9 +1732,9 @@ def get_weekly_sales_data(db: Session, file_id: str, metric="sales"):
         actual_metric = df.columns[-1]
 
     # Resolve date column
-    date_col = next((c for c in df.columns if c.lower() in ["week_start_date", "date", "week"]), None)
+    date_col = _schema_column(schema, df, "date") or next((c for c in df.columns if c.lower() in ["week_start_date", "date", "week"]), None)
     # Resolve L2 column
-    l2_col = next((c for c in df.columns if c.upper() == "L2"), None)
+    l2_col = _schema_column(schema, df, "l2") or next((c for c in df.columns if c.upper() == "L2"), None)
     
     if not date_col or not l2_col:
         return {"file_id": str(file_id), "series": [], "l2_values": []}
@@ -676,6 +1764,129 @@ def get_weekly_sales_data(db: Session, file_id: str, metric="sales"):
         print(f"Weekly sales pivot error: {e}")
         return {"file_id": str(file_id), "series": [], "l2_values": []}
 
+WEEKLY_SERIES_METRICS = SUMMARY_METRICS + ["price"]  # price = sales / units of each week and group
+WEEKLY_SERIES_DIMENSIONS = [d for d in CUBE_DIMENSIONS if d != "date"]
+WEEKLY_METRIC_ALIASES = {"onsite_spends": "onsite_display_spends", "offsite_spends": "offsite_display_spends"}
+DEFAULT_WEEKLY_METRICS = ["sales", "units", "price", "total_spends"]
+
+
+def _weekly_series_params(metrics: Optional[List[str]], dimensions: Optional[List[str]]) -> Tuple[List[str], List[str]]:
+    """Canonical metric and dimension lists (deduplicated, in request order). Raises ValueError for unknown names."""
+    metrics = list(dict.fromkeys(WEEKLY_METRIC_ALIASES.get(m.lower(), m.lower()) for m in (metrics or DEFAULT_WEEKLY_METRICS)))
+    dimensions = list(dict.fromkeys(d.lower() for d in (["l2"] if dimensions is None else dimensions)))
+    unknown = [m for m in metrics if m not in WEEKLY_SERIES_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Use {', '.join(WEEKLY_SERIES_METRICS)}")
+    unknown = [d for d in dimensions if d not in WEEKLY_SERIES_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {', '.join(unknown)}. Use {', '.join(WEEKLY_SERIES_DIMENSIONS)}")
+    return metrics, dimensions
+
+
+def weekly_series_result_type(metrics: Optional[List[str]] = None, dimensions: Optional[List[str]] = None) -> str:
+    metrics, dimensions = _weekly_series_params(metrics, dimensions)
+    key = hashlib.md5(json.dumps([metrics, dimensions]).encode()).hexdigest()
+    return f"weekly_series_{key}"
+
+
+def get_weekly_series_data(db: Session, file_id: str, metrics: Optional[List[str]] = None,
+                           dimensions: Optional[List[str]] = None, df: Optional[pd.DataFrame] = None):
+    """
+    Weekly sums of several metrics by any dimensions from one groupby, as columns: week_start_date, one
+    column per dimension and per metric, one row per week and group. Metrics the file lacks are listed
+    in missing_metrics. Raises ValueError for unknown metrics or dimensions.
+    """
+    metrics, dimensions = _weekly_series_params(metrics, dimensions)
+    result_type = weekly_series_result_type(metrics, dimensions)
+    return _single_flight_result(
+        db, file_id, result_type, lambda session: _compute_weekly_series(session, file_id, result_type, metrics, dimensions, df)
+    )
+
+def _compute_weekly_series(db: Session, file_id: str, result_type: str, metrics: List[str], dimensions: List[str],
+                           df: Optional[pd.DataFrame] = None):
+    measures = list(dict.fromkeys(m for metric in metrics for m in (["sales", "units"] if metric == "price" else [metric])))
+    if df is None:
+        fields = ["date"] + dimensions + measures
+        df = load_cube_frame(file_id, fields)
+        if df is None:
+            df = load_data(file_id, columns=fields)
+
+    schema = get_file_schema(file_id)
+    def resolve(field: str) -> Optional[str]:
+        return _schema_column(schema, df, field) or next(
+            (c for alias in FIELD_ALIASES.get(field, [field]) for c in df.columns if str(c).upper() == alias.upper()), None
+        )
+
+    result = {
+        "file_id": str(file_id), "metrics": metrics, "dimensions": dimensions,
+        "columns": {}, "row_count": 0, "missing_metrics": [],
+    }
+    date_col = resolve("date")
+    dimension_cols = [resolve(d) for d in dimensions]
+    if not date_col or None in dimension_cols:
+        return result
+
+    measure_cols = {m: resolve(m) for m in measures}
+    present = {m: c for m, c in measure_cols.items() if c}
+    result["missing_metrics"] = [m for m in metrics if any(
+        not measure_cols[x] for x in (["sales", "units"] if m == "price" else [m])
+    )]
+
+    # One groupby over week x dimensions sums every requested measure
+    frame = pd.DataFrame({"week_start_date": pd.to_datetime(df[date_col], errors="coerce")})
+    for dimension, column in zip(dimensions, dimension_cols):
+        frame[dimension] = df[column]
+    for measure, column in present.items():
+        frame[measure] = _coerce_numeric(df[column])
+    frame = frame.dropna(subset=["week_start_date"])
+    weekly = frame.groupby(["week_start_date"] + dimensions)[list(present)].sum().reset_index()
+
+    if "price" in metrics and "price" not in result["missing_metrics"]:
+        weekly["price"] = weekly["sales"] / weekly["units"].replace(0, np.nan)
+
+    columns = {"week_start_date": weekly["week_start_date"].dt.strftime("%Y-%m-%d").tolist()}
+    for dimension in dimensions:
+        columns[dimension] = weekly[dimension].tolist()
+    for metric in metrics:
+        if metric not in result["missing_metrics"]:
+            # Weeks without units have no price
+            columns[metric] = weekly[metric].astype(object).where(weekly[metric].notna(), None).tolist()
+    result.update({"columns": columns, "row_count": len(weekly)})
+
+    save_analytical_result(db, int(file_id), result_type, result)
+    return result
+
+# ==========================================================
+# UPLOAD PRECOMPUTES (run by process_uploaded_file)
+# ==========================================================
+@ingest.register_precompute("subcategory_summary")
+def _precompute_subcategory_summary(db: Session, file_id: str, df: pd.DataFrame):
+    get_subcategory_summary_data(db, file_id, df=df)
+
+@ingest.register_precompute("summary_prefix_sums")
+def _precompute_summary_prefix_sums(db: Session, file_id: str, df: pd.DataFrame):
+    summary_prefix_sums(file_id, "l2", df=df)
+
+@ingest.register_precompute("l2_values")
+def _precompute_l2_values(db: Session, file_id: str, df: pd.DataFrame):
+    get_l2_values_data(db, file_id, df=df)
+
+@ingest.register_precompute("l3_aggregate")
+def _precompute_l3_aggregate(db: Session, file_id: str, df: pd.DataFrame):
+    _compute_l3_aggregate(db, file_id, df=df)
+
+@ingest.register_precompute("weekly_series")
+def _precompute_weekly_series(db: Session, file_id: str, df: pd.DataFrame):
+    get_weekly_series_data(db, file_id, df=df)
+
+@ingest.register_precompute("correlation")
+def _precompute_correlation(db: Session, file_id: str, df: pd.DataFrame):
+    get_correlation_data(db, file_id, df=df)
+
+@ingest.register_precompute("weekly_sales")
+def _precompute_weekly_sales(db: Session, file_id: str, df: pd.DataFrame):
+    get_weekly_sales_data(db, file_id, "sales", df=df)
+
 def get_model_group_weekly_sales_data(file_id: str):
     # This is a legacy/simple version by group names
     return {"file_id": str(file_id), "group_names": [], "series": []}
@@ -692,17 +1903,27 @@ def get_model_group_weekly_metrics_data(db: Session, file_id: str, payload: sche
     if persisted:
         return persisted
 
-    df = load_data(file_id)
+    # Project to the columns this view aggregates, matching spend columns the same way as below
+    available = get_file_columns(file_id)
+    spend_like = [
+        c for c in available
+        if 'SPEND' in c.upper() and ('SEARCH' in c.upper() or ('DIS' in c.upper() and ('ON' in c.upper() or 'OFF' in c.upper())))
+    ]
+    mg_fields = ["l2", "date", "sales", "units"] + spend_like
+    df = load_cube_frame(file_id, mg_fields)
+    if df is None:
+        df = load_data(file_id, columns=mg_fields)
     
     # Column mapping
-    l2_col = next((c for c in df.columns if c.upper() == 'L2'), None)
-    date_col = next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
+    schema = get_file_schema(file_id)
+    l2_col = _schema_column(schema, df, "l2") or next((c for c in df.columns if c.upper() == 'L2'), None)
+    date_col = _schema_column(schema, df, "date") or next((c for c in df.columns if c.lower() in ['week_start_date', 'date', 'week']), None)
     
     metric_map = {"sales": ["O_SALE", "O_Sales", "SALES", "Sales"], "units": ["O_UNIT", "O_Units", "UNITS", "Units"]}
     target_metric_cands = metric_map.get(payload.metric.lower(), ["O_SALE"])
     
-    sale_col = None
-    for cand in target_metric_cands:
+    sale_col = _schema_column(schema, df, payload.metric.lower() if payload.metric.lower() in metric_map else "sales")
+    for cand in ([] if sale_col else target_metric_cands):
         if cand.upper() in [c.upper() for c in df.columns]:
             sale_col = [c for c in df.columns if c.upper() == cand.upper()][0]
             break
@@ -939,6 +2160,9 @@ async def get_exclude_analysis_data(db: Session, model_id: Optional[int] = None,
     if persisted:
         print(f"[DEBUG] Returning persisted result for model_id={model_id}")
         return persisted
+    dependencies = invalidation.snapshot(db, result_inputs(
+        file_id, invalidation.input_key(invalidation.RELEVANCE, model_id)
+    ))
 
     print(f"[DEBUG] No persisted result found. Loading from file...")
     try:
@@ -950,9 +2174,12 @@ async def get_exclude_analysis_data(db: Session, model_id: Optional[int] = None,
                 print(f"[DEBUG] EDA_DATA_PATH missing. Returning empty data.")
                 return {"data": []}
         else:
-            local_path = file_storage.ensure_local_file(latest.file_path)
-            print(f"[DEBUG] Reading from latest file: {local_path}")
-            df = pd.read_csv(local_path)
+            print(f"[DEBUG] Reading from latest file: {latest.file_path}")
+            target = group_by.upper() if group_by else 'L3'
+            df = load_cube_frame(latest.file_id, [target, "l3", "l2", "sales", "units", "M_ON_DIS_TOTAL_SPEND", "M_OFF_DIS_TOTAL_SPEND", "M_SEARCH_SPEND"])
+            # The cube only answers the grouped branch below
+            if df is None or not (target in df.columns or 'L3' in df.columns):
+                df = load_data(latest.file_id)
     except Exception as e:
         print(f"[ERROR] Failed to load data for exclude analysis: {e}")
         return {"data": []}
@@ -971,14 +2198,15 @@ async def get_exclude_analysis_data(db: Session, model_id: Optional[int] = None,
              target_group_col = 'L3' if 'L3' in df.columns else ('L2' if 'L2' in df.columns else df.columns[0])
              
         # Standardize column names to match calculate_summary logic
-        sales_col = None
-        for cand in ['O_SALE', 'O_Sales', 'SALES', 'Sales']:
+        schema = get_file_schema(latest.file_id) if latest else None
+        sales_col = _schema_column(schema, df, "sales")
+        for cand in ([] if sales_col else ['O_SALE', 'O_Sales', 'SALES', 'Sales']):
             if cand.upper() in [c.upper() for c in df.columns]:
                 sales_col = [c for c in df.columns if c.upper() == cand.upper()][0]
                 break
                 
-        units_col = None
-        for cand in ['O_UNIT', 'O_Units', 'UNITS', 'Units']:
+        units_col = _schema_column(schema, df, "units")
+        for cand in ([] if units_col else ['O_UNIT', 'O_Units', 'UNITS', 'Units']):
             if cand.upper() in [c.upper() for c in df.columns]:
                 units_col = [c for c in df.columns if c.upper() == cand.upper()][0]
                 break
@@ -1064,11 +2292,25 @@ async def get_exclude_analysis_data(db: Session, model_id: Optional[int] = None,
             df['Relevant'] = 'YES'
 
     result = {"data": df.fillna(0).to_dict(orient="records")}
-    save_analytical_result(db, file_id, result_type, result)
+    save_analytical_result(db, file_id, result_type, result, dependencies)
     return result
 
+def _drop_untracked_relevance_results(db: Session, model_id: Optional[int]) -> None:
+    """Rows cached before dependency tracking carry no input record, so they are still dropped by type."""
+    from .models import AnalyticalResult
+    legacy_types = [
+        f"exclude_analysis_{model_id}_L1", f"exclude_analysis_{model_id}_L2", f"exclude_analysis_{model_id}_L3",
+        f"exclude_analysis_{model_id}", f"exclude_analysis_{model_id}_l2", f"exclude_analysis_{model_id}_l3",
+        brand_exclusion_result_type(model_id),
+    ]
+    db.query(AnalyticalResult).filter(
+        AnalyticalResult.result_type.in_(legacy_types),
+        AnalyticalResult.dependencies.is_(None)
+    ).delete(synchronize_session=False)
+    result_store.result_cache.invalidate_types(legacy_types)
+
 def update_produce_relevance(db: Session, category: str, relevant: bool, model_id: Optional[int] = None):
-    from .models import SubcategoryRelevanceMapping, AnalyticalResult
+    from .models import SubcategoryRelevanceMapping
     
     mapping = db.query(SubcategoryRelevanceMapping).filter(
         SubcategoryRelevanceMapping.subcategory == category,
@@ -1082,16 +2324,11 @@ def update_produce_relevance(db: Session, category: str, relevant: bool, model_i
         mapping = SubcategoryRelevanceMapping(subcategory=category, is_relevant=is_rel_val, model_id=model_id)
         db.add(mapping)
     
-    # Invalidate caches that depend on relevance mappings
-    # We clear both exclude_analysis and brand_exclusion for this model
-    # Clear both L2 and L3 caches
-    cache_types = [f"exclude_analysis_{model_id}_L2", f"exclude_analysis_{model_id}_L3", f"exclude_analysis_{model_id}_L1", f"brand_exclusion_{model_id}"]
-    # Legacy caches
-    cache_types.extend([f"exclude_analysis_{model_id}", f"exclude_analysis_{model_id}_l2", f"exclude_analysis_{model_id}_l3"])
-    
-    db.query(AnalyticalResult).filter(
-        AnalyticalResult.result_type.in_(cache_types)
-    ).delete(synchronize_session=False)
+    # Only results that declared this model's relevance mapping as an input (exclude_analysis,
+    # brand_exclusion) go stale; other models' caches are untouched
+    relevance_input = invalidation.input_key(invalidation.RELEVANCE, model_id)
+    invalidation.bump(db, relevance_input)
+    _drop_untracked_relevance_results(db, model_id)
 
     from app.modules.governance.models import ModelFile
     file_obj = db.query(ModelFile).filter(
@@ -1106,7 +2343,7 @@ def update_produce_relevance(db: Session, category: str, relevant: bool, model_i
         file_status = file_obj.status
 
     db.commit()
-    return {"category": category, "relevant": relevant, "status": "updated", "cache_cleared": cache_types, "file_status": file_status}
+    return {"category": category, "relevant": relevant, "status": "updated", "cache_cleared": [relevance_input], "file_status": file_status}
 
 # Mapping delegation
 def get_model_groups_data(file_id: str, db: Session):
@@ -1184,18 +2421,77 @@ def _best_fuzzy_score_basic(value: str, candidates: List[str]) -> float:
             best = score
     return best
 
-async def get_brand_exclusion_data(file_id: str, db: Session, model_id: Optional[int] = None):
+def brand_exclusion_dependencies(db: Session, file_id: Any, model_id: Optional[int]) -> str:
+    """Brand exclusion reads the file, the model's relevance mapping and the PB/MI tables."""
+    return invalidation.snapshot(db, result_inputs(
+        file_id,
+        invalidation.input_key(invalidation.RELEVANCE, model_id),
+        invalidation.PRIVATE_BRANDS,
+        invalidation.MAPPING_ISSUES,
+    ))
+
+async def _load_brand_exclusion_result(file_id: str, db: Session, model_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    The persisted brand exclusion header (summary, warnings, row_count), computing it when needed.
+    A result computed here, or one that could not be persisted, is returned whole with its rows.
+    """
     # Try persistence first
-    result_type = f"brand_exclusion_{model_id}"
+    result_type = brand_exclusion_result_type(model_id)
     persisted = get_persisted_result(db, int(file_id), result_type)
     if persisted:
-        # Check if the summary is missing the new fields (e.g. part2, total_sales)
-        if "part2" not in persisted.get("summary", {}):
-            persisted = calculate_brand_summary_from_rows(persisted)
-            # Re-save the upgraded schema to the database
-            save_analytical_result(db, int(file_id), result_type, persisted)
         return persisted
 
+    compute = lambda session: _compute_brand_exclusion_data(file_id, session, model_id)
+    stale = _serve_stale_result(db, file_id, result_type, compute)
+    if stale is not None:
+        return stale
+    # Heavy and often opened by several reviewers at once: one computation per file and model
+    async with single_flight.flight_async(_result_flight_key(file_id, result_type)):
+        persisted = get_persisted_result(db, int(file_id), result_type)
+        if persisted:
+            return persisted
+        # Older entries are split into header and brand rows, keeping manual edits
+        upgraded = _upgrade_outdated_result(db, file_id, result_type)
+        if upgraded is not None:
+            return upgraded
+        return compute(db)
+
+async def get_brand_exclusion_data(file_id: str, db: Session, model_id: Optional[int] = None):
+    """Full brand exclusion result: summary and every brand row."""
+    result = await _load_brand_exclusion_result(file_id, db, model_id)
+    if "rows" in result:
+        return result
+    return {**result, "rows": load_brand_rows(db, file_id, brand_exclusion_result_type(model_id), result)[1]}
+
+async def get_brand_exclusion_summary(file_id: str, db: Session, model_id: Optional[int] = None):
+    """Summary header only; no brand rows are read."""
+    result = await _load_brand_exclusion_result(file_id, db, model_id)
+    header = {k: v for k, v in result.items() if k != "rows"}
+    header.setdefault("row_count", len(result.get("rows", [])))
+    return header
+
+async def get_brand_exclusion_bucket(
+    file_id: str, db: Session, model_id: Optional[int], part: str, bucket: str, offset: int = 0, limit: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Brand rows of one summary bucket (see BRAND_BUCKETS), paged. None for an unknown bucket."""
+    found = find_brand_bucket(part, bucket)
+    if found is None:
+        return None
+    result = await _load_brand_exclusion_result(file_id, db, model_id)
+    total, rows = load_brand_rows(
+        db, file_id, brand_exclusion_result_type(model_id), result, predicate=found[3], offset=offset, limit=limit
+    )
+    return {"file_id": str(file_id), "part": part, "bucket": bucket, "type": found[2], "total": total, "rows": rows}
+
+async def get_brand_exclusion_brand(file_id: str, db: Session, model_id: Optional[int], brand: str) -> Optional[Dict[str, Any]]:
+    """The row of a single brand, or None when the brand is not in the result."""
+    result = await _load_brand_exclusion_result(file_id, db, model_id)
+    _, rows = load_brand_rows(db, file_id, brand_exclusion_result_type(model_id), result, brand=brand)
+    return rows[0] if rows else None
+
+def _compute_brand_exclusion_data(file_id: str, db: Session, model_id: Optional[int] = None):
+    result_type = brand_exclusion_result_type(model_id)
+    dependencies = brand_exclusion_dependencies(db, file_id, model_id)
     df = load_data(file_id)
     
     # 1. Resolve Relevance (Phase 1 Selection)
@@ -1354,65 +2650,10 @@ async def get_brand_exclusion_data(file_id: str, db: Session, model_id: Optional
                 r_dict[v] = 0
         rows.append(r_dict)
 
-    # 5. Detailed Summary (Part 1, 2, 3)
-    res_df = pivot_result
-    total_sales = float(res_df['Sum of O_SALE'].sum())
-    total_spends = float(res_df['Sum of TOTAL_SPEND'].sum())
-    total_units = float(res_df['Sum of O_UNIT'].sum())
-
-    def get_bucket(df, label):
-        s = float(df['Sum of O_SALE'].sum()) if not df.empty else 0.0
-        sp = float(df['Sum of TOTAL_SPEND'].sum()) if not df.empty else 0.0
-        u = float(df['Sum of O_UNIT'].sum()) if not df.empty else 0.0
-        return {
-            "type": label,
-            "sales": s,
-            "spends": sp,
-            "units": u,
-            "sales_pct": (s / total_sales * 100) if total_sales > 0 else 0,
-            "spends_pct": (sp / total_spends * 100) if total_spends > 0 else 0,
-            "units_pct": (u / total_units * 100) if total_units > 0 else 0
-        }
-
-    # Part 2: Before Analysis (based on original Max of Exclude_Flag)
-    part2 = [
-        get_bucket(res_df[res_df['Max of Exclude_Flag'] == 0], "Included"),
-        get_bucket(res_df[res_df['Max of Exclude_Flag'] == 1], "Excluded")
-    ]
-
-    # Part 3: After Exclude Flag Analysis
-    # We follow the buckets from the user's screenshot + refined requests
-    part3 = [
-        get_bucket(res_df[res_df['Exclude Flag'] == 0], "Included"),
-        get_bucket(res_df[res_df['Exclude Flag'] == 1], "Excluded"),
-        get_bucket(res_df[res_df['Private Brand'] == 1], "Private Brand"),
-        get_bucket(res_df[res_df['Mapping Issue'] == 1], "Mapping Issue"),
-        get_bucket(res_df[(res_df['Exclude Flag'] == 1) & (res_df['Sum of TOTAL_SPEND'] == 0) & (res_df['Sum of O_SALE'] > 0)], "Excluded - Zero Spend With Sales"),
-        get_bucket(res_df[(res_df['Exclude Flag'] == 1) & (res_df['Sum of O_SALE'] == 0) & (res_df['Sum of TOTAL_SPEND'] > 0)], "Excluded - Zero Sales With Spend"),
-        get_bucket(res_df[(res_df['Exclude Flag'] == 1) & (res_df['Private Brand'] == 0) & (res_df['Mapping Issue'] == 0) & (res_df['Sum of TOTAL_SPEND'] != 0) & (res_df['Sum of O_SALE'] != 0)], "Other Issue")
-    ]
-
-    summary = {
-        "total_sales": total_sales,
-        "total_spends": total_spends,
-        "total_units": total_units,
-        "part2": part2,
-        "part3": part3,
-        "combine_flag_count": int(res_df['Combine Flag'].dropna().nunique()),
-        "exclude_flag_count": int((res_df['Exclude Flag'] == 1).sum()),
-        "included_brands_count": (
-            # Count unique combine groups (each group = 1 brand)
-            int(res_df[(res_df['Exclude Flag'] == 0) & res_df['Combine Flag'].notna() & (res_df['Combine Flag'] != '')]['Combine Flag'].nunique()) +
-            # Count standalone included brands (no group)
-            int(((res_df['Exclude Flag'] == 0) & (res_df['Combine Flag'].isna() | (res_df['Combine Flag'] == ''))).sum())
-        ),
-        "issue_counts": {
-            "private_brand": int((res_df['Private Brand'] == 1).sum()),
-            "mapping_issue": int((res_df['Mapping Issue'] == 1).sum()),
-            "low_share": int((res_df['Exclude Flag'] == 1).sum()) - int((res_df['Private Brand'] == 1).sum()) - int((res_df['Mapping Issue'] == 1).sum())
-        }
-    }
-    summary["issue_counts"]["low_share"] = max(0, summary["issue_counts"]["low_share"])
+    # 5. Detailed Summary (Part 1, 2, 3), from the same row fields edits later recompute it from
+    summary = brand_summary(pd.DataFrame(
+        [_brand_row_fields(r) for r in rows], columns=BRAND_ROW_MEASURES + BRAND_ROW_FLAGS + ["combine_flag"]
+    ))
 
     result = {
         "file_id": str(file_id),
@@ -1421,14 +2662,16 @@ async def get_brand_exclusion_data(file_id: str, db: Session, model_id: Optional
         "warnings": []
     }
     
-    save_analytical_result(db, int(file_id), result_type, result)
+    save_brand_exclusion_result(db, int(file_id), result_type, result, dependencies)
     return result
 
 def update_brand_exclusion_result(db: Session, payload: schemas.BrandExclusionUpdateRequest):
     """
     Manually update a brand's grouping or exclusion status in the analytical results.
+    Only the brand's row is rewritten; the summary is recomputed from the narrow row columns.
     """
-    result_type = f"brand_exclusion_{payload.model_id}"
+    from .models import BrandExclusionResultRow
+    result_type = brand_exclusion_result_type(payload.model_id)
     existing = db.query(models.AnalyticalResult).filter(
         models.AnalyticalResult.file_id == payload.file_id,
         models.AnalyticalResult.result_type == result_type
@@ -1437,62 +2680,177 @@ def update_brand_exclusion_result(db: Session, payload: schemas.BrandExclusionUp
     if not existing:
         return {"status": "error", "message": "Result not found"}
 
-    import json
-    data = json.loads(existing.result_data)
-    rows = data.get("rows", [])
-    
-    target_brand = payload.brand.strip().lower()
-    updated = False
-    for row in rows:
-        row_brand = str(row.get("brand", "")).strip().lower()
-        if row_brand == target_brand:
-            if payload.combine_flag is not None:
-                row["combine_flag"] = int(payload.combine_flag) if payload.combine_flag > 0 else None
-            if payload.exclude_flag is not None:
-                row["exclude_flag"] = int(payload.exclude_flag)
-            if payload.private_brand is not None:
-                row["private_brand"] = int(payload.private_brand)
-            if payload.mapping_issue is not None:
-                row["mapping_issue"] = int(payload.mapping_issue)
-            # If PB or MI changed, auto-set exclude_flag to match (PB=1 or MI=1 → exclude)
-            # Only auto-derive if the caller didn't explicitly set exclude_flag
-            if payload.exclude_flag is None and (payload.private_brand is not None or payload.mapping_issue is not None):
-                pb = row.get("private_brand", 0)
-                mi = row.get("mapping_issue", 0)
-                row["exclude_flag"] = 1 if (pb == 1 or mi == 1) else row.get("exclude_flag", 0)
-            updated = True
-            break
-    
-    if updated:
-        # Re-save the result
-        # Note: Summary percentages are relative to total sales/spends which don't change.
-        # However, mapping issue/private brand counts MIGHT change if we implement that.
-        # For now, we manually refresh the FULL summary on save to be safe.
-        processed_data = calculate_brand_summary_from_rows(data)
-        existing.result_data = json.dumps(processed_data)
-
-        # Revert file status to 'uploaded' if currently reviewed
-        from app.modules.governance.models import ModelFile
-        file_obj = db.query(ModelFile).filter(ModelFile.file_id == payload.file_id).first()
-        file_status = "error"
-        if file_obj:
-            if file_obj.status in ["approved", "rejected", "in_review", "uploaded"]:
-                file_obj.status = "uploaded"
-            file_status = file_obj.status
+    def find_record():
+        return db.query(BrandExclusionResultRow).filter(
+            BrandExclusionResultRow.file_id == payload.file_id,
+            BrandExclusionResultRow.result_type == result_type,
+            BrandExclusionResultRow.brand_key == _brand_key(payload.brand)
+        ).first()
+
+    record = find_record()
+    if record is None and "rows" in (result_store.read_payload(existing) or {}):
+        # Entry from before rows were stored per brand: split it first
+        _upgrade_outdated_result(db, payload.file_id, result_type, cheap_only=True)
+        existing = db.query(models.AnalyticalResult).filter(models.AnalyticalResult.result_id == existing.result_id).first()
+        record = find_record()
+    if record is None:
+        return {"status": "error", "message": "Brand not found in result"}
+
+    row = json.loads(record.row_data)
+    if payload.combine_flag is not None:
+        row["combine_flag"] = int(payload.combine_flag) if payload.combine_flag > 0 else None
+    if payload.exclude_flag is not None:
+        row["exclude_flag"] = int(payload.exclude_flag)
+    if payload.private_brand is not None:
+        row["private_brand"] = int(payload.private_brand)
+    if payload.mapping_issue is not None:
+        row["mapping_issue"] = int(payload.mapping_issue)
+    # If PB or MI changed, auto-set exclude_flag to match (PB=1 or MI=1 → exclude)
+    # Only auto-derive if the caller didn't explicitly set exclude_flag
+    if payload.exclude_flag is None and (payload.private_brand is not None or payload.mapping_issue is not None):
+        pb = row.get("private_brand", 0)
+        mi = row.get("mapping_issue", 0)
+        row["exclude_flag"] = 1 if (pb == 1 or mi == 1) else row.get("exclude_flag", 0)
+    _fill_brand_row(record, row)
+    db.flush()
+
+    # Totals don't change, but bucket membership and flag counts do: refresh the summary header
+    header = result_store.read_payload(existing) or {}
+    header["summary"] = brand_summary(_brand_row_frame(db, payload.file_id, result_type))
+    result_store.write_payload(existing, header)
+
+    # Revert file status to 'uploaded' if currently reviewed
+    from app.modules.governance.models import ModelFile
+    file_obj = db.query(ModelFile).filter(ModelFile.file_id == payload.file_id).first()
+    file_status = "error"
+    if file_obj:
+        if file_obj.status in ["approved", "rejected", "in_review", "uploaded"]:
+            file_obj.status = "uploaded"
+        file_status = file_obj.status
 
-        db.commit()
-        return {"status": "success", "message": "Brand updated", "data": processed_data, "file_status": file_status}
-    
-    return {"status": "error", "message": "Brand not found in result"}
+    db.commit()
+    return {"status": "success", "message": "Brand updated", "data": header, "row": row, "file_status": file_status}
 
-def calculate_brand_summary_from_rows(data: Dict[str, Any]) -> Dict[str, Any]:
+# ==========================================================
+# BRAND EXCLUSION PARTS
+# ==========================================================
+# The brand_exclusion AnalyticalResult holds only the header (summary, warnings, row_count); brand rows
+# are stored one per BrandExclusionResultRow, so bucket views and single-brand edits touch just their rows.
+
+# (part, key, label, predicate) of each summary bucket. Predicates only use ==, >, != and &, so the
+# same definition filters a DataFrame of rows and the BrandExclusionResultRow table.
+BRAND_BUCKETS = [
+    ("part2", "included", "Included", lambda r: r.original_exclude_flag == 0),
+    ("part2", "excluded", "Excluded", lambda r: r.original_exclude_flag == 1),
+    ("part3", "included", "Included", lambda r: r.exclude_flag == 0),
+    ("part3", "excluded", "Excluded", lambda r: r.exclude_flag == 1),
+    ("part3", "private-brand", "Private Brand", lambda r: r.private_brand == 1),
+    ("part3", "mapping-issue", "Mapping Issue", lambda r: r.mapping_issue == 1),
+    ("part3", "zero-spend-with-sales", "Excluded - Zero Spend With Sales",
+     lambda r: (r.exclude_flag == 1) & (r.sum_spend == 0) & (r.sum_sales > 0)),
+    ("part3", "zero-sales-with-spend", "Excluded - Zero Sales With Spend",
+     lambda r: (r.exclude_flag == 1) & (r.sum_sales == 0) & (r.sum_spend > 0)),
+    ("part3", "other-issue", "Other Issue",
+     lambda r: (r.exclude_flag == 1) & (r.private_brand == 0) & (r.mapping_issue == 0) & (r.sum_spend != 0) & (r.sum_sales != 0)),
+]
+
+BRAND_ROW_MEASURES = ["sum_sales", "sum_spend", "sum_units"]
+BRAND_ROW_FLAGS = ["exclude_flag", "original_exclude_flag", "private_brand", "mapping_issue"]
+
+def find_brand_bucket(part: str, bucket: str):
+    for entry in BRAND_BUCKETS:
+        if entry[0] == part and entry[1] == bucket:
+            return entry
+    return None
+
+def _brand_key(brand: Any) -> str:
+    return str(brand or "").strip().lower()
+
+def _as_int(value: Any, default: Optional[int] = 0) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+def _brand_row_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Numeric fields of a row as stored in the BrandExclusionResultRow columns."""
+    fields = {col: float(row.get(col) or 0.0) for col in BRAND_ROW_MEASURES}
+    fields.update({col: _as_int(row.get(col)) for col in BRAND_ROW_FLAGS})
+    fields["combine_flag"] = _as_int(row.get("combine_flag"), None)
+    return fields
+
+def _fill_brand_row(record, row: Dict[str, Any]):
+    record.brand_key = _brand_key(row.get("brand"))
+    record.row_data = json.dumps(row)
+    for col, value in _brand_row_fields(row).items():
+        setattr(record, col, value)
+    return record
+
+def save_brand_exclusion_result(db: Session, file_id: int, result_type: str, result: Dict[str, Any], dependencies: Optional[str] = None):
+    """Replaces the stored brand rows of the result and saves the rest as its header, in one commit."""
+    from .models import BrandExclusionResultRow
+    rows = result.get("rows", [])
+    db.query(BrandExclusionResultRow).filter(
+        BrandExclusionResultRow.file_id == file_id,
+        BrandExclusionResultRow.result_type == result_type
+    ).delete(synchronize_session=False)
+    db.add_all([
+        _fill_brand_row(BrandExclusionResultRow(file_id=file_id, result_type=result_type, position=position), row)
+        for position, row in enumerate(rows)
+    ])
+    header = {k: v for k, v in result.items() if k != "rows"}
+    header["row_count"] = len(rows)
+    save_analytical_result(db, file_id, result_type, header, dependencies)
+    return header
+
+def _brand_row_frame(db: Session, file_id: Any, result_type: str) -> pd.DataFrame:
+    """Just the numeric row columns the summary needs."""
+    from .models import BrandExclusionResultRow
+    columns = [getattr(BrandExclusionResultRow, col) for col in BRAND_ROW_MEASURES + BRAND_ROW_FLAGS + ["combine_flag"]]
+    query = db.query(*columns).filter(
+        BrandExclusionResultRow.file_id == int(file_id),
+        BrandExclusionResultRow.result_type == result_type
+    )
+    return pd.DataFrame(query.all(), columns=BRAND_ROW_MEASURES + BRAND_ROW_FLAGS + ["combine_flag"])
+
+def load_brand_rows(
+    db: Session, file_id: Any, result_type: str, result: Dict[str, Any], predicate=None,
+    brand: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+):
     """
-    Helper to re-calculate Part 1, 2, 3 summary from raw rows blob.
+    (total, rows) of the result matching predicate and/or brand, in result order. Rows are read from
+    BrandExclusionResultRow, or filtered in memory when the result was just computed and carries them.
     """
-    rows = data.get("rows", [])
-    import pandas as pd
-    df = pd.DataFrame(rows)
-    if df.empty: return data
+    from .models import BrandExclusionResultRow
+    if "rows" in result:
+        rows = result["rows"]
+        if brand is not None:
+            rows = [r for r in rows if _brand_key(r.get("brand")) == _brand_key(brand)]
+        if predicate is not None and rows:
+            mask = predicate(pd.DataFrame([_brand_row_fields(r) for r in rows]))
+            rows = [r for r, keep in zip(rows, mask) if keep]
+        end = None if limit is None else offset + limit
+        return len(rows), rows[offset:end]
+
+    query = db.query(BrandExclusionResultRow.row_data).filter(
+        BrandExclusionResultRow.file_id == int(file_id),
+        BrandExclusionResultRow.result_type == result_type
+    )
+    if brand is not None:
+        query = query.filter(BrandExclusionResultRow.brand_key == _brand_key(brand))
+    if predicate is not None:
+        query = query.filter(predicate(BrandExclusionResultRow))
+    total = query.count()
+    query = query.order_by(BrandExclusionResultRow.position).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return total, [json.loads(row_data) for (row_data,) in query.all()]
+
+def brand_summary(df: pd.DataFrame) -> Dict[str, Any]:
+    """Part 1, 2, 3 summary of brand rows (sum_* measures and 0/1 flags per row)."""
+    df = df.copy()
+    for col in BRAND_ROW_FLAGS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
 
     total_sales = float(df['sum_sales'].sum())
     total_spends = float(df['sum_spend'].sum())
@@ -1513,23 +2871,16 @@ def calculate_brand_summary_from_rows(data: Dict[str, Any]) -> Dict[str, Any]:
             "units_pct": (u / total_units * 100) if total_units > 0 else 0
         }
 
-    data["summary"] = {
+    buckets = {"part2": [], "part3": []}
+    for part, _, label, predicate in BRAND_BUCKETS:
+        buckets[part].append(get_bucket(label, predicate(df)))
+
+    summary = {
         "total_sales": total_sales,
         "total_spends": total_spends,
         "total_units": total_units,
-        "part2": [
-            get_bucket("Included", df['original_exclude_flag'] == 0),
-            get_bucket("Excluded", df['original_exclude_flag'] == 1)
-        ],
-        "part3": [
-            get_bucket("Included", df['exclude_flag'] == 0),
-            get_bucket("Excluded", df['exclude_flag'] == 1),
-            get_bucket("Private Brand", df['private_brand'] == 1),
-            get_bucket("Mapping Issue", df['mapping_issue'] == 1),
-            get_bucket("Excluded - Zero Spend With Sales", (df['exclude_flag'] == 1) & (df['sum_spend'] == 0) & (df['sum_sales'] > 0)),
-            get_bucket("Excluded - Zero Sales With Spend", (df['exclude_flag'] == 1) & (df['sum_sales'] == 0) & (df['sum_spend'] > 0)),
-            get_bucket("Other Issue", (df['exclude_flag'] == 1) & (df['private_brand'] == 0) & (df['mapping_issue'] == 0) & (df['sum_spend'] != 0) & (df['sum_sales'] != 0))
-        ],
+        "part2": buckets["part2"],
+        "part3": buckets["part3"],
         "combine_flag_count": int(df['combine_flag'].dropna().nunique()),
         "exclude_flag_count": int((df['exclude_flag'] == 1).sum()),
         "included_brands_count": (
@@ -1542,9 +2893,28 @@ def calculate_brand_summary_from_rows(data: Dict[str, Any]) -> Dict[str, Any]:
             "low_share": int((df['exclude_flag'] == 1).sum()) - int((df['private_brand'] == 1).sum()) - int((df['mapping_issue'] == 1).sum())
         }
     }
-    data["summary"]["issue_counts"]["low_share"] = max(0, data["summary"]["issue_counts"]["low_share"])
+    summary["issue_counts"]["low_share"] = max(0, summary["issue_counts"]["low_share"])
+    return summary
+
+def calculate_brand_summary_from_rows(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Helper to re-calculate Part 1, 2, 3 summary from raw rows blob.
+    """
+    df = pd.DataFrame(data.get("rows", []))
+    if df.empty: return data
+    data["summary"] = brand_summary(df)
     return data
 
+def get_brand_agg_etag(db: Session, model_id: int) -> Optional[str]:
+    """ETag of the brand_agg stack, from its id and build time (rows are only ever written with a new stack)."""
+    stack_entry = db.query(DiscoveryStack.stack_id, DiscoveryStack.created_at).filter(
+        DiscoveryStack.model_id == model_id,
+        DiscoveryStack.stack_type == 'brand_agg'
+    ).first()
+    if not stack_entry:
+        return None
+    return http_cache.make_etag("brand_agg", model_id, stack_entry.stack_id, stack_entry.created_at)
+
 def get_brand_agg_stack(db: Session, model_id: int) -> List[Dict[str, Any]]:
     """
     Fetches the full 'brand_agg' stack data from the database for the given model_id.
@@ -1563,3 +2933,63 @@ def get_brand_agg_stack(db: Session, model_id: int) -> List[Dict[str, Any]]:
         return []
 
     return [json.loads(d.row_data) for d in data_rows]
+
+# ==========================================================
+# REGISTERED RESULT UPGRADES
+# ==========================================================
+def _parse_result_param(value: str):
+    return None if value == "None" else value
+
+@register_result_upgrade("brand_exclusion", cheap=True)
+def _upgrade_brand_exclusion(db: Session, file_id, result_type: str, payload, dependencies):
+    # v1 -> v2: the part2/part3 summary is derived from the stored rows, so manual row edits survive
+    # v2 -> v3: rows move out of the payload into BrandExclusionResultRow
+    model_id = _parse_result_param(result_type[len("brand_exclusion_"):])
+    upgraded = calculate_brand_summary_from_rows(dict(payload))
+    return save_brand_exclusion_result(db, int(file_id), result_type, upgraded, dependencies or brand_exclusion_dependencies(db, file_id, model_id))
+
+@register_result_upgrade("l2_values")
+def _upgrade_l2_values(db: Session, file_id, result_type: str, payload, dependencies):
+    return get_l2_values_data(db, str(file_id))
+
+@register_result_upgrade("correlation")
+def _upgrade_correlation(db: Session, file_id, result_type: str, payload, dependencies):
+    return _compute_correlation_data(db, str(file_id))
+
+@register_result_upgrade("weekly_series")
+def _upgrade_weekly_series(db: Session, file_id, result_type: str, payload, dependencies):
+    # Runs inside this entry's flight already, so never through _single_flight_result
+    return _compute_weekly_series(db, str(file_id), result_type, payload["metrics"], payload["dimensions"])
+
+@register_result_upgrade("weekly_sales")
+def _upgrade_weekly_sales(db: Session, file_id, result_type: str, payload, dependencies):
+    return get_weekly_sales_data(db, str(file_id), result_type[len("weekly_sales_"):])
+
+@register_result_upgrade("subcategory_summary")
+def _upgrade_subcategory_summary(db: Session, file_id, result_type: str, payload, dependencies):
+    group_by, start_date, end_date = result_type[len("subcategory_summary_"):].rsplit("_", 2)
+    start_date, end_date = _parse_result_param(start_date), _parse_result_param(end_date)
+    if start_date or end_date:
+        # Date-bounded summaries are answered from prefix sums now; entries cached per range are dropped
+        db.query(models.AnalyticalResult).filter(
+            models.AnalyticalResult.file_id == int(file_id),
+            models.AnalyticalResult.result_type == result_type
+        ).delete(synchronize_session=False)
+        db.commit()
+        result_store.result_cache.invalidate(file_id, result_type)
+    return get_subcategory_summary_data(db, str(file_id), start_date, end_date, group_by)
+
+@register_result_upgrade("l3_analysis")
+def _upgrade_l3_analysis(db: Session, file_id, result_type: str, payload, dependencies):
+    if result_type != L3_AGGREGATE_RESULT:
+        # Pages are cut from the per-file aggregate now; entries cached per page are dropped
+        db.query(models.AnalyticalResult).filter(
+            models.AnalyticalResult.file_id == int(file_id),
+            models.AnalyticalResult.result_type == result_type
+        ).delete(synchronize_session=False)
+        db.commit()
+        result_store.result_cache.invalidate(file_id, result_type)
+        current = get_persisted_result(db, int(file_id), L3_AGGREGATE_RESULT)
+        if current:
+            return current
+    return _compute_l3_aggregate(db, str(file_id))
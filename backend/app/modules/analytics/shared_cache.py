@@ -0,0 +1,223 @@
+import hashlib
+import io
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import get_settings
+from app.core import storage as file_storage
+
+settings = get_settings()
+
+# ==========================================================
+# SHARED CROSS-WORKER CACHE TIER
+# ==========================================================
+# Sits behind the per-process caches (decoded results, DataFrames) so a value computed or decoded by
+# one worker is reusable by every other worker. Redis serves multi-host deployments; the disk
+# backend (diskcache) serves a single host. Keys embed the version of what they hold, so entries
+# never need invalidating and simply age out. The tier is best effort: backend errors read as misses.
+
+DISK_CACHE_DIR = settings.shared_cache_dir or os.path.join(file_storage.CACHE_DIR, "shared")
+KEY_PREFIX = "analytics:"
+
+
+class RedisBackend:
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self.client.mget(keys)
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, value, ex=self.ttl_seconds)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        info = self.client.info("memory")
+        return {"used_memory": info.get("used_memory")}
+
+
+class DiskBackend:
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: int):
+        import diskcache
+        self.cache = diskcache.Cache(directory, size_limit=max_bytes, eviction_policy="least-recently-used")
+        self.ttl_seconds = ttl_seconds
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.cache.get(key) for key in keys]
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        for key, value in items.items():
+            self.cache.set(key, value, expire=self.ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"volume_bytes": self.cache.volume(), "entries": len(self.cache)}
+
+
+class SharedCache:
+    def __init__(self, backend_name: str):
+        self.backend_name = backend_name
+        self._backend = None
+        self._init_lock = threading.Lock()
+        self._initialized = backend_name == "none"
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._get_backend() is not None
+
+    def _get_backend(self):
+        """Connects on first use; a missing package or bad config disables the tier for this worker."""
+        if self._initialized:
+            return self._backend
+        with self._init_lock:
+            if self._initialized:
+                return self._backend
+            try:
+                if self.backend_name == "redis":
+                    self._backend = RedisBackend(settings.shared_cache_url, settings.shared_cache_ttl_seconds)
+                elif self.backend_name == "disk":
+                    self._backend = DiskBackend(DISK_CACHE_DIR, settings.shared_cache_max_bytes, settings.shared_cache_ttl_seconds)
+                else:
+                    print(f"[WARNING] Unknown SHARED_CACHE_BACKEND '{self.backend_name}'; shared cache disabled")
+                if self._backend is not None:
+                    print(f"[CACHE] Shared cache tier enabled ({self.backend_name})")
+            except Exception as e:
+                print(f"[WARNING] Shared cache backend '{self.backend_name}' unavailable; disabled: {e}")
+                self._backend = None
+            self._initialized = True
+            return self._backend
+
+    def get_many(self, keys: Iterable[str]) -> List[Optional[bytes]]:
+        keys = list(keys)
+        backend = self._get_backend()
+        if backend is None or not keys:
+            return [None] * len(keys)
+        try:
+            values = backend.get_many([KEY_PREFIX + key for key in keys])
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Shared cache read failed: {e}")
+            return [None] * len(keys)
+        found = sum(value is not None for value in values)
+        self.hits += found
+        self.misses += len(keys) - found
+        return values
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key])[0]
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        backend = self._get_backend()
+        if backend is None:
+            return
+        items = {KEY_PREFIX + k: v for k, v in items.items() if len(v) <= settings.shared_cache_max_item_bytes}
+        if not items:
+            return
+        try:
+            backend.set_many(items)
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Shared cache write failed: {e}")
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many({key: value})
+
+    def stats(self) -> Dict[str, Any]:
+        backend = self._get_backend()
+        lookups = self.hits + self.misses
+        out = {
+            "backend": self.backend_name if backend is not None else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+        if backend is not None:
+            try:
+                out.update(backend.stats())
+            except Exception:
+                pass
+        return out
+
+
+shared_cache = SharedCache(settings.shared_cache_backend)
+
+
+# ==========================================================
+# TYPED HELPERS
+# ==========================================================
+def result_key(file_id: Any, result_type: str, version: Any) -> str:
+    return f"result:{int(file_id)}:{result_type}:{version}"
+
+
+def frame_key(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f"frame:{digest}"
+
+
+def get_frame(key: str):
+    """DataFrame stored by put_frame, or None."""
+    payload = shared_cache.get(key)
+    if payload is None:
+        return None
+    import pyarrow as pa
+    try:
+        with pa.ipc.open_stream(io.BytesIO(payload)) as reader:
+            return reader.read_all().to_pandas()
+    except Exception as e:
+        print(f"[WARNING] Discarding unreadable shared frame {key}: {e}")
+        return None
+
+
+def put_frame(key: str, df) -> None:
+    """Stores a DataFrame as a Zstd-compressed Arrow IPC stream."""
+    if not shared_cache.enabled:
+        return
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        shared_cache.set(key, sink.getvalue())
+    except Exception as e:
+        print(f"[WARNING] Could not share frame {key}: {e}")
+
+
+def cached_embeddings(model, model_name: str, texts: List[str]):
+    """
+    Sentence embeddings for texts, computing only those no worker has encoded before with this model.
+    Returns a float32 array in input order, like model.encode.
+    """
+    import numpy as np
+
+    if not shared_cache.enabled:
+        return model.encode(texts, show_progress_bar=False)
+
+    keys = [f"emb:{model_name}:{hashlib.sha1(str(t).encode('utf-8')).hexdigest()}" for t in texts]
+    cached = shared_cache.get_many(keys)
+    missing = [i for i, value in enumerate(cached) if value is None]
+    vectors: List[Any] = [None] * len(texts)
+    for i, value in enumerate(cached):
+        if value is not None:
+            vectors[i] = np.frombuffer(value, dtype=np.float32)
+
+    if missing:
+        encoded = np.asarray(model.encode([texts[i] for i in missing], show_progress_bar=False), dtype=np.float32)
+        new_items = {}
+        for row, i in enumerate(missing):
+            vectors[i] = encoded[row]
+            new_items[keys[i]] = encoded[row].tobytes()
+        shared_cache.set_many(new_items)
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack(vectors)
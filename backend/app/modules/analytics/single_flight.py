@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Set
+
+from filelock import FileLock, Timeout
+
+from app.core.config import get_settings
+from app.core import storage as file_storage
+
+settings = get_settings()
+
+# ==========================================================
+# SINGLE-FLIGHT COMPUTATION
+# ==========================================================
+# One computation per cache key at a time: a thread lock serializes requests inside a worker and a
+# file lock under the shared cache dir serializes workers on the host. Callers re-check the cache
+# once they hold the flight, so everyone queued behind the first caller reuses its result.
+
+LOCK_DIR = os.path.join(file_storage.CACHE_DIR, "locks")
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+_refreshing: Set[str] = set()
+_held = threading.local()  # keys whose flight the current thread is inside
+
+
+def _thread_lock(key: str) -> threading.Lock:
+    with _registry_lock:
+        lock = _thread_locks.get(key)
+        if lock is None:
+            lock = _thread_locks[key] = threading.Lock()
+        return lock
+
+
+def _held_keys() -> Set[str]:
+    keys = getattr(_held, "keys", None)
+    if keys is None:
+        keys = _held.keys = set()
+    return keys
+
+
+def _file_lock(key: str) -> FileLock:
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    # Not thread-local: the async variant acquires and releases from executor threads
+    return FileLock(os.path.join(LOCK_DIR, f"{name}.lock"), thread_local=False)
+
+
+@contextmanager
+def flight(key: str, timeout: float = None):
+    """
+    Holds the computation slot for key. If the slot is not free within timeout the caller
+    proceeds unguarded rather than failing the request.
+    """
+    held_keys = _held_keys()
+    if key in held_keys:
+        # Neither lock is reentrant: waiting would only time out on ourselves
+        raise RuntimeError(f"flight({key}) re-entered by the thread already holding it")
+    timeout = settings.single_flight_timeout_seconds if timeout is None else timeout
+    thread_lock = _thread_lock(key)
+    held = thread_lock.acquire(timeout=timeout)
+    file_lock = _file_lock(key)
+    held_keys.add(key)
+    try:
+        try:
+            file_lock.acquire(timeout=timeout)
+        except Timeout:
+            print(f"[WARNING] Timed out waiting for computation of {key}; computing without the lock")
+        yield
+    finally:
+        held_keys.discard(key)
+        if file_lock.is_locked:
+            file_lock.release()
+        if held:
+            thread_lock.release()
+
+
+@asynccontextmanager
+async def flight_async(key: str, timeout: float = None):
+    """flight() for async endpoints: waiting happens on executor threads, not the event loop."""
+    timeout = settings.single_flight_timeout_seconds if timeout is None else timeout
+    thread_lock = _thread_lock(key)
+    held = await asyncio.to_thread(thread_lock.acquire, True, timeout)
+    file_lock = _file_lock(key)
+    try:
+        try:
+            await asyncio.to_thread(file_lock.acquire, timeout)
+        except Timeout:
+            print(f"[WARNING] Timed out waiting for computation of {key}; computing without the lock")
+        yield
+    finally:
+        if file_lock.is_locked:
+            file_lock.release()
+        if held:
+            thread_lock.release()
+
+
+@contextmanager
+def hold_if_free(key: str):
+    """
+    Yields True while this process holds the file lock for key, or False straight away when another
+    process on the host already holds it. For work that should run in one worker only.
+    """
+    file_lock = _file_lock(key)
+    try:
+        file_lock.acquire(timeout=0)
+    except Timeout:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        file_lock.release()
+
+
+def refresh_in_background(key: str, refresh: Callable[[], None]) -> bool:
+    """
+    Runs refresh once on a daemon thread inside the flight for key, unless this worker already
+    has one running. refresh must recompute unconditionally (it is only scheduled for stale keys).
+    Returns whether a refresh was started.
+    """
+    with _registry_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+
+    def run():
+        try:
+            with flight(key):
+                refresh()
+        except Exception as e:
+            print(f"[WARNING] Background refresh of {key} failed: {e}")
+        finally:
+            with _registry_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, daemon=True, name=f"refresh-{key}").start()
+    print(f"[CACHE] Serving stale {key} while it refreshes in the background")
+    return True
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ==========================================================
+# SORTED TABLE INDEX
+# ==========================================================
+# A small aggregate table (e.g. one row per L2 x L3) with its sort orders and filtered views cached,
+# so paging through a sorted, filtered table costs O(page size) once the view exists. Views are
+# built on first use: one sort per column and direction, one mask per filter combination.
+
+MAX_VIEWS = 32
+MAX_INDEXES = 32
+
+ViewKey = Tuple[Optional[str], bool, Tuple[Tuple[str, Any], ...]]
+
+
+class TableView:
+    def __init__(self, positions: np.ndarray, unique: Dict[str, int]):
+        self.positions = positions  # row positions in sort order, filters applied
+        self.unique = unique        # distinct values per text column within the view
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class SortedIndex:
+    def __init__(self, frame: pd.DataFrame, text_columns: List[str]):
+        self.frame = frame.reset_index(drop=True)
+        self.text_columns = text_columns
+        self._lowered = {c: self.frame[c].astype(str).str.lower() for c in text_columns}
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._views: "OrderedDict[ViewKey, TableView]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _order(self, sort_by: Optional[str], descending: bool) -> np.ndarray:
+        if sort_by is None:
+            return np.arange(len(self.frame))
+        key = (sort_by, descending)
+        order = self._orders.get(key)
+        if order is None:
+            # Stable, so ties keep the table's natural order in both directions
+            order = self.frame.sort_values(
+                sort_by, ascending=not descending, kind="stable", na_position="last"
+            ).index.to_numpy()
+            self._orders[key] = order
+        return order
+
+    def _mask(self, equals: Dict[str, Any], contains: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+        for column, value in equals.items():
+            condition = (self.frame[column] == value).to_numpy()
+            mask = condition if mask is None else mask & condition
+        if contains:
+            needle = contains.lower()
+            found = np.zeros(len(self.frame), dtype=bool)
+            for column in self.text_columns:
+                found |= self._lowered[column].str.contains(needle, regex=False).to_numpy()
+            mask = found if mask is None else mask & found
+        return mask
+
+    def view(self, sort_by: Optional[str] = None, descending: bool = False,
+             equals: Optional[Dict[str, Any]] = None, contains: Optional[str] = None) -> TableView:
+        """Positions of rows matching equals (column == value) and contains (substring of any text column, case-insensitive)."""
+        equals = {k: v for k, v in (equals or {}).items() if v is not None}
+        key: ViewKey = (sort_by, descending, tuple(sorted(equals.items())) + (("__contains", contains or ""),))
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None:
+                self._views.move_to_end(key)
+                return cached
+
+            order = self._order(sort_by, descending)
+            mask = self._mask(equals, contains)
+            positions = order if mask is None else order[mask[order]]
+            selected = self.frame.iloc[positions]
+            view = TableView(positions, {c: int(selected[c].nunique()) for c in self.text_columns})
+
+            self._views[key] = view
+            while len(self._views) > MAX_VIEWS:
+                self._views.popitem(last=False)
+            return view
+
+    def page(self, view: TableView, offset: int, limit: int) -> pd.DataFrame:
+        return self.frame.iloc[view.positions[offset:offset + limit]]
+
+
+class SortedIndexCache:
+    """Per-worker LRU of SortedIndex objects keyed by (file_id, name, version of the source result)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, Any], SortedIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: Any, name: str, version: Any) -> Optional[SortedIndex]:
+        key = (str(file_id), name, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, file_id: Any, name: str, version: Any, index: SortedIndex) -> SortedIndex:
+        with self._lock:
+            # Older versions of the same table are never asked for again
+            for key in [k for k in self._entries if k[:2] == (str(file_id), name)]:
+                del self._entries[key]
+            self._entries[(str(file_id), name, version)] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def invalidate(self, file_id: Any) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(file_id)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries}
+
+
+index_cache = SortedIndexCache(MAX_INDEXES)
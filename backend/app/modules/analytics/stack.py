@@ -442,14 +442,17 @@ async def build_stack_process(db: Session, exclude_file_id: int, stack_type: str
                 } for row in batch
             ])
             
+        # The cached discovery analysis declared this model's stack as an input
+        from . import invalidation
+        invalidation.bump(db, invalidation.input_key(invalidation.STACK, model_id))
         db.commit()
         print(f"[STACK] Successfully persisted {len(sum_rows)} summary rows and {len(brand_rows)} brand rows for model {model_id}.")
         
-        # Trigger DB-backed Pre-Calculation of Discovery Analysis
+        # Trigger DB-backed Pre-Calculation of Discovery Analysis (a cache miss now that its stack input changed)
         try:
             from .discovery import get_discovery_data
             print(f"[STACK] Triggering discovery pre-calculation for model {model_id}...")
-            get_discovery_data(db, model_id, force_refresh=True)
+            get_discovery_data(db, model_id, allow_stale=False)
             print(f"[STACK] Discovery pre-calculation complete for model {model_id}")
         except Exception as e:
             print(f"[WARNING] Failed to pre-calculate discovery analysis: {e}")
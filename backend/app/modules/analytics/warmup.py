@@ -0,0 +1,189 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+
+settings = get_settings()
+
+# ==========================================================
+# STARTUP CACHE WARMUP
+# ==========================================================
+# After a deploy or restart, pays the cold costs (cloud download, parse, result decode, model load)
+# for the models people are working on, before they open them. Runs once on a background thread of
+# every worker and stops at the time budget. Per-process caches (the ML model, DataFrames, decoded
+# results) are primed in each worker, DataFrames only while their catalogued size fits the memory
+# budget; host-wide work (downloads, discovery results) is done only by the worker holding the warmup lock.
+
+WARMUP_LOCK = "warmup"
+STRING_VALUE_BYTES = 32  # assumed average in-memory size of one text value (offsets plus characters)
+
+
+def active_models(db: Session, limit: int, lookback_days: int) -> List[int]:
+    """
+    Model ids ordered by most recent activity within the lookback window: file uploads,
+    approval requests still pending, reviewer assignments and model creation.
+    """
+    from app.modules.governance.models import Model, ModelFile, ModelStageApproval, ModelAssignment
+
+    since = datetime.utcnow() - timedelta(days=lookback_days)
+    activity = [
+        db.query(ModelFile.model_id, func.max(ModelFile.uploaded_at))
+          .filter(ModelFile.model_id.isnot(None), ModelFile.uploaded_at >= since)
+          .group_by(ModelFile.model_id),
+        db.query(ModelStageApproval.model_id, func.max(ModelStageApproval.requested_at))
+          .filter(ModelStageApproval.status == "pending")
+          .group_by(ModelStageApproval.model_id),
+        db.query(ModelAssignment.model_id, func.max(ModelAssignment.assigned_at))
+          .filter(ModelAssignment.assigned_at >= since)
+          .group_by(ModelAssignment.model_id),
+        db.query(Model.model_id, Model.created_at).filter(Model.created_at >= since),
+    ]
+    latest: Dict[int, datetime] = {}
+    for query in activity:
+        for model_id, at in query.all():
+            # Pending approvals count as current however old the request is
+            at = at or since
+            if model_id not in latest or at > latest[model_id]:
+                latest[model_id] = at
+
+    live = {m for (m,) in db.query(Model.model_id).filter(Model.model_id.in_(latest), Model.is_deleted.isnot(True)).all()}
+    ranked = sorted((m for m in latest if m in live), key=lambda m: latest[m], reverse=True)
+    return ranked[:limit]
+
+
+def estimated_frame_bytes(schema: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    In-memory size of a file's full frame from its catalogued Arrow dtypes and row count, without
+    reading it. None when the file has no catalog (legacy uploads) or no recorded row count.
+    """
+    import pyarrow as pa
+
+    if not schema or not schema.get("row_count"):
+        return None
+    row_bytes = 0
+    for dtype in schema["dtypes"].values():
+        try:
+            row_bytes += max(pa.type_for_alias(dtype).bit_width // 8, 1)
+        except ValueError:
+            # Variable-width (text, binary) and anything without an alias
+            row_bytes += STRING_VALUE_BYTES
+    return row_bytes * schema["row_count"]
+
+
+def warm_model(db: Session, model_id: int, deadline: float, budget: Dict[str, int], shared: bool = True) -> Dict[str, int]:
+    """
+    Primes this worker's frame and result caches for one model; with shared, also prefetches its files
+    and refreshes its discovery analysis for the whole host. budget['bytes'] is decremented.
+    """
+    from app.modules.governance.models import ModelFile
+    from .models import AnalyticalResult, DiscoveryStack
+    from . import service, discovery
+    from .frame_cache import frame_nbytes
+
+    counts = {"files": 0, "frames": 0, "results": 0, "discovery": 0}
+    files = db.query(ModelFile).filter(
+        ModelFile.model_id == model_id,
+        ModelFile.is_active.isnot(False),
+        ModelFile.processing_status.in_(["ready"]) | ModelFile.processing_status.is_(None)
+    ).order_by(ModelFile.uploaded_at.desc()).all()
+
+    for db_file in files:
+        if time.monotonic() > deadline:
+            return counts
+        try:
+            if shared:
+                # Downloads the copy load_data reads (typed sidecar or source) into the local object cache
+                service.local_source_path(str(db_file.file_id))
+                counts["files"] += 1
+
+            # Only load frames whose estimated size fits what is left of the memory budget
+            estimate = estimated_frame_bytes(service.get_file_schema(str(db_file.file_id)))
+            if estimate is not None and estimate <= budget["bytes"]:
+                df = service.load_data(str(db_file.file_id))
+                budget["bytes"] -= frame_nbytes(df)
+                counts["frames"] += 1
+
+            result_types = [r for (r,) in db.query(AnalyticalResult.result_type).filter(AnalyticalResult.file_id == db_file.file_id).all()]
+            for result_type in result_types:
+                if time.monotonic() > deadline:
+                    return counts
+                if not service.result_store.result_cache.has_room():
+                    break
+                if service.get_persisted_result(db, db_file.file_id, result_type) is not None:
+                    counts["results"] += 1
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Warmup skipped file {db_file.file_id}: {e}")
+
+    # Discovery is computed once per stack build; make sure the cached analysis exists and is current
+    has_stack = db.query(DiscoveryStack.stack_id).filter(
+        DiscoveryStack.model_id == model_id, DiscoveryStack.stack_type == "modeling_stack"
+    ).first()
+    if shared and has_stack and time.monotonic() <= deadline:
+        try:
+            discovery.get_discovery_data(db, model_id, allow_stale=False)
+            counts["discovery"] += 1
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Warmup skipped discovery for model {model_id}: {e}")
+    return counts
+
+
+def preload_ml_models() -> None:
+    """Loads the brand-matching SentenceTransformer into this process."""
+    from .exclude_flag_automation.matcher import load_sentence_model
+    load_sentence_model()
+
+
+def run_warmup() -> Dict[str, Any]:
+    from . import single_flight
+
+    # Held for the whole pass, so one worker on the host does the shared part
+    with single_flight.hold_if_free(WARMUP_LOCK) as leader:
+        return _run_warmup(shared=leader)
+
+
+def _run_warmup(shared: bool) -> Dict[str, Any]:
+    started = time.monotonic()
+    deadline = started + settings.warmup_time_budget_seconds
+    budget = {"bytes": settings.warmup_memory_budget_bytes}
+    totals: Dict[str, Any] = {"models": 0, "files": 0, "frames": 0, "results": 0, "discovery": 0}
+
+    if settings.warmup_preload_ml:
+        try:
+            preload_ml_models()
+            totals["ml_models"] = 1
+        except Exception as e:
+            print(f"[WARNING] Warmup could not preload ML models: {e}")
+
+    db = SessionLocal()
+    try:
+        for model_id in active_models(db, settings.warmup_max_models, settings.warmup_lookback_days):
+            if time.monotonic() > deadline:
+                print("[CACHE] Warmup time budget exhausted")
+                break
+            counts = warm_model(db, model_id, deadline, budget, shared)
+            totals["models"] += 1
+            for key, value in counts.items():
+                totals[key] += value
+    except Exception as e:
+        print(f"[WARNING] Warmup failed: {e}")
+    finally:
+        db.close()
+
+    totals["seconds"] = round(time.monotonic() - started, 1)
+    print(f"[CACHE] Warmup finished ({'with' if shared else 'without'} shared prefetch): {totals}")
+    return totals
+
+
+def start_warmup_job() -> None:
+    """Runs one warmup pass on a daemon thread so startup is never delayed."""
+    if not settings.warmup_enabled:
+        return
+    threading.Thread(target=run_warmup, name="cache-warmup", daemon=True).start()
@@ -126,6 +126,10 @@ class ModelFile(Base):
     status = Column(String(50), default="uploaded")
     remarks = Column(String(500))
     is_analysis = Column(Boolean, default=False)
+    sidecar_path = Column(String(500))  # Parquet sidecar generated at upload for CSV sources
+    processing_status = Column(String(20))  # queued / processing / ready / failed (background ingest)
+    processing_progress = Column(Integer, default=0)  # percent of ingest steps completed
+    processing_error = Column(String(500))
     
     model = relationship("Model", back_populates="files")
     comments = relationship("ReportComment", back_populates="file", cascade="all, delete-orphan")
@@ -196,3 +200,4 @@ class RawDataFile(Base):
     status = Column(String(50), default="uploaded")
     row_count = Column(Integer)
     remarks = Column(String(500))
+    sidecar_path = Column(String(500))  # Parquet sidecar generated at upload for CSV sources
@@ -95,6 +95,8 @@ class ModelFile(ModelFileBase):
     file_id: int
     status: str
     uploaded_at: datetime
+    processing_status: Optional[str] = None
+    processing_progress: Optional[int] = None
     class Config:
         from_attributes = True
 
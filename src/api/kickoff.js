@@ -249,6 +249,20 @@ export const fetchL3Analysis = async (fileId, options = {}, token = null) => {
     if (options.endDate) {
         params.set('end_date', options.endDate);
     }
+    if (options.cursor) {
+        params.set('cursor', options.cursor);
+    } else if (options.offset) {
+        params.set('offset', options.offset);
+    }
+    if (options.sortBy) {
+        params.set('sort_by', options.sortBy);
+    }
+    if (options.sortDir) {
+        params.set('sort_dir', options.sortDir);
+    }
+    if (options.search) {
+        params.set('search', options.search);
+    }
     const query = params.toString();
     const headers = {};
     if (token) {
@@ -281,6 +295,85 @@ export const fetchCorrelation = async (fileId, token = null) => {
     return response.json();
 };
 
+export const fetchCorrelationEdges = async (fileId, options = {}, token = null) => {
+    const params = new URLSearchParams();
+    if (options.level) {
+        params.set('level', options.level);
+    }
+    if (options.topK) {
+        params.set('top_k', options.topK);
+    }
+    if (options.threshold !== undefined && options.threshold !== null) {
+        params.set('threshold', options.threshold);
+    }
+    (options.series || []).forEach((name) => params.append('series', name));
+    const query = params.toString();
+    const headers = {};
+    if (token) {
+        headers['Authorization'] = `Bearer ${token}`;
+    }
+    const response = await fetch(
+        `${getApiBaseUrl()}/api/v1/files/${fileId}/correlation/edges${query ? `?${query}` : ''}`,
+        { headers: headers }
+    );
+    if (!response.ok) {
+        const message = await response.text();
+        throw new Error(message || 'Failed to load correlation edges');
+    }
+    return response.json();
+};
+
+export const fetchWeeklySeries = async (fileId, metrics = [], dimensions = null, token = null) => {
+    const params = new URLSearchParams();
+    metrics.forEach((metric) => params.append('metrics', metric));
+    if (dimensions !== null) {
+        params.set('dimensions', dimensions.join(','));
+    }
+    const query = params.toString();
+    const headers = {};
+    if (token) {
+        headers['Authorization'] = `Bearer ${token}`;
+    }
+    const response = await fetch(
+        `${getApiBaseUrl()}/api/v1/files/${fileId}/weekly-series${query ? `?${query}` : ''}`,
+        { headers: headers }
+    );
+    if (!response.ok) {
+        const message = await response.text();
+        throw new Error(message || 'Failed to load weekly series');
+    }
+    return response.json();
+};
+
+export const fetchSpendLagCorrelation = async (fileId, options = {}, token = null) => {
+    const params = new URLSearchParams();
+    ['metric', 'l2', 'group'].forEach((key) => {
+        if (options[key]) {
+            params.set(key, options[key]);
+        }
+    });
+    if (options.minLag !== undefined && options.minLag !== null) {
+        params.set('min_lag', options.minLag);
+    }
+    if (options.maxLag !== undefined && options.maxLag !== null) {
+        params.set('max_lag', options.maxLag);
+    }
+    const query = params.toString();
+    const headers = {};
+    if (token) {
+        headers['Authorization'] = `Bearer ${token}`;
+    }
+    const response = await fetch(
+        `${getApiBaseUrl()}/api/v1/files/${fileId}/spend-lag-correlation${query ? `?${query}` : ''}`,
+        { headers: headers }
+    );
+    if (!response.ok) {
+        const message = await response.text();
+        throw new Error(message || 'Failed to load spend lag correlation');
+    }
+    return response.json();
+};
+
 export const fetchWeeklySales = async (fileId, metric = 'sales', token = null) => {
     const params = new URLSearchParams();
     if (metric) {
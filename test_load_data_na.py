@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend")))
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/test.db"
+os.environ["ARROW_CACHE_ENABLED"] = "false"
+
+import pandas as pd
+
+from app.core.database import Base, engine, SessionLocal
+from app.modules.analytics import service, ingest
+
+CSV = """L2,L3,week_start_date,O_SALE,O_UNIT
+A,A1,2024-01-01,"1,000",10
+,A2,2024-01-01,200,
+B,,2024-01-08,300,3
+NA,B2,2024-01-08,400,4
+C,C1,,"2,500",-
+"""
+
+
+def test_load_data_matches_read_csv():
+    from app.modules.governance.models import ModelFile
+    import app.modules.analytics.models  # noqa: F401  (registers the analytics tables)
+
+    csv_path = os.path.join(TMP_DIR, "blank_cells.csv")
+    with open(csv_path, "w") as f:
+        f.write(CSV)
+
+    Base.metadata.create_all(bind=engine)
+    info = ingest.write_parquet_sidecar(csv_path, csv_path, service.FIELD_ALIASES["date"])
+    db = SessionLocal()
+    try:
+        db_file = ModelFile(file_name="blank_cells.csv", file_path=csv_path, sidecar_path=info["sidecar_path"])
+        db.add(db_file)
+        db.commit()
+        file_id = str(db_file.file_id)
+    finally:
+        db.close()
+
+    expected = pd.read_csv(csv_path)
+    loaded = service.load_data(file_id)
+
+    assert list(loaded.columns) == list(expected.columns)
+    # Blank and NA-marker cells are missing in the same places, text columns included
+    assert (loaded.isna().to_numpy() == expected.isna().to_numpy()).all()
+    assert sorted(loaded["L2"].dropna().unique()) == sorted(expected["L2"].dropna().unique()) == ["A", "B", "C"]
+    assert loaded.groupby("L2")["O_UNIT"].count().to_dict() == expected.groupby("L2")["O_UNIT"].count().to_dict()
+
+
+if __name__ == "__main__":
+    test_load_data_matches_read_csv()
+    print("LOAD DATA NA TEST SUCCESS")
@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import time
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend")))
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/test.db"
+os.environ["ARROW_CACHE_ENABLED"] = "false"
+os.environ["SINGLE_FLIGHT_TIMEOUT_SECONDS"] = "2"
+
+from app.core.database import Base, engine, SessionLocal
+from app.modules.analytics import service, ingest, invalidation, result_store, single_flight
+
+single_flight.LOCK_DIR = os.path.join(TMP_DIR, "locks")
+
+CSV = """L2,L3,week_start_date,O_SALE,O_UNIT,M_SEARCH_SPEND
+FRUIT,APPLES,2024-01-01,"1,000",10,5
+FRUIT,PEARS,2024-01-01,200,2,0
+VEG,LEEKS,2024-01-01,300,3,1
+FRUIT,APPLES,2024-01-08,400,4,2
+VEG,LEEKS,2024-01-08,500,5,0
+VEG,ONIONS,2024-01-15,600,6,3
+"""
+
+
+def _upload():
+    from app.modules.governance.models import ModelFile
+    import app.modules.analytics.models  # noqa: F401  (registers the analytics tables)
+
+    csv_path = os.path.join(TMP_DIR, "upgrades.csv")
+    with open(csv_path, "w") as f:
+        f.write(CSV)
+
+    Base.metadata.create_all(bind=engine)
+    info = ingest.write_parquet_sidecar(csv_path, csv_path, service.FIELD_ALIASES["date"])
+    db = SessionLocal()
+    try:
+        db_file = ModelFile(file_name="upgrades.csv", file_path=csv_path, sidecar_path=info["sidecar_path"])
+        db.add(db_file)
+        db.commit()
+        service.save_file_schema(db, db_file.file_id, info)
+        return db_file.file_id
+    finally:
+        db.close()
+
+
+def test_version_bump_upgrades_outdated_results():
+    file_id = _upload()
+    fid = str(file_id)
+
+    db = SessionLocal()
+    try:
+        service.get_l2_values_data(db, fid)
+        service.get_correlation_data(db, fid)
+        service.get_weekly_sales_data(db, fid, "sales")
+        service.get_weekly_series_data(db, fid, ["sales", "units"], ["l2"])
+        service.get_subcategory_summary_data(db, fid)
+        service.l3_index(db, fid)
+        result_types = {r for f, r in _stored_results(db) if f == file_id}
+    finally:
+        db.close()
+    families = {invalidation.result_family(r) for r in result_types}
+    assert families == set(service.RESULT_UPGRADES) - {"brand_exclusion"}
+
+    # A deploy bumps every family with a registered upgrade
+    bumped = {family: invalidation.ALGORITHM_VERSIONS[family] + 1 for family in families}
+    original = dict(invalidation.ALGORITHM_VERSIONS)
+    invalidation.ALGORITHM_VERSIONS.update(bumped)
+    try:
+        db = SessionLocal()
+        try:
+            # Outdated entries are never served, stale or not
+            for result_type in result_types:
+                assert service.get_persisted_result(db, file_id, result_type) is None
+                assert result_store.load_stale_result(db, file_id, result_type) is None
+            assert set(result_store.outdated_results(db)) == {(file_id, r) for r in result_types}
+        finally:
+            db.close()
+
+        # No upgrade may re-enter the flight the job holds for its entry: that would raise, or wait out the timeout
+        started = time.monotonic()
+        counts = service.upgrade_outdated_results()
+        assert time.monotonic() - started < 2 * single_flight.settings.single_flight_timeout_seconds
+        assert counts["failed"] == 0
+        assert counts["upgraded"] == len(result_types)
+
+        db = SessionLocal()
+        try:
+            assert result_store.outdated_results(db) == []
+            upgraded = service.get_persisted_result(db, file_id, service.weekly_series_result_type(["sales", "units"], ["l2"]))
+            assert upgraded is not None and upgraded["row_count"] > 0
+            assert service.get_persisted_result(db, file_id, service.L2_VALUES_RESULT)["l2_values"] == ["FRUIT", "VEG"]
+        finally:
+            db.close()
+    finally:
+        invalidation.ALGORITHM_VERSIONS.clear()
+        invalidation.ALGORITHM_VERSIONS.update(original)
+
+
+def _stored_results(db):
+    from app.modules.analytics.models import AnalyticalResult
+    return db.query(AnalyticalResult.file_id, AnalyticalResult.result_type).all()
+
+
+if __name__ == "__main__":
+    test_version_bump_upgrades_outdated_results()
+    print("RESULT UPGRADES TEST SUCCESS")
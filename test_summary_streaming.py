@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend")))
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/test.db"
+os.environ["ARROW_CACHE_ENABLED"] = "false"
+
+import pandas as pd
+
+from app.core.database import Base, engine, SessionLocal
+from app.modules.analytics import service, ingest, single_flight
+
+single_flight.LOCK_DIR = os.path.join(TMP_DIR, "locks")
+
+# M_TOTAL_DISPLAY_SUM_SPEND is an alias of both onsite_display_spends and total_spends
+CSV = """L2,Model_Group,week_start_date,O_SALE,O_UNIT,M_SEARCH_SPEND,M_TOTAL_DISPLAY_SUM_SPEND
+FRUIT,G1,2024-01-01,"1,000",10,5,7
+FRUIT,G1,2024-01-01,200,2,0,1
+VEG,G2,2024-01-08,300,3,1,0
+FRUIT,G2,2024-01-15,400,4,2,2
+VEG,G1,not a date,900,9,9,9
+VEG,G2,2024-02-05,500,5,0,3
+HERBS,G1,2024-02-12,600,6,3,4
+"""
+
+
+def _frame() -> pd.DataFrame:
+    path = os.path.join(TMP_DIR, "frame.csv")
+    with open(path, "w") as f:
+        f.write(CSV)
+    return pd.read_csv(path)
+
+
+def _in_memory(df: pd.DataFrame, group_by: str, start_date=None, end_date=None):
+    df = df.copy()
+    df["week_start_date"] = pd.to_datetime(df["week_start_date"], errors="coerce")
+    df = df.dropna(subset=["week_start_date"])
+    bounds = {"start_date": df["week_start_date"].min().strftime("%Y-%m-%d"),
+              "end_date": df["week_start_date"].max().strftime("%Y-%m-%d")}
+    if start_date:
+        df = df[df["week_start_date"] >= pd.to_datetime(start_date)]
+    if end_date:
+        df = df[df["week_start_date"] <= pd.to_datetime(end_date)]
+    return service.calculate_summary(df, group_by), bounds
+
+
+def _sorted(summary: pd.DataFrame) -> pd.DataFrame:
+    return summary.sort_values("subcategory").reset_index(drop=True)
+
+
+def test_streamed_summary_matches_in_memory():
+    df = _frame()
+    for group_by in ["l2", "model_group"]:
+        for start_date, end_date in [(None, None), ("2024-01-08", None), (None, "2024-01-31"), ("2024-01-08", "2024-02-05")]:
+            expected, expected_bounds = _in_memory(df, group_by, start_date, end_date)
+            chunks = (df.iloc[i:i + 2].copy() for i in range(0, len(df), 2))
+            streamed, bounds = service.calculate_summary_streaming(
+                chunks, group_by, date_col="week_start_date", start_date=start_date, end_date=end_date
+            )
+            pd.testing.assert_frame_equal(_sorted(streamed), _sorted(expected), check_dtype=False)
+            assert bounds == expected_bounds
+
+
+def test_streamed_subcategory_summary_matches_in_memory():
+    from app.modules.governance.models import ModelFile
+    from app.modules.analytics.models import AnalyticalResult
+
+    csv_path = os.path.join(TMP_DIR, "upload.csv")
+    with open(csv_path, "w") as f:
+        f.write(CSV)
+    Base.metadata.create_all(bind=engine)
+    info = ingest.write_parquet_sidecar(csv_path, csv_path, service.FIELD_ALIASES["date"])
+    db = SessionLocal()
+    try:
+        db_file = ModelFile(file_name="upload.csv", file_path=csv_path, sidecar_path=info["sidecar_path"])
+        db.add(db_file)
+        db.commit()
+        service.save_file_schema(db, db_file.file_id, info)
+        file_id = str(db_file.file_id)
+
+        minimum = service.settings.summary_streaming_min_bytes
+        try:
+            # Streamed first: a cached frame would route the in-memory path
+            service.settings.summary_streaming_min_bytes = 0
+            assert service._should_stream(file_id)
+            streamed = service.get_subcategory_summary_data(db, file_id)
+            db.query(AnalyticalResult).filter(AnalyticalResult.file_id == int(file_id)).delete()
+            db.commit()
+            service.result_store.result_cache.invalidate(file_id)
+
+            service.settings.summary_streaming_min_bytes = 1 << 40
+            assert not service._should_stream(file_id)
+            in_memory = service.get_subcategory_summary_data(db, file_id)
+        finally:
+            service.settings.summary_streaming_min_bytes = minimum
+    finally:
+        db.close()
+
+    assert streamed["rows"] and streamed == in_memory
+    assert streamed["date_bounds"] == {"min": "2024-01-01", "max": "2024-02-12"}
+
+
+if __name__ == "__main__":
+    test_streamed_summary_matches_in_memory()
+    test_streamed_subcategory_summary_matches_in_memory()
+    print("SUMMARY STREAMING TEST SUCCESS")